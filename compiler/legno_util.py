@@ -49,7 +49,8 @@ def exec_lscale(args):
                                                             adp, \
                                                             objective=obj, \
                                                             scale_method=scale_method, \
-                                                            calib_obj=calib_obj)):
+                                                            calib_obj=calib_obj, \
+                                                            diversity=args.diversity)):
 
                     print("<<< writing scaled circuit %d/%d>>>" % (idx,args.scale_adps))
                     scale_adp.metadata.set(ADPMetadata.Keys.LSCALE_ID,idx)
@@ -108,7 +109,12 @@ def exec_lgraph(args):
                                  synth_depth=args.synth_depth,
                                  vadps=args.vadps,
                                  adps=args.adps, \
-                                 routes=args.routes)):
+                                 routes=args.routes, \
+                                 cache_dir=None if args.no_cache \
+                                 else path_handler.lgraph_cache_dir(), \
+                                 jobs=args.jobs, \
+                                 route_solver=args.route_solver, \
+                                 unify_seed=args.unify_seed)):
         timer.end()
         adp.metadata.set(ADPMetadata.Keys.DSNAME, \
                          args.program)
@@ -212,8 +218,10 @@ def exec_lexec(args):
 
 def exec_lsim(args):
     from compiler import lsim
+    import compiler.lsim_pass.integrator as integlib
 
     board = get_device(None)
+    method = integlib.Integrator(args.integrator)
     path_handler = paths.PathHandler(args.subset,args.program)
     program = DSProgDB.get_prog(args.program)
     if args.reference:
@@ -224,7 +232,9 @@ def exec_lsim(args):
             'na',
             'na',
             'na')
-        lsim.simulate_reference(board,program,plot_file)
+        lsim.simulate_reference(board,program,plot_file, \
+                                samples=args.samples, \
+                                method=method)
         return
 
 
@@ -267,7 +277,9 @@ def exec_lsim(args):
                     print(plot_file)
 
 
-                    lsim.simulate_adp(board,adp,plot_file)
+                    lsim.simulate_adp(board,adp,plot_file, \
+                                      samples=args.samples, \
+                                      method=method)
 
 def exec_wav(args,trials=1):
     import compiler.lwav_pass.waveform as wavelib
@@ -302,19 +314,18 @@ def exec_wav(args,trials=1):
                                                                                  variable=var, \
                                                                                  trial=trial)
                             if os.path.exists(waveform_file):
-                                with open(waveform_file,'r') as fh:
-                                    obj = util.decompress_json(fh.read())
-                                    wave = wavelib.Waveform.from_json(obj)
-                                    for vis in analyzelib.analyze(adp,wave):
-                                        plot_file = path_handler.waveform_plot_file( \
-                                                                                             graph_index=adp.metadata[ADPMetadata.Keys.LGRAPH_ID],
-                                                                                             scale_index=adp.metadata[ADPMetadata.Keys.LSCALE_ID],
-                                                                                             model=adp.metadata[ADPMetadata.Keys.LSCALE_SCALE_METHOD],
-                                                                                             calib_obj=adp.metadata[ADPMetadata.Keys.RUNTIME_CALIB_OBJ], \
-                                                                                             opt=adp.metadata[ADPMetadata.Keys.LSCALE_OBJECTIVE], \
-                                                                                             phys_db=adp.metadata[ADPMetadata.Keys.RUNTIME_PHYS_DB], \
-                                                                                             variable=var, \
-                                                                                             trial=trial, \
-                                                                                     plot=vis.name)
-
-                                        vis.plot(plot_file)
+                                obj = util.load_waveform(waveform_file)
+                                wave = wavelib.Waveform.from_json(obj)
+                                for vis in analyzelib.analyze(adp,wave):
+                                    plot_file = path_handler.waveform_plot_file( \
+                                                                                         graph_index=adp.metadata[ADPMetadata.Keys.LGRAPH_ID],
+                                                                                         scale_index=adp.metadata[ADPMetadata.Keys.LSCALE_ID],
+                                                                                         model=adp.metadata[ADPMetadata.Keys.LSCALE_SCALE_METHOD],
+                                                                                         calib_obj=adp.metadata[ADPMetadata.Keys.RUNTIME_CALIB_OBJ], \
+                                                                                         opt=adp.metadata[ADPMetadata.Keys.LSCALE_OBJECTIVE], \
+                                                                                         phys_db=adp.metadata[ADPMetadata.Keys.RUNTIME_PHYS_DB], \
+                                                                                         variable=var, \
+                                                                                         trial=trial, \
+                                                                                 plot=vis.name)
+
+                                    vis.plot(plot_file)
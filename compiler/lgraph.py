@@ -1,4 +1,7 @@
 import itertools
+import multiprocessing
+import hashlib
+import json
 
 import ops.opparse as parser
 import random
@@ -16,15 +19,20 @@ import logging
 #import ops.aop as aop
 
 import hwlib.block as blocklib
+import ops.lambda_op as lambdoplib
 import compiler.lgraph_pass.route as routelib
+import compiler.lgraph_pass.route_solver as routesolverlib
 import compiler.lgraph_pass.assemble as asmlib
 import compiler.lgraph_pass.synth as synthlib
 import compiler.lgraph_pass.rule as rulelib
 import compiler.lgraph_pass.vadp as vadplib
+import compiler.lgraph_pass.synth_cache as synthcachelib
+import compiler.lgraph_pass.unify as unifylib
 from compiler.lgraph_pass.rules.kirch import KirchhoffRule
 from compiler.lgraph_pass.rules.lutfuse import FuseLUTRule
 from compiler.lgraph_pass.rules.flip import FlipSignRule
 import numpy as np
+import os
 
 
 def get_laws(dev):
@@ -79,38 +87,204 @@ def combine_fragments(frags):
 
 
 
+def get_compute_blocks(board):
+    return list(filter(lambda blk: \
+                       blk.type == blocklib.BlockType.COMPUTE, \
+                       board.blocks))
+
+# returns up to vadp_fragments fragments for the variable, and whether
+# the synthesis search was exhausted.
+def synthesize_fragments(board,compute_blocks,laws,variable,expr, \
+                         synth_depth,vadp_fragments):
+    frags = []
+    for vadp in synthlib.search(board, \
+                                compute_blocks,laws,variable,expr, \
+                                depth=synth_depth):
+        if len(frags) >= vadp_fragments:
+            return frags,False
+        frags.append(vadp)
+
+    return frags,True
+
+# per-process synthesis state. Workers rebuild the device and the program
+# from their names instead of receiving pickled blocks and tableaus, and
+# send back the fragments in their json representation. A worker whose
+# rebuilt device or program differs from the parent's synthesizes nothing,
+# and the parent synthesizes those variables in-process.
+SYNTH_WORKER = {}
+
+def synth_fingerprint(board,prob,blocks,laws):
+    digest = hashlib.sha256()
+    digest.update(json.dumps({
+        'device': [board.name,board.model_number],
+        'blocks': list(map(synthcachelib.block_signature, blocks)),
+        'laws': list(map(synthcachelib.law_signature, laws)),
+        'program': list(map(lambda v: [v,lambdoplib.memo_key(prob.binding(v))], \
+                            prob.variables()))
+    },sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+def unify_memo_file(cache_dir):
+    return os.path.join(cache_dir,"unify-memo.json")
+
+def load_unify_memo(cache_dir,seed):
+    unifylib.UNIFY_MEMO.seed = seed
+    if cache_dir is None:
+        return
+    try:
+        unifylib.UNIFY_MEMO.load(unify_memo_file(cache_dir))
+    except Exception as e:
+        print("[warn] could not load unification memo: %s" % e)
+
+def _init_synth_worker(model_number,prog_name,fingerprint, \
+                       synth_depth,vadp_fragments,cache_dir,unify_seed):
+    import hwlib.hcdc.hcdcv2 as hcdclib
+    from dslang.dsprog import DSProgDB
+    SYNTH_WORKER['valid'] = False
+    try:
+        board = hcdclib.get_device(model_number,layout=True)
+        prog = DSProgDB.get_prog(prog_name)
+    except Exception as e:
+        print("[warn] synthesis worker could not rebuild <%s>: %s" \
+              % (prog_name,e))
+        return
+
+    blocks = get_compute_blocks(board)
+    laws = get_laws(board)
+    if synth_fingerprint(board,prog,blocks,laws) != fingerprint:
+        print("[warn] synthesis worker rebuilt a different device or program")
+        return
+
+    SYNTH_WORKER['valid'] = True
+    SYNTH_WORKER['board'] = board
+    SYNTH_WORKER['prog'] = prog
+    SYNTH_WORKER['blocks'] = blocks
+    SYNTH_WORKER['laws'] = laws
+    SYNTH_WORKER['depth'] = synth_depth
+    SYNTH_WORKER['fragments'] = vadp_fragments
+    load_unify_memo(cache_dir,unify_seed)
+
+def _synth_worker(variable):
+    memo = unifylib.UNIFY_MEMO
+    if not SYNTH_WORKER['valid']:
+        return None, False, {}, 0, 0
+
+    hits,misses = memo.hits,memo.misses
+    expr = SYNTH_WORKER['prog'].binding(variable)
+    frags,exhaustive = synthesize_fragments(SYNTH_WORKER['board'], \
+                                            SYNTH_WORKER['blocks'], \
+                                            SYNTH_WORKER['laws'], \
+                                            variable,expr, \
+                                            SYNTH_WORKER['depth'], \
+                                            SYNTH_WORKER['fragments'])
+    # not every op has a json representation. The parent synthesizes the
+    # fragments of such a variable in-process instead.
+    try:
+        frags = list(map(lambda frag: vadplib.vadp_to_json(frag), frags))
+    except Exception as e:
+        print("[warn] could not serialize fragments for <%s>: %s" % (variable,e))
+        frags = None
+    # the parent merges the memo entries and counts of every worker
+    return frags, exhaustive, memo.export(), \
+        memo.hits-hits, memo.misses-misses
+
+def synthesize_parallel(board,prob,variables,synth_depth,vadp_fragments,jobs, \
+                        cache_dir=None,unify_seed=0):
+    fingerprint = synth_fingerprint(board,prob,get_compute_blocks(board), \
+                                    get_laws(board))
+    initargs = (board.model_number,prob.name,fingerprint, \
+                synth_depth,vadp_fragments,cache_dir,unify_seed)
+    with multiprocessing.Pool(jobs,initializer=_init_synth_worker, \
+                              initargs=initargs) as pool:
+        results = pool.map(_synth_worker,variables)
+
+    synthesized = {}
+    for variable,(frags,exhaustive,memo,hits,misses) in zip(variables,results):
+        unifylib.UNIFY_MEMO.merge(memo)
+        unifylib.UNIFY_MEMO.hits += hits
+        unifylib.UNIFY_MEMO.misses += misses
+        if frags is None:
+            continue
+        try:
+            synthesized[variable] = \
+                (list(map(lambda frag: vadplib.vadp_from_json(board,frag), \
+                          frags)), exhaustive)
+        except Exception as e:
+            print("[warn] could not load fragments for <%s>: %s" % (variable,e))
+    return synthesized
+
 def compile(board,prob,
             vadp_fragments=100, \
             synth_depth=12, \
             asm_frags=10, \
             vadps=1, \
             adps=1, \
-            routes=1):
+            routes=1, \
+            cache_dir=None, \
+            jobs=1, \
+            route_solver="cbc", \
+            unify_seed=0):
 
-    fragments = dict(map(lambda v: (v,[]), prob.variables()))
-    compute_blocks = list(filter(lambda blk: \
-                              blk.type == blocklib.BlockType.COMPUTE, \
-                              board.blocks))
+    compute_blocks = get_compute_blocks(board)
 
     # perform synthesis
     laws = get_laws(board)
+    cache = None
+    if not cache_dir is None:
+        cache = synthcachelib.SynthCache(board,compute_blocks,laws,cache_dir, \
+                                         unify_seed=unify_seed)
+    load_unify_memo(cache_dir,unify_seed)
+
     fragments = {}
     for variable in prob.variables():
-        fragments[variable] = []
         expr = prob.binding(variable)
-        print("> SYNTH %s = %s" % (variable,expr))
-        for vadp in synthlib.search(board, \
-                                    compute_blocks,laws,variable,expr, \
-                                    depth=synth_depth):
-            if len(fragments[variable]) >= vadp_fragments:
-                break
-            fragments[variable].append(vadp)
+        cached = None if cache is None else \
+                 cache.get(variable,expr,synth_depth,vadp_fragments)
+        if not cached is None:
+            print("> using cached fragments for %s" % variable)
+            fragments[variable] = cached
+
+    pending = list(filter(lambda v: not v in fragments, prob.variables()))
+    synthesized = {}
+    if jobs > 1 and len(pending) > 1:
+        print("> SYNTH %d variables with %d jobs" % (len(pending),jobs))
+        synthesized = synthesize_parallel(board,prob,pending, \
+                                          synth_depth,vadp_fragments, \
+                                          min(jobs,len(pending)), \
+                                          cache_dir=cache_dir, \
+                                          unify_seed=unify_seed)
+
+    # merge in program order so the output does not depend on scheduling
+    for variable in prob.variables():
+        if not variable in fragments:
+            expr = prob.binding(variable)
+            if variable in synthesized:
+                frags,exhaustive = synthesized[variable]
+            else:
+                print("> SYNTH %s = %s" % (variable,expr))
+                frags,exhaustive = synthesize_fragments(board, \
+                                                        compute_blocks, \
+                                                        laws,variable,expr, \
+                                                        synth_depth, \
+                                                        vadp_fragments)
+            fragments[variable] = frags
+            if not cache is None:
+                cache.put(variable,expr,synth_depth,frags,exhaustive)
 
         print("VAR %s: %d fragments"  \
               % (variable,len(fragments[variable])))
         if len(fragments[variable]) == 0:
             raise Exception("could not synthesize any fragments for <%s>" % variable)
 
+    if not cache is None:
+        print(cache)
+
+    print(unifylib.UNIFY_MEMO)
+    print(lambdoplib.EQUIVALENT_MEMO)
+    print(lambdoplib.SIMPLIFY_MEMO)
+    if not cache_dir is None:
+        unifylib.UNIFY_MEMO.save(unify_memo_file(cache_dir))
+
     print("> assembling circuit")
     # insert copier blocks when necessary
     assemble_blocks = list(filter(lambda blk: \
@@ -133,9 +307,10 @@ def compile(board,prob,
 
 
     print("> routing circuit")
+    backend = routesolverlib.SolverBackend(route_solver)
     adp_circuits = []
     for circ in vadp_circuits:
-        for vadp in routelib.route(board,circ):
+        for vadp in routelib.route(board,circ,backend):
             adp = vadplib.to_adp(vadp)
             adp_circuits.append(adp)
             yield adp
@@ -12,6 +12,8 @@ class LocAssignmentStack:
       assert(isinstance(assigns,routeproblib.LocAssignments))
       self.assigns = assigns
       self.negations = []
+      # routing model for the next view, constrained by these assignments
+      self.model = None
 
     def add_negation(self,neg):
       assert(isinstance(neg,routeproblib.LocAssignments))
@@ -19,6 +21,29 @@ class LocAssignmentStack:
 
   def __init__(self):
     self._stack =  []
+    self._root_model = None
+    self._root_negations = []
+
+  @property
+  def negations(self):
+    entry = self.top()
+    return self._root_negations if entry is None else entry.negations
+
+  def add_negation(self,neg):
+    # rule out assignments for the view below the top of the stack
+    assert(isinstance(neg,routeproblib.LocAssignments))
+    self.negations.append(neg)
+
+  def get_model(self):
+    entry = self.top()
+    return self._root_model if entry is None else entry.model
+
+  def set_model(self,model):
+    entry = self.top()
+    if entry is None:
+      self._root_model = model
+    else:
+      entry.model = model
 
   @property
   def ptr(self):
@@ -42,14 +67,15 @@ class LocAssignmentStack:
     tmp = self._stack[:-1]
     self._stack = tmp
 
-def routing_problem(board,view,vadp,entry):
+def routing_problem(board,view,vadp,entry,negations=[]):
   if not entry is None:
     prob = routeproblib.RoutingProblem(board,view, \
                                        entry.assigns, \
                                        entry.negations)
 
   else:
-    prob = routeproblib.RoutingProblem(board,view)
+    prob = routeproblib.RoutingProblem(board,view, \
+                                       negations=negations)
 
   for vadpstmt in vadp:
     if isinstance(vadpstmt, vadplib.VADPConfig):
@@ -85,10 +111,10 @@ def use_route_blocks(dev,used_route_blocks,conn_assign):
     assert(len(blk.data) == 0)
     # get first compatible instance that has not been used yet
     try:
-      inst = next(inst for inst in dev.layout.instances(route_block) \
-                  if not devlib.Layout \
-                  .intersection(inst,route_inst_pattern) is None and \
-                  (route_block,inst) not in used_route_blocks )
+      inst = next(inst for inst in \
+                  dev.layout.matching_instances(route_block, \
+                                                route_inst_pattern) \
+                  if (route_block,inst) not in used_route_blocks )
 
       new_path[1+idx]= (route_block,inst)
       used_route_blocks.append((route_block,inst))
@@ -178,17 +204,31 @@ def finalize(board,vadp,assigns):
 
   return new_vadp
 
-def route_next_solution(board,vadp,assign_stack):
+def route_next_solution(board,vadp,assign_stack, \
+                        backend=route_solver.SolverBackend.CBC):
   views = board.layout.views
   while assign_stack.ptr <= len(views)-1 and assign_stack.ptr >= 0:
     print("--> routing view %s" % views[assign_stack.ptr])
     view = views[assign_stack.ptr]
-    # build routing problem
-    prob = routing_problem(board,view,vadp, \
-                           assign_stack.top())
-    assigns = route_solver.solve(prob)
+    # build routing problem once per parent assignment, later solves
+    # only add the negations of the solutions already enumerated.
+    model = assign_stack.get_model()
+    if model is None:
+      prob = routing_problem(board,view,vadp, \
+                             assign_stack.top(), \
+                             assign_stack.negations)
+      model = route_solver.RoutingModel(prob,backend)
+      assign_stack.set_model(model)
+
+    assigns = model.solve()
     if assigns is None:
+      if assign_stack.ptr == 0:
+        break
+      # no completion exists below this assignment, so rule it out
+      # in the parent's model before solving it again.
+      dead_end = assign_stack.top()
       assign_stack.pop()
+      assign_stack.add_negation(dead_end.assigns)
     else:
       assert(not assigns is None)
       assign_stack.push(LocAssignmentStack.Entry(assigns))
@@ -200,7 +240,7 @@ def route_next_solution(board,vadp,assign_stack):
 
 
 
-def route(board,vadp):
+def route(board,vadp,backend=route_solver.SolverBackend.CBC):
   # assign each block to a chip
   # assign each block to a tile, given chip assignments
   # assign each block to a slice, given tile assignments
@@ -210,11 +250,11 @@ def route(board,vadp):
   has_solution = True
   negations = []
   while has_solution:
-    result = route_next_solution(board,vadp,assign_stack)
+    result = route_next_solution(board,vadp,assign_stack,backend)
     if not result is None:
       yield finalize(board,vadp,result.assigns)
       # remove result
       assign_stack.pop()
-      assign_stack.top().add_negation(result.assigns)
+      assign_stack.add_negation(result.assigns)
     else:
       has_solution = False
@@ -14,14 +14,21 @@ class BlockInstanceResource:
   def __repr__(self):
     return "res(%s@%s)" % (self.block.name, self.loc)
 
+  @property
+  def key(self):
+    return (self.block.name,self.loc.key)
+
   def __eq__(self,other):
-    return str(self) == str(other)
+    if not isinstance(other,BlockInstanceResource):
+      return False
+    return self.key == other.key
+
+  def __hash__(self):
+    return hash(self.key)
 
   def limit(self):
-    n_instances = len(list(filter(lambda inst:  \
-                          devlib.Layout.intersection(inst,self.loc.address), \
-                          self.dev.layout.instances(self.block.name))))
-    return n_instances
+    return len(self.dev.layout.matching_instances(self.block.name, \
+                                                  self.loc.address))
 
 class ConnectionResource:
 
@@ -37,14 +44,11 @@ class ConnectionResource:
     self.dest_port = dport
 
   def limit(self):
-    n_src = len(list(filter(lambda inst:  \
-                          devlib.Layout.intersection(inst, \
-                                                    self.source_loc.address), \
-                          self.dev.layout.instances(self.source_block.name))))
-    n_dest = len(list(filter(lambda inst:  \
-                          devlib.Layout.intersection(inst, \
-                                                    self.dest_loc.address), \
-                          self.dev.layout.instances(self.dest_block.name))))
+    layout = self.dev.layout
+    n_src = len(layout.matching_instances(self.source_block.name, \
+                                          self.source_loc.address))
+    n_dest = len(layout.matching_instances(self.dest_block.name, \
+                                           self.dest_loc.address))
     return min(n_src,n_dest)
 
   def __repr__(self):
@@ -79,6 +83,19 @@ class ConnectionAssignVar:
     self.path = path
     self.path_id = path_id
 
+  @property
+  def conn_key(self):
+    return (self.source_block.name,self.source_ident,self.source_port.name, \
+            self.dest_block.name,self.dest_ident,self.dest_port.name)
+
+  @property
+  def source_key(self):
+    return (self.source_block.name,self.source_ident,self.source_loc.key)
+
+  @property
+  def dest_key(self):
+    return (self.dest_block.name,self.dest_ident,self.dest_loc.key)
+
   def __repr__(self):
     return "assign-conn((%s,%d,%s,%s,%d,%s) -> (%s,%s,%d))" \
       % (self.source_block.name,self.source_ident,self.source_port.name, \
@@ -124,6 +141,14 @@ class BlockIdentifierAssignVar:
     self.ident = ident
     self.loc = loc
 
+  @property
+  def ident_key(self):
+    return (self.block.name,self.ident)
+
+  @property
+  def key(self):
+    return (self.block.name,self.ident,self.loc.key)
+
   def __repr__(self):
     return "assign(%s.%d => %s)" % (self.block.name, \
                                     self.ident,
@@ -186,13 +211,23 @@ class RoutingProblem:
     self.message = None
     self.assignments = assignments
     self.negations = negations
+    # indices over the problem variables
+    self._assigns_by_ident = {}
+    self._resources_by_key = {}
 
   def fail(self,msg):
     self.message = msg
     self.valid = False
 
+  def add_resource(self,res):
+    if not res.key in self._resources_by_key:
+      self._resources_by_key[res.key] = res
+      self.resources.append(res)
 
-  def _get_matching_instance_variable(self,variables ,v):
+  def get_resource(self,key):
+    return self._resources_by_key[key]
+
+  def _get_matching_instance_variable(self,variables,v):
     assert(isinstance(v,BlockIdentifierAssignVar))
 
     for assign in variables:
@@ -205,11 +240,22 @@ class RoutingProblem:
 
     return None
 
+  def _candidate_assigns(self,assigns,v):
+    if assigns is None:
+      return []
+    elif isinstance(assigns,LocAssignments):
+      key = v.ident_key
+      return [assigns.by_ident[key]] if key in assigns.by_ident else []
+    else:
+      return self._assigns_by_ident.get(v.ident_key,[])
 
   def is_valid_instance_assignment(self,block,identifier,loc):
+    if self.assignments is None:
+      return True
+
     v = BlockIdentifierAssignVar(self.dev,block,identifier,loc)
-    return self.assignments is None or \
-      not self._get_matching_instance_variable(self.assignments,v) is None
+    candidates = self._candidate_assigns(self.assignments,v)
+    return not self._get_matching_instance_variable(candidates,v) is None
 
 
   def get_negations(self):
@@ -217,7 +263,8 @@ class RoutingProblem:
       prev_assigns = []
       for assign in neg:
         assert(isinstance(assign,BlockIdentifierAssignVar))
-        mvar = self._get_matching_instance_variable(self.identifier_assigns,assign)
+        candidates = self._candidate_assigns(self.identifier_assigns,assign)
+        mvar = self._get_matching_instance_variable(candidates,assign)
         if not mvar is None:
           prev_assigns.append(mvar)
         else:
@@ -228,9 +275,9 @@ class RoutingProblem:
 
 
   def add_virtual_instance(self,block,identifier):
-    instances = set(map(lambda full_loc: \
-                    devlib.Location(self.dev.layout.prefix(full_loc,self.view)),\
-                    self.dev.layout.instances(block.name)))
+    instances = list(map(lambda prefix: devlib.Location(prefix), \
+                         self.dev.layout.instance_prefixes(block.name, \
+                                                           self.view)))
 
 
     if len(instances) == 0:
@@ -247,22 +294,20 @@ class RoutingProblem:
                                         loc)
       self.identifier_assigns \
           .append(assign)
+      if not assign.ident_key in self._assigns_by_ident:
+        self._assigns_by_ident[assign.ident_key] = []
+      self._assigns_by_ident[assign.ident_key].append(assign)
 
       for res in assign.resources():
-            if not res in self.resources:
-              self.resources.append(res)
+        self.add_resource(res)
 
 
 
   def add_virtual_conn(self,sblk,sident,sport, \
                        dblk,dident,dport):
 
-    source_idents = list(filter(lambda v: v.block.name == sblk.name and \
-                           v.ident == sident,
-                           self.identifier_assigns))
-    dest_idents = list(filter(lambda v: v.block.name == dblk.name and \
-                           v.ident == dident,
-                           self.identifier_assigns))
+    source_idents = self._assigns_by_ident.get((sblk.name,sident),[])
+    dest_idents = self._assigns_by_ident.get((dblk.name,dident),[])
 
     n_paths = 0
     for src_assign in source_idents:
@@ -290,8 +335,7 @@ class RoutingProblem:
           n_paths += 1
           self.conn_assigns.append(assign)
           for res in assign.resources():
-            if not res in self.resources:
-              self.resources.append(res)
+            self.add_resource(res)
 
     if n_paths == 0:
       self.fail(" no paths for conn <%s,%d,%s> -> <%s,%d,%s>" \
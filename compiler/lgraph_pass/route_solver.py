@@ -1,53 +1,35 @@
 import pulp
+import time
+from enum import Enum
 import compiler.lgraph_pass.route_problem as routelib
 
 def groupby(keyfun,lst):
   groups = {}
   for el in lst:
-    grps = keyfun(el)
-    for grp in grps:
-      if not str(grp) in groups:
-        groups[str(grp)] = []
-      groups[str(grp)].append(el)
+    for grp in keyfun(el):
+      if not grp in groups:
+        groups[grp] = []
+      groups[grp].append(el)
 
   return groups.items()
 
 def group_conn_assign_by_conn_identifier(lst):
-  def keyfun(inst_assign):
-    return ["((%s.%d.%s)->(%s.%d.%s))" % \
-            (inst_assign.source_block.name,
-             inst_assign.source_ident,
-             inst_assign.source_port.name,
-             inst_assign.dest_block.name,
-             inst_assign.dest_ident,
-             inst_assign.dest_port.name)]
-
-  for key,value in groupby(keyfun,lst):
+  for key,value in groupby(lambda assign: [assign.conn_key],lst):
       yield key,value
 
 def group_inst_assign_by_block_identifier(lst):
-  def keyfun(inst_assign):
-    return ["%s.%d" % (inst_assign.block.name,
-                      inst_assign.ident)]
-
-  for key,value in groupby(keyfun,lst):
+  for key,value in groupby(lambda assign: [assign.ident_key],lst):
       yield key,value
 
 def group_assign_by_resource(lst):
   def keyfun(assign):
-      return list(map(lambda res: str(res), \
+      return list(map(lambda res: res.key, \
                       assign.resources()))
 
   for key,value in groupby(keyfun,lst):
       yield key,value
 
 
-def ilp_tempvar(ilp):
-  return "temp%d" % len(ilp.variables())
-
-def ilp_not(ilp,clause,name):
-  return 1-clause
-
 def ilp_implies(ilp,condvar,stmt,name):
   # condvar^stmt
   # if p then q
@@ -59,108 +41,229 @@ def ilp_implies(ilp,condvar,stmt,name):
   # | 1 | 0 |
   ilp += (condvar <= stmt),name
 
-def ilp_and(ilp,c1,c2,name):
-  tempvar_name = ilp_tempvar(ilp)
-  tempvar = pulp.LpVariable(tempvar_name,
-                            cat='Binary')
-
-  cstr = (c1+c2-2*tempvar >= 0)
-  ilp += cstr,name+".lower"
-  cstr = (c1+c2-2*tempvar <= 1)
-  ilp += cstr,name+".upper"
-  return tempvar
 
-
-def solve(prob):
+def build_ilp(prob):
   ilp = pulp.LpProblem("routing",pulp.LpMinimize)
-  if not prob.valid:
-    print("failed during problem construction: %s" % prob.message)
-    return None
 
-  ident_assign_by_name = {}
-  for ident_assign in prob.identifier_assigns:
-    ident_assign.ilpvar = pulp.LpVariable(str(ident_assign),
+  ident_assign_by_key = {}
+  for idx,ident_assign in enumerate(prob.identifier_assigns):
+    ident_assign.ilpvar = pulp.LpVariable("inst%d" % idx,
                                           cat='Binary')
-    ident_assign_by_name[str(ident_assign)] = ident_assign
+    ident_assign_by_key[ident_assign.key] = ident_assign
 
 
-  for conn_assign in prob.conn_assigns:
-    conn_assign.ilpvar = pulp.LpVariable(str(conn_assign),
+  for idx,conn_assign in enumerate(prob.conn_assigns):
+    conn_assign.ilpvar = pulp.LpVariable("conn%d" % idx,
                                          cat='Binary')
 
 
-  resource_by_name = {}
-  for resource in prob.resources:
-    resource.ilpvar = pulp.LpVariable(str(resource),
+  for idx,resource in enumerate(prob.resources):
+    resource.ilpvar = pulp.LpVariable("res%d" % idx,
                                       lowBound=0,
                                       upBound=resource.limit(),
                                       cat='Integer')
-    resource_by_name[str(resource)] = resource
 
   # objective function: minimize resource consumption
-  ilp += sum(map(lambda r: r.ilpvar, prob.resources))
+  ilp += pulp.lpSum(map(lambda r: r.ilpvar, prob.resources))
 
   # each identifier is assigned to exactly one instance
-  for group_name,idents in \
-      group_inst_assign_by_block_identifier(prob.identifier_assigns):
-    ilp += sum(map(lambda ident: ident.ilpvar, idents)) == 1,group_name
+  for idx,(_,idents) in \
+      enumerate(group_inst_assign_by_block_identifier(prob.identifier_assigns)):
+    ilp += pulp.lpSum(map(lambda ident: ident.ilpvar, idents)) == 1, \
+      "ident%d" % idx
 
   # each connection identifier is assigned to exactly one instance
-  for group_name,idents in \
-      group_conn_assign_by_conn_identifier(prob.conn_assigns):
-    ilp += sum(map(lambda ident: ident.ilpvar, idents)) == 1,group_name
+  for idx,(_,idents) in \
+      enumerate(group_conn_assign_by_conn_identifier(prob.conn_assigns)):
+    ilp += pulp.lpSum(map(lambda ident: ident.ilpvar, idents)) == 1, \
+      "connident%d" % idx
 
   # a connection assignment implies instance assignments
-  for conn_assign in prob.conn_assigns:
-    src_assign_key = routelib.BlockIdentifierAssignVar(conn_assign.dev, \
-                                             conn_assign.source_block,
-                                             conn_assign.source_ident,
-                                             conn_assign.source_loc)
-    dest_assign_key = routelib.BlockIdentifierAssignVar(conn_assign.dev, \
-                                                conn_assign.dest_block,
-                                              conn_assign.dest_ident,
-                                                conn_assign.dest_loc)
-    src_assign = ident_assign_by_name[str(src_assign_key)]
-    dest_assign = ident_assign_by_name[str(dest_assign_key)]
-
-    name = str(conn_assign)+":instances"
-    and_conn = ilp_and(ilp, \
-                       src_assign.ilpvar, \
-                       dest_assign.ilpvar, \
-                       name+".and")
-    ilp_implies(ilp,conn_assign.ilpvar,and_conn,name+".implies")
+  for idx,conn_assign in enumerate(prob.conn_assigns):
+    src_assign = ident_assign_by_key[conn_assign.source_key]
+    dest_assign = ident_assign_by_key[conn_assign.dest_key]
+
+    name = "conn%d:instances" % idx
+    ilp_implies(ilp,conn_assign.ilpvar,src_assign.ilpvar,name+".src")
+    ilp_implies(ilp,conn_assign.ilpvar,dest_assign.ilpvar,name+".dest")
 
   # each resource has a limited number quantity
-  for resource_name,idents in \
-      group_assign_by_resource(prob.identifier_assigns \
-                                       + prob.conn_assigns):
+  for idx,(resource_key,idents) in \
+      enumerate(group_assign_by_resource(prob.identifier_assigns \
+                                         + prob.conn_assigns)):
+
+      resource_var = prob.get_resource(resource_key).ilpvar
+      ilp += pulp.lpSum(map(lambda ident: ident.ilpvar, idents)) \
+             == resource_var,"resource%d" % idx
 
-      resource_var = resource_by_name[resource_name].ilpvar
-      ilp += sum(map(lambda ident: ident.ilpvar, idents)) \
-             == resource_var,resource_name
 
+  return ilp
 
+def add_negation(ilp,neg,idx):
   # don't repeat old models
-  for idx,neg in enumerate(prob.get_negations()):
-    if len(neg) > 1:
-      total_assigns = len(neg)
-      assign_clause = sum(map(lambda ident: ident.ilpvar, neg)) + 1
-      print(assign_clause <= total_assigns)
-      ilp += assign_clause <= total_assigns,"negate-model-%d" % idx
-
-
-  ilp.solve()
-  status = pulp.LpStatus[ilp.status]
-  if status == "Optimal":
-    assigns = routelib.LocAssignments()
-    for ident_assign in prob.identifier_assigns:
-      if ident_assign.ilpvar.varValue == 1.0:
-        assigns.add(ident_assign)
-    for conn_assign in prob.conn_assigns:
-      if conn_assign.ilpvar.varValue == 1.0:
-        assigns.add_conn(conn_assign)
-
-    return assigns
+  if len(neg) > 1:
+    total_assigns = len(neg)
+    assign_clause = pulp.lpSum(map(lambda ident: ident.ilpvar, neg)) + 1
+    ilp += assign_clause <= total_assigns,"negate-model-%d" % idx
+
+class SolverBackend(Enum):
+  CBC = "cbc"
+  HIGHS = "highs"
+  ORTOOLS = "ortools"
+
+def _solve_pulp(ilp,backend,warm_start):
+  if backend == SolverBackend.CBC:
+    try:
+      solver = pulp.PULP_CBC_CMD(warmStart=warm_start)
+    except TypeError:
+      # older pulp releases do not support warm starts
+      solver = pulp.PULP_CBC_CMD()
+  elif backend == SolverBackend.HIGHS:
+    if not hasattr(pulp,'HiGHS_CMD'):
+      raise Exception("this version of pulp does not support HiGHS")
+    solver = pulp.HiGHS_CMD()
   else:
-    print("[WARN] Failed with status <%s>" % status)
-    return None
+    raise Exception("unknown pulp backend: %s" % backend)
+
+  ilp.solve(solver)
+  return pulp.LpStatus[ilp.status]
+
+class _OrtoolsModel:
+  '''
+  pywraplp copy of a pulp model. The solver is created once; constraints
+  added to the pulp model after a solve are transferred before the next
+  one, so the OR-tools model stays alive between solves.
+  '''
+
+  def __init__(self,ilp):
+    from ortools.linear_solver import pywraplp
+    self.pywraplp = pywraplp
+    self.solver = pywraplp.Solver.CreateSolver("SCIP")
+    if self.solver is None:
+      raise Exception("ortools was built without a MIP solver")
+
+    self.ilp = ilp
+    self.ortvars = {}
+    self.n_constraints = 0
+    for v in ilp.variables():
+      self.add_variable(v)
+
+    self.solver.Minimize(self.solver.Sum([coeff*self.ortvars[v.name] \
+                                          for v,coeff in ilp.objective.items()]))
+
+  def add_variable(self,v):
+    if v.name in self.ortvars:
+      return self.ortvars[v.name]
+
+    solver = self.solver
+    lb = -solver.infinity() if v.lowBound is None else v.lowBound
+    ub = solver.infinity() if v.upBound is None else v.upBound
+    if v.cat == pulp.LpInteger:
+      self.ortvars[v.name] = solver.IntVar(lb,ub,v.name)
+    else:
+      self.ortvars[v.name] = solver.NumVar(lb,ub,v.name)
+    return self.ortvars[v.name]
+
+  def add_constraints(self):
+    cstrs = list(self.ilp.constraints.items())
+    for name,cstr in cstrs[self.n_constraints:]:
+      # pulp stores constraints as expr + constant (sense) 0
+      rhs = -cstr.constant
+      expr = self.solver.Sum([coeff*self.add_variable(v) \
+                              for v,coeff in cstr.items()])
+      if cstr.sense == pulp.LpConstraintEQ:
+        self.solver.Add(expr == rhs,name)
+      elif cstr.sense == pulp.LpConstraintLE:
+        self.solver.Add(expr <= rhs,name)
+      else:
+        self.solver.Add(expr >= rhs,name)
+
+    self.n_constraints = len(cstrs)
+
+  def solve(self,warm_start):
+    self.add_constraints()
+    ilpvars = self.ilp.variables()
+    if warm_start:
+      hints = list(filter(lambda v: not v.varValue is None, ilpvars))
+      self.solver.SetHint(list(map(lambda v: self.ortvars[v.name], hints)), \
+                          list(map(lambda v: v.varValue, hints)))
+
+    status = self.solver.Solve()
+    if status == self.pywraplp.Solver.OPTIMAL:
+      for v in ilpvars:
+        v.varValue = round(self.ortvars[v.name].solution_value())
+      return "Optimal"
+    elif status == self.pywraplp.Solver.INFEASIBLE:
+      return "Infeasible"
+    else:
+      return "Not Solved"
+
+class RoutingModel:
+  '''
+  persistent ilp for one routing problem. The model is built once, and
+  every later solve only adds the negation cuts that were added to the
+  problem since the previous solve, warm-started from the previous
+  assignment. With the OR-tools backend the solver model is kept too.
+  '''
+
+  def __init__(self,prob,backend=SolverBackend.CBC):
+    self.prob = prob
+    self.backend = backend
+    self.ilp = None
+    self.ortools = None
+    self.n_negations = 0
+    self.solved = False
+    if not prob.valid:
+      return
+
+    build_start = time.time()
+    self.ilp = build_ilp(prob)
+    print("[route] ilp build=%.3fs" % (time.time() - build_start))
+
+  def add_negations(self):
+    for idx,neg in enumerate(self.prob.get_negations()):
+      if idx < self.n_negations:
+        continue
+      add_negation(self.ilp,neg,idx)
+      self.n_negations = idx + 1
+
+  def solve(self):
+    if not self.prob.valid:
+      print("failed during problem construction: %s" % self.prob.message)
+      return None
+
+    build_start = time.time()
+    self.add_negations()
+    build_time = time.time() - build_start
+
+    solve_start = time.time()
+    if self.backend == SolverBackend.ORTOOLS:
+      if self.ortools is None:
+        self.ortools = _OrtoolsModel(self.ilp)
+      status = self.ortools.solve(self.solved)
+    else:
+      status = _solve_pulp(self.ilp,self.backend,self.solved)
+    solve_time = time.time() - solve_start
+    print("[route] negations=%d cut-build=%.3fs solve=%.3fs warm=%s" \
+          % (self.n_negations,build_time,solve_time,self.solved))
+
+    if status == "Optimal":
+      self.solved = True
+      return extract_assignments(self.prob)
+    else:
+      print("[WARN] Failed with status <%s>" % status)
+      return None
+
+def extract_assignments(prob):
+  assigns = routelib.LocAssignments()
+  for ident_assign in prob.identifier_assigns:
+    if ident_assign.ilpvar.varValue == 1.0:
+      assigns.add(ident_assign)
+  for conn_assign in prob.conn_assigns:
+    if conn_assign.ilpvar.varValue == 1.0:
+      assigns.add_conn(conn_assign)
+
+  return assigns
+
+def solve(prob,backend=SolverBackend.CBC):
+  return RoutingModel(prob,backend).solve()
@@ -7,7 +7,7 @@ import ops.base_op as oplib
 import ops.generic_op as genoplib
 import ops.lambda_op as lambdlib
 import numpy as np
-from functools import cmp_to_key
+import heapq
 
 def make_initial_tableau(blocks,laws,variable,expr):
   tab = Tableau()
@@ -245,12 +245,6 @@ def derive_tableaus(dev,tableau,goal):
       raise Exception("unknown relation")
 
 
-def get_valid_tableaus(frontier,depth):
-  for tab,idx in frontier:
-    assert(not tab.success())
-    if idx < depth:
-      yield tab,idx
-
 def tableau_stats(tab,depth):
   cost = 0.0
   for goal in tab.goals:
@@ -261,30 +255,6 @@ def tableau_stats(tab,depth):
   goal_size = len(tab.goals)
   return cost,vadp_size,goal_size,depth
 
-def _order_tableaus(tab1,tab2):
-  cost1,vadp_size1,goal_size1,depth1 = tableau_stats(*tab1)
-  cost2,vadp_size2,goal_size2,depth2 = tableau_stats(*tab2)
-  if cost1 < cost2:
-    return -1
-  elif cost1 > cost2:
-    return 1
-  else:
-    if vadp_size1 < vadp_size2:
-      return -1
-    elif vadp_size1 > vadp_size2:
-      return 1
-    else:
-      if goal_size1 < goal_size2:
-        return -1
-      elif goal_size1 > goal_size2:
-        return 1
-      else:
-        return 0
-
-def sort_tableaus(tabs):
-  tab_key = cmp_to_key(_order_tableaus)
-  tabs.sort(key=tab_key)
-
 def tableau_complexity(tableau,depth):
   cost = 0.0
   for goal in tableau.goals:
@@ -301,20 +271,58 @@ def goal_complexity(goal):
 
   return goal.expr.count()
 
-def select_tableau(frontier,complexity):
-  sort_tableaus(frontier)
-  tab,tab_depth = frontier[0]
-  return tab,tab_depth,frontier[1:]
+class Frontier:
   '''
-  penalty = list(map(lambda tab: complexity(*tab), frontier))
-  idx = np.argmin(penalty)
-  tableau,tableau_depth = frontier[idx]
-  other_tableaus = list(map(lambda i: frontier[i], \
-                            filter(lambda i: i != idx, \
-                                   range(0,len(frontier)))))
-  return tableau,tableau_depth,other_tableaus
+  heap-ordered set of tableaus to explore. Tableaus are ordered by
+  (max goal cost, vadp size, goal count), and ties are broken by insertion
+  order. Tableaus that exceed the depth limit, or that are equivalent to an
+  already seen tableau at the same or a lower depth, are pruned.
   '''
 
+  def __init__(self,max_depth):
+    self.max_depth = max_depth
+    self._heap = []
+    self._seen = {}
+    self._count = 0
+    self.expanded = 0
+    self.pruned_depth = 0
+    self.pruned_duplicate = 0
+    self.max_size = 0
+
+  def push(self,tableau,depth):
+    if depth >= self.max_depth:
+      self.pruned_depth += 1
+      return False
+
+    fingerprint = tableau.fingerprint()
+    if fingerprint in self._seen and \
+       self._seen[fingerprint] <= depth:
+      self.pruned_duplicate += 1
+      return False
+
+    self._seen[fingerprint] = depth
+    cost,vadp_size,goal_size,_ = tableau_stats(tableau,depth)
+    heapq.heappush(self._heap, \
+                   (cost,vadp_size,goal_size,self._count,tableau,depth))
+    self._count += 1
+    self.max_size = max(self.max_size,len(self._heap))
+    return True
+
+  def pop(self):
+    _,_,_,_,tableau,depth = heapq.heappop(self._heap)
+    self.expanded += 1
+    return tableau,depth
+
+  def __len__(self):
+    return len(self._heap)
+
+  def __repr__(self):
+    return "frontier size=%d max-size=%d expanded=%d " \
+      "pruned-duplicate=%d pruned-depth=%d" % (len(self),self.max_size, \
+                                               self.expanded, \
+                                               self.pruned_duplicate, \
+                                               self.pruned_depth)
+
 def select_goal(goals,complexity):
   penalty = list(map(lambda goal: complexity(goal), goals))
   idx = np.argmin(penalty)
@@ -350,17 +358,14 @@ def search(dev,blocks,laws,variable,expr,depth=20):
   tableau = make_initial_tableau(blocks,laws, \
                                  variable,expr)
 
-  frontier = [(tableau,0)]
+  frontier = Frontier(depth)
+  frontier.push(tableau,0)
 
   #debug = True
   debug = False
-  next_frontier = []
-  valid_tableaus = list(get_valid_tableaus(frontier,depth))
   solutions = 0
-  while len(valid_tableaus) > 0:
-    tableau,tab_depth,other_tableaus = select_tableau(valid_tableaus, \
-                                                      tableau_complexity)
-    next_frontier = other_tableaus
+  while len(frontier) > 0:
+    tableau,tab_depth = frontier.pop()
     goal,other_goals = select_goal(tableau.goals, \
                        goal_complexity)
     if debug:
@@ -393,7 +398,7 @@ def search(dev,blocks,laws,variable,expr,depth=20):
         print("SUCCESS")
         solutions += 1
       else:
-        next_frontier.append((simpl_tableau,tab_depth + 1))
+        frontier.push(simpl_tableau,tab_depth + 1)
         if debug:
           print("-- depth=%d cost=%f --" % (tab_depth+1, \
                                             tableau_complexity(simpl_tableau,tab_depth+1)))
@@ -401,8 +406,8 @@ def search(dev,blocks,laws,variable,expr,depth=20):
             print(goal)
           print("--------------")
 
-    valid_tableaus = list(get_valid_tableaus(next_frontier,depth))
-    print("number tableaus: %d" % len(valid_tableaus))
+    print("number tableaus: %d" % len(frontier))
 
   print("Solutions for <%s=%s>: %d" % (variable,expr,solutions))
+  print(frontier)
 
@@ -0,0 +1,134 @@
+import compiler.lgraph_pass.vadp as vadplib
+
+import hashlib
+import json
+import os
+
+'''
+On-disk cache of the vadp fragments produced by synth.search. The cache key
+hashes the variable binding, the relations of the blocks and laws that
+participate in synthesis, the synthesis depth, the unification seed and the
+source of the hardware library, so editing a block or device specification
+invalidates every entry.
+'''
+
+HWLIB_DIR = os.path.join(os.path.dirname(__file__),"..","..","hwlib")
+
+def hwlib_sources():
+  # every hcdc module, including blocks added later, and the generic block
+  # and device definitions they build on.
+  hcdc_dir = os.path.join(HWLIB_DIR,"hcdc")
+  sources = ["block.py","device.py"]
+  sources += sorted(map(lambda name: "hcdc/%s" % name, \
+                        filter(lambda name: name.endswith(".py"), \
+                               os.listdir(hcdc_dir))))
+  return sources
+
+def hwlib_fingerprint():
+  digest = hashlib.sha256()
+  for relname in hwlib_sources():
+    filename = os.path.join(HWLIB_DIR,relname)
+    digest.update(relname.encode('utf-8'))
+    with open(filename,'rb') as fh:
+      digest.update(fh.read())
+
+  return digest.hexdigest()
+
+def block_signature(block):
+  rels = []
+  for output in block.outputs:
+    for expr,modes in output.relation.get_by_property():
+      rels.append([output.name,str(expr), \
+                   list(map(lambda m: str(m), modes))])
+  return [block.name,rels]
+
+def law_signature(law):
+  return [law.name, \
+          list(map(lambda tup: [str(tup[0]),str(tup[1])], \
+                   law.virt.relations))]
+
+class SynthCache:
+
+  def __init__(self,dev,blocks,laws,cache_dir,unify_seed=0):
+    self.dev = dev
+    self.cache_dir = cache_dir
+    self.hits = 0
+    self.misses = 0
+    self._context = json.dumps({
+      'device': dev.name,
+      'hwlib': hwlib_fingerprint(),
+      'blocks': list(map(block_signature, blocks)),
+      'laws': list(map(law_signature, laws)),
+      'unify_seed': unify_seed
+    },sort_keys=True)
+
+  def key(self,variable,expr,depth):
+    digest = hashlib.sha256()
+    digest.update(self._context.encode('utf-8'))
+    digest.update(json.dumps([variable,str(expr),depth]).encode('utf-8'))
+    return digest.hexdigest()
+
+  def _filename(self,key):
+    return "%s/frag-%s.json" % (self.cache_dir,key)
+
+  def get(self,variable,expr,depth,n_frags):
+    '''
+    returns the cached fragments if the cache entry holds at least n_frags
+    fragments or the cached search was exhaustive, otherwise None.
+    '''
+    filename = self._filename(self.key(variable,expr,depth))
+    if not os.path.exists(filename):
+      self.misses += 1
+      return None
+
+    try:
+      with open(filename,'r') as fh:
+        obj = json.loads(fh.read())
+    except ValueError as e:
+      # a truncated or corrupt entry is dropped and searched for again
+      print("[warn] removing corrupt synthesis cache entry <%s>: %s" \
+            % (filename,e))
+      if os.path.exists(filename):
+        os.remove(filename)
+      self.misses += 1
+      return None
+
+    frags = obj['fragments']
+    if len(frags) < n_frags and not obj['exhaustive']:
+      self.misses += 1
+      return None
+
+    try:
+      result = list(map(lambda frag: vadplib.vadp_from_json(self.dev,frag), \
+                        frags[:n_frags]))
+    except Exception as e:
+      print("[warn] could not load cached fragments for <%s>: %s" \
+            % (variable,e))
+      self.misses += 1
+      return None
+
+    self.hits += 1
+    return result
+
+  def put(self,variable,expr,depth,frags,exhaustive):
+    filename = self._filename(self.key(variable,expr,depth))
+    obj = {
+      'variable': variable,
+      'expr': str(expr),
+      'depth': depth,
+      'exhaustive': exhaustive
+    }
+    try:
+      obj['fragments'] = list(map(lambda frag: vadplib.vadp_to_json(frag), \
+                                  frags))
+    except Exception as e:
+      print("[warn] could not cache fragments for <%s>: %s" % (variable,e))
+      return
+
+    tmpfile = filename + ".tmp"
+    with open(tmpfile,'w') as fh:
+      fh.write(json.dumps(obj))
+    os.replace(tmpfile,filename)
+
+  def __repr__(self):
+    return "synth-cache hits=%d misses=%d" % (self.hits,self.misses)
@@ -1,4 +1,5 @@
 import hwlib.block as blocklib
+import hashlib
 import compiler.lgraph_pass.unify as unifylib
 import ops.base_op as oplib
 from compiler.lgraph_pass.vadp import * 
@@ -129,6 +130,14 @@ class PhysicsLawRelation:
   def __repr__(self):
     return "%s = %s @ %s" % (self.target,self.mode,self.expr)
 
+def fingerprint_text(item):
+  # port relation reprs leave out the modes synthesis narrows them to,
+  # but relations in different modes derive different tableaus.
+  text = str(item)
+  if isinstance(item,PortRelation) and not item.modes is None:
+    text += " modes=%s" % ",".join(sorted(map(str,item.modes)))
+  return text
+
 class Tableau:
 
   def __init__(self):
@@ -151,6 +160,17 @@ class Tableau:
   def success(self):
     return len(self.goals) == 0
 
+  def fingerprint(self):
+    # canonical, order-independent digest of the tableau state. Two
+    # tableaus with the same fingerprint derive the same tableaus.
+    digest = hashlib.sha1()
+    for section in [self.goals,self.relations,self.vadp]:
+      for text in sorted(map(fingerprint_text, section)):
+        digest.update(text.encode('utf-8'))
+        digest.update(b"\n")
+      digest.update(b"--\n")
+    return digest.hexdigest()
+
   def remove_relation(self,relation):
     assert(isinstance(relation,PortRelation) or \
            isinstance(relation,LawRelation))
@@ -5,6 +5,8 @@ import ops.lambda_op as lambdoplib
 from itertools import chain, combinations
 import sympy
 import random
+import json
+import os
 
 def powerset(iterable):
     "powerset([1,2,3]) --> () (1,) (2,) (3,) (1,2) (1,3) (2,3) (1,2,3)"
@@ -218,7 +220,7 @@ def sympy_equals(e1,e2):
     result = sympy.simplify(e1_symexpr - e2_symexpr)
     return result == 0
 
-def sympy_unify_rewrite(pat_expr,targ_expr,cstrs,blacklist={}):
+def sympy_unify_rewrite(pat_expr,targ_expr,cstrs,blacklist={},rng=random):
     deterministic = False
     def add_to_bl(wildvar,expr):
         assert(isinstance(wildvar,sympy.Wild))
@@ -289,7 +291,7 @@ def sympy_unify_rewrite(pat_expr,targ_expr,cstrs,blacklist={}):
     if valid:
         yield unif
         opts = list(result.items())
-        random.shuffle(opts)
+        rng.shuffle(opts)
         for wildvar,symexpr in opts:
             if not updated_blacklist:
                 updated_blacklist |= add_to_bl(wildvar,symexpr)
@@ -297,10 +299,113 @@ def sympy_unify_rewrite(pat_expr,targ_expr,cstrs,blacklist={}):
 
     #print("blacklist: %s (valid=%s,updated=%s)" % (blacklist,valid,updated_blacklist))
     if updated_blacklist and not deterministic:
-        for unif in sympy_unify_rewrite(pat_expr,targ_expr,cstrs,blacklist):
+        for unif in sympy_unify_rewrite(pat_expr,targ_expr,cstrs,blacklist,rng):
             yield unif
 
 
+class UnifyMemo:
+    '''
+    memo table of the unifications of (pattern, target, constraints)
+    triples, keyed by the shuffle seed and the memo key of both
+    expressions. Entries are filled lazily, so a caller that stops early
+    only pays for the unifications it consumed. Fully enumerated entries can
+    be saved to and loaded from a json file, or exported from a worker
+    process and merged into the memo of the parent.
+    '''
+
+    def __init__(self,seed=0):
+        self.seed = seed
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def key(self,pat_expr,targ_expr,cstrs):
+        cstr_key = ",".join(map(lambda tup: "%s=%s" % (tup[0],tup[1].value), \
+                                sorted(cstrs.items())))
+        return "%d|%s|%s|%s" % (self.seed,lambdoplib.memo_key(pat_expr), \
+                                lambdoplib.memo_key(targ_expr),cstr_key)
+
+    def lookup(self,key,generate):
+        if key in self.entries:
+            self.hits += 1
+            entry = self.entries[key]
+        else:
+            self.misses += 1
+            entry = {'results':[],'generator':generate(key)}
+            self.entries[key] = entry
+
+        idx = 0
+        while True:
+            if idx < len(entry['results']):
+                yield copy_unification(entry['results'][idx])
+                idx += 1
+                continue
+
+            if entry['generator'] is None:
+                return
+
+            try:
+                entry['results'].append(next(entry['generator']))
+            except StopIteration:
+                entry['generator'] = None
+
+    def load(self,filename):
+        if not os.path.exists(filename):
+            return
+
+        with open(filename,'r') as fh:
+            obj = json.loads(fh.read())
+
+        self.merge(obj)
+
+    def merge(self,obj):
+        for key,results in obj.items():
+            if key in self.entries:
+                continue
+            try:
+                unifs = []
+                for assigns in results:
+                    unif = Unification()
+                    for name,expr in assigns:
+                        unif.add(genoplib.Var(name),oplib.Op.from_json(expr))
+                    unifs.append(unif)
+            except oplib.OpJsonUnsupported as e:
+                print("[warn] skipping unification memo entry <%s>: %s" \
+                      % (key,e))
+                continue
+            self.entries[key] = {'results':unifs,'generator':None}
+
+    def export(self):
+        obj = {}
+        for key,entry in self.entries.items():
+            if not entry['generator'] is None:
+                continue
+            obj[key] = list(map(lambda unif: \
+                                list(map(lambda tup: [tup[0].name, \
+                                                      tup[1].to_json()], \
+                                         unif.assignments)), \
+                                entry['results']))
+        return obj
+
+    def save(self,filename):
+        obj = self.export()
+        tmpfile = filename + ".tmp"
+        with open(tmpfile,'w') as fh:
+            fh.write(json.dumps(obj))
+        os.replace(tmpfile,filename)
+
+    def __repr__(self):
+        return "unify-memo entries=%d hits=%d misses=%d" \
+            % (len(self.entries),self.hits,self.misses)
+
+UNIFY_MEMO = UnifyMemo()
+
+def copy_unification(unif):
+    new_unif = Unification()
+    for v,e in unif.assignments:
+        new_unif.add(v,e)
+    return new_unif
+
 def unify(pat_expr,targ_expr,cstrs):
     def targ_exact_match(op):
         if op == oplib.OpType.EMIT or \
@@ -315,14 +420,21 @@ def unify(pat_expr,targ_expr,cstrs):
         else:
             return False
 
-    new_targ_expr = canonicalize_call(targ_expr)
-    if not new_targ_expr is None:
-        targ_expr = new_targ_expr
+    def generate(key):
+        new_targ_expr = canonicalize_call(targ_expr)
+        canon_targ_expr = targ_expr if new_targ_expr is None \
+                          else new_targ_expr
+
+        new_pat_expr = canonicalize_call(pat_expr)
+        canon_pat_expr = pat_expr if new_pat_expr is None \
+                         else new_pat_expr
 
-    new_pat_expr = canonicalize_call(pat_expr)
-    if not new_pat_expr is None:
-        pat_expr = new_pat_expr
+        # seed the shuffle with the key, so the unifications of a pair do
+        # not depend on the order in which pairs are unified.
+        rng = random.Random("%d:%s" % (UNIFY_MEMO.seed,key))
+        return sympy_unify_rewrite(canon_pat_expr,canon_targ_expr,cstrs, \
+                                   blacklist={},rng=rng)
 
-    for result in sympy_unify_rewrite(pat_expr,targ_expr,cstrs, \
-                                      blacklist={}):
+    key = UNIFY_MEMO.key(pat_expr,targ_expr,cstrs)
+    for result in UNIFY_MEMO.lookup(key,generate):
         yield result
@@ -14,6 +14,9 @@ class MultiPortVar:
     mp.ident = self.ident
     return mp
 
+  def to_json(self):
+    return {'type':'join','ident':self.ident}
+
   def __repr__(self):
     return "JOIN(%s)" % (self.ident)
 
@@ -47,6 +50,10 @@ class LawVar:
   def make_law_var(self,name):
     return LawVar(self.law,self.ident,name)
 
+  def to_json(self):
+    return {'type':'law','law':self.law, \
+            'ident':self.ident,'var':self.var}
+
 
   def same_usage(self,other):
     assert(isinstance(other,LawVar))
@@ -79,6 +86,11 @@ class PortVar:
   def copy(self):
     return PortVar(self.block,self.ident,self.port)
 
+  def to_json(self):
+    return {'type':'port','block':self.block.name, \
+            'ident':self.ident, \
+            'port':self.port.name if not self.port is None else None}
+
   def __repr__(self):
     if not self.port is None:
       return "%s[%s].%s" % (self.block.name,self.ident,self.port.name)
@@ -111,6 +123,11 @@ class VADPConn(VADPStmt):
   def copy(self):
     return VADPConn(self.source.copy(),self.sink.copy())
 
+  def to_json(self):
+    return {'stmt':'conn', \
+            'source':self.source.to_json(), \
+            'sink':self.sink.to_json()}
+
   def __repr__(self):
     return "conn(%s,%s)" % (self.source,self.sink)
 
@@ -131,6 +148,11 @@ class VADPSink(VADPStmt):
   def copy(self):
     return VADPSink(self.target.copy(),self.dsexpr)
 
+  def to_json(self):
+    return {'stmt':'sink', \
+            'target':self.target.to_json(), \
+            'expr':self.dsexpr.to_json()}
+
   def __repr__(self):
     return "sink(%s,%s)" % (self.target,self.dsexpr)
 
@@ -153,6 +175,11 @@ class VADPSource(VADPStmt):
   def copy(self):
     return VADPSource(self.target.copy(),self.dsexpr)
 
+  def to_json(self):
+    return {'stmt':'source', \
+            'target':self.target.to_json(), \
+            'expr':self.dsexpr.to_json()}
+
   def __repr__(self):
     return "source(%s,%s)" % (self.target,self.dsexpr)
 
@@ -177,6 +204,13 @@ class VADPConfig(VADPStmt):
       cfg.bind(v,e)
     return cfg
 
+  def to_json(self):
+    return {'stmt':'config', \
+            'target':self.target.to_json(), \
+            'mode':list(map(lambda m: m.to_json(), self.mode)), \
+            'assigns':dict(map(lambda tup: (tup[0],tup[1].to_json()), \
+                               self.assigns.items()))}
+
   def same_target(self,other):
     assert(isinstance(other,VADPConfig))
     return self.target == other.target and \
@@ -194,6 +228,49 @@ class VADPConfig(VADPStmt):
                                     self.assigns)
 
 
+def vadp_var_from_json(dev,obj,joins):
+  if obj['type'] == 'port':
+    block = dev.get_block(obj['block'])
+    port = block.port(obj['port']) if not obj['port'] is None else None
+    return PortVar(block,obj['ident'],port)
+  elif obj['type'] == 'law':
+    return LawVar(obj['law'],obj['ident'],obj['var'])
+  elif obj['type'] == 'join':
+    # join identifiers are global, so allocate fresh ones on load
+    if not obj['ident'] in joins:
+      joins[obj['ident']] = MultiPortVar()
+    return joins[obj['ident']].copy()
+  else:
+    raise Exception("unknown vadp variable: %s" % obj)
+
+def vadp_stmt_from_json(dev,obj,joins):
+  if obj['stmt'] == 'conn':
+    return VADPConn(vadp_var_from_json(dev,obj['source'],joins), \
+                    vadp_var_from_json(dev,obj['sink'],joins))
+  elif obj['stmt'] == 'sink':
+    return VADPSink(vadp_var_from_json(dev,obj['target'],joins), \
+                    oplib.Op.from_json(obj['expr']))
+  elif obj['stmt'] == 'source':
+    return VADPSource(vadp_var_from_json(dev,obj['target'],joins), \
+                      oplib.Op.from_json(obj['expr']))
+  elif obj['stmt'] == 'config':
+    target = vadp_var_from_json(dev,obj['target'],joins)
+    modes = list(map(lambda m: target.block.modes.get(m['values']), \
+                     obj['mode']))
+    cfg = VADPConfig(target,modes)
+    for v,e in obj['assigns'].items():
+      cfg.bind(v,oplib.Op.from_json(e))
+    return cfg
+  else:
+    raise Exception("unknown vadp statement: %s" % obj)
+
+def vadp_to_json(stmts):
+  return list(map(lambda stmt: stmt.to_json(), stmts))
+
+def vadp_from_json(dev,obj):
+  joins = {}
+  return list(map(lambda stmt: vadp_stmt_from_json(dev,stmt,joins), obj))
+
 def eliminate_joins(stmts):
   target_join = None
   for stmt in stmts:
@@ -67,7 +67,8 @@ def adp_summary(adp):
 def scale(dev, program, adp, \
           objective=scalelib.ObjectiveFun.QUALITY, \
           scale_method=scalelib.ScaleMethod.IDEAL, \
-          calib_obj=None):
+          calib_obj=None, \
+          diversity=None):
 
   def set_metadata(adp):
     adp.metadata.set(adplib.ADPMetadata.Keys.LSCALE_SCALE_METHOD, \
@@ -97,7 +98,7 @@ def scale(dev, program, adp, \
     yield adp
     return
 
-  for adp in lscale_solver.solve(dev,adp,cstr_prob,obj):
+  for adp in lscale_solver.solve(dev,adp,cstr_prob,obj,diversity=diversity):
     set_metadata(adp)
     for cfg in adp.configs:
       assert(cfg.complete())
@@ -3,6 +3,7 @@ import compiler.lscale_pass.lscale_ops as scalelib
 import hwlib.block as blocklib
 import hwlib.adp as adplib
 import math
+import time
 
 class SymbolTable:
 
@@ -131,7 +132,16 @@ def scale_objective_fun_to_z3_objective_fun(objfun):
 
 class LScaleSolutionGenerator:
 
-  def __init__(self,dev,adp,symtbl,smtenv,opt=None):
+  '''
+  enumerates scaled adps with a single z3 context. The blocking clause of
+  each solution is added in a scope on top of the base problem, so the
+  solver keeps its state between solutions. If diversity is set to lex
+  or box, each solve also maximizes the number of mode assignments that
+  differ from the earlier solutions, combined with the objective using
+  that z3 priority.
+  '''
+
+  def __init__(self,dev,adp,symtbl,smtenv,opt=None,diversity=None):
     assert(isinstance(symtbl,SymbolTable))
     assert(isinstance(smtenv,smtlib.SMTEnv))
     ctx,opt = smtenv.to_z3(optimize=opt)
@@ -141,24 +151,44 @@ class LScaleSolutionGenerator:
     self.z3opt = opt
     self.adp = adp
     self.dev = dev
+    self.diversity = diversity
+    self.negated_models = []
+    self.exhausted = False
+    if not self.z3opt is None:
+      self.z3ctx.set_objective(self.z3opt)
+      if not self.diversity is None:
+        self.z3ctx.set_priority(self.diversity)
 
   def solutions(self):
-    adp = self.get_solution()
-    while not adp is None:
-      yield adp
+    # blocking clauses live in their own scope
+    self.z3ctx.push()
+    try:
       adp = self.get_solution()
+      while not adp is None:
+        yield adp
+        adp = self.get_solution()
+    finally:
+      self.z3ctx.pop()
 
   def get_solution(self):
+    if self.exhausted:
+      return None
+
+    start = time.time()
     if self.z3opt is None:
       result = self.z3ctx.solve()
+    elif not self.diversity is None and len(self.negated_models) > 0:
+      distance = self.z3ctx.distance(self.negated_models)
+      result = self.z3ctx.optimize(maximize=[distance])
     else:
-      self.z3ctx.set_objective(self.z3opt)
       result = self.z3ctx.optimize()
+
     if result is None:
-      print("no solution..")
+      print("no solution.. time=%.3fs" % (time.time() - start))
       return None
     else:
-      print("found solution!")
+      print("found solution %d! time=%.3fs" % (len(self.negated_models)+1, \
+                                               time.time() - start))
 
     symtbl = self.symtbl
     adp = self.adp.copy(self.dev)
@@ -209,12 +239,15 @@ class LScaleSolutionGenerator:
       else:
         raise Exception("unimpl: %s" % var)
 
-    self.z3ctx.negate_model(model_to_negate)
+    self.negated_models.append(model_to_negate)
+    if not self.z3ctx.negate_model(model_to_negate):
+      # there are no mode choices, so every other solution is equivalent
+      self.exhausted = True
     return adp
 
 
 
-def solve(dev,adp,cstrs,objective_fun):
+def solve(dev,adp,cstrs,objective_fun,diversity=None):
   smtenv = smtlib.SMTEnv()
   symtbl = SymbolTable(smtenv)
   for cstr in cstrs:
@@ -226,7 +259,8 @@ def solve(dev,adp,cstrs,objective_fun):
 
   z3_obj_fun = scale_objective_fun_to_z3_objective_fun(objective_fun)
   generator = LScaleSolutionGenerator(dev,adp,symtbl,smtenv, \
-                                      opt=z3_obj_fun)
+                                      opt=z3_obj_fun, \
+                                      diversity=diversity)
   for scaled_adp in generator.solutions():
     yield scaled_adp
 
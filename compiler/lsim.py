@@ -1,4 +1,5 @@
 import compiler.lsim_pass.buildsim as buildsim
+import compiler.lsim_pass.integrator as integlib
 from dslang.dsprog import DSProgDB
 import hwlib.adp as adplib
 import numpy as np
@@ -6,11 +7,15 @@ import matplotlib.pyplot as plt
 
 def run_adp_simulation(dev, \
                        adp, \
-                       dssim):
+                       dssim, \
+                       samples=300, \
+                       method=integlib.Integrator.LSODA):
   sim =  \
          buildsim.build_simulation(dev, \
                                    adp)
-  res = buildsim.run_simulation(sim,dssim.sim_time)
+  res = buildsim.run_simulation(sim,dssim.sim_time, \
+                                n=samples, \
+                                method=method)
   times,values = buildsim.get_dsexpr_trajectories(dev,adp,sim,res)
   return times,values
 
@@ -31,16 +36,22 @@ def plot_simulation(times,stvars,plot_file):
   plt.clf()
 
 
-def simulate_adp(dev,adp,plot_file):
+def simulate_adp(dev,adp,plot_file,samples=None, \
+                 method=integlib.Integrator.LSODA):
   print(adp.metadata)
   prog = adp.metadata[adplib.ADPMetadata.Keys.DSNAME]
   dssim = DSProgDB.get_sim(prog)
   times,values = run_adp_simulation(dev, \
                               adp,
-                              dssim)
+                              dssim,
+                              samples=300 if samples is None else samples,
+                              method=method)
   plot_simulation(times,values,plot_file)
 
-def simulate_reference(dev,prog,plot_file):
+def simulate_reference(dev,prog,plot_file,samples=None, \
+                       method=integlib.Integrator.LSODA):
   dssim = DSProgDB.get_sim(prog.name)
-  T,Z = prog.execute(dssim)
+  T,Z = prog.execute(dssim, \
+                     n=1000 if samples is None else samples, \
+                     method=method)
   plot_simulation(T,Z,plot_file)
@@ -5,8 +5,7 @@ import ops.generic_op as genoplib
 import ops.op as oplib
 
 import hwlib.adp as adplib
-from scipy.integrate import ode
-import tqdm
+import compiler.lsim_pass.integrator as integlib
 import numpy as np
 import math
 
@@ -41,9 +40,12 @@ class ADPSim:
     self._state_vars = []
     self.init_conds = {}
     self.derivs = {}
+    self.deriv_exprs = {}
     self.sources = {}
     self.scfs = {}
     self.time_scale = 1.0
+    self._rhs = None
+    self._jac = None
 
   def is_state_var(self,inst,port):
     return ADPSim.Var(inst,port) in self._state_vars
@@ -61,8 +63,11 @@ class ADPSim:
     assert(self.is_state_var(inst,port))
     self.init_conds[var.key] = oplib.to_python(ic)
     self.derivs[var.key] = oplib.to_python(deriv)
+    self.deriv_exprs[var.key] = deriv
     self.sources[var.key] = source
     self.scfs[var.key] = scf
+    self._rhs = None
+    self._jac = None
 
   def scale_factor(self,var):
     return self.scfs[var.key]
@@ -76,6 +81,19 @@ class ADPSim:
   def state_variables(self):
     return self._state_vars
 
+  def rhs(self):
+    if self._rhs is None:
+      self._rhs = compile_simulation(self)
+    return self._rhs
+
+  def jacobian(self):
+    if self._jac is None:
+      stvars = list(map(lambda v: v.var_name, self._state_vars))
+      exprs = list(map(lambda v: self.deriv_exprs[v.key], \
+                       self._state_vars))
+      self._jac = integlib.compile_jacobian(stvars,exprs)
+    return self._jac
+
   def __repr__(self):
     st = ""
     for stvar in self._state_vars:
@@ -96,6 +114,11 @@ class ADPSimResult:
       self.values[var.key] = []
     self.time = []
 
+  def set_trajectory(self,times,states):
+    self.time = times
+    for idx,var in enumerate(self.state_vars):
+      self.values[var.key] = states[:,idx]
+
   @property
   def num_vars(self):
     return len(self.state_vars)
@@ -225,59 +248,32 @@ def build_simulation(dev,adp):
   return sim
 
 
-def next_state(sim,values):
-  vdict = dict(zip(map(lambda v: "%s" % v.var_name, \
-                       sim.state_variables()),values))
-  vdict['np'] = np
-  vdict['math'] = math
-  result = [0.0]*len(sim.state_variables())
-  for idx,v in enumerate(sim.state_variables()):
-    result[idx] = eval(sim.derivative(v),vdict)
+def compile_simulation(sim):
+  '''
+  generate a single function rhs(t,x) that maps the state vector x to
+  the derivative vector. The derivative expressions are compiled once,
+  instead of being eval'd per state variable on every ode callback.
+  '''
+  stvars = list(map(lambda v: v.var_name, sim.state_variables()))
+  derivs = list(map(lambda v: sim.derivative(v), sim.state_variables()))
+  return integlib.compile_rhs(stvars,[],derivs)
 
-  return result
+def next_state(sim,values):
+  return sim.rhs()(0.0,values)
 
 
-def run_simulation(sim,sim_time):
+def run_simulation(sim,sim_time,n=300, \
+                   method=integlib.Integrator.LSODA):
   state_vars = list(sim.state_variables())
-
-
-
-  def dt_func(t,vs):
-    return next_state(sim,vs)
-
   time = sim_time/(sim.time_scale)
-  n = 300.0
-  dt = time/n
-
-  res = ADPSimResult(sim)
-
-
-  if len(state_vars) == 0:
-    for t in np.linspace(0,time,int(n)):
-      res.add_point(t,[])
-
-    return res
-
-  r = ode(dt_func).set_integrator('zvode', \
-                                  method='bdf')
-
   x0 = list(map(lambda v: eval(sim.initial_cond(v)), \
                 state_vars))
-  r.set_initial_value(x0,t=0.0)
-  tqdm_segs = 500
-  last_seg = 0
-  with tqdm.tqdm(total=tqdm_segs) as prog:
-    while r.successful() and r.t < time:
-        res.add_point(r.t,r.y)
-        r.integrate(r.t + dt)
-        # update tqdm
-        seg = int(tqdm_segs*float(r.t)/float(time))
-        if seg != last_seg:
-            prog.n = seg
-            prog.refresh()
-            last_seg = seg
-
 
+  jac = sim.jacobian() if len(state_vars) > 0 else None
+  T,Y = integlib.integrate(sim.rhs(),x0,time,n=n, \
+                           method=method,jac=jac)
+  res = ADPSimResult(sim)
+  res.set_trajectory(T,Y)
   return res
 
 def get_dsexpr_trajectories(dev,adp,sim,res):
@@ -304,15 +300,11 @@ def get_dsexpr_trajectories(dev,adp,sim,res):
   times = res.time
   for stvar in res.state_vars:
     _,V = res.data(stvar)
-    state_vars[stvar.var_name] = V
+    state_vars[stvar.var_name] = np.array(V)
 
   npts = len(times)
   dataset = {}
   for source_name,(src,cfg,port,expr) in variables.items():
-    dataset[source_name] = [0]*npts
-    for idx in range(npts):
-      asgns = dict(map(lambda st: (str(st),state_vars[st][idx]) , \
-                       state_vars.keys()))
-      dataset[source_name][idx] = expr.compute(asgns)
+    dataset[source_name] = oplib.compute_array(expr,state_vars,npts)
 
   return times,dataset
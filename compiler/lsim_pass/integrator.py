@@ -0,0 +1,134 @@
+import ops.lambda_op as lambdoplib
+
+from enum import Enum
+import numpy as np
+import math
+import tqdm
+
+# solve_ivp tolerances. scipy's defaults (rtol=1e-3, atol=1e-6) drift by
+# about a percent from zvode on oscillating benchmarks.
+RTOL = 1e-6
+ATOL = 1e-9
+
+class Integrator(Enum):
+  ZVODE = "zvode"
+  LSODA = "LSODA"
+  BDF = "BDF"
+  RADAU = "Radau"
+  RK45 = "RK45"
+
+  @property
+  def uses_jacobian(self):
+    return self in [Integrator.LSODA, \
+                    Integrator.BDF, \
+                    Integrator.RADAU]
+
+
+'''
+generate a function rhs(t,x) from a list of state variable names,
+a sequence of (name,python-expr) intermediate assignments, and one
+python derivative expression per state variable. The function is compiled
+once, so the per-callback cost is a single python call.
+'''
+def compile_rhs(stvars,assigns,derivs,namespace={}):
+  src = "def rhs(_t,_x):\n"
+  for idx,v in enumerate(stvars):
+    src += "  %s = _x[%d]\n" % (v,idx)
+
+  for v,expr in assigns:
+    src += "  %s = %s\n" % (v,expr)
+
+  src += "  return np.array([%s])\n" % \
+    (",".join(map(lambda d: "(%s)" % d, derivs)))
+
+  env = dict(namespace)
+  env['np'] = np
+  env['math'] = math
+  exec(compile(src,"<rhs>","exec"),env)
+  return env['rhs']
+
+'''
+generate the analytic jacobian jac(t,x) of the derivative op trees with
+respect to the state variables. Returns None if some expression cannot be
+differentiated, in which case the solver falls back to finite differences.
+'''
+def compile_jacobian(stvars,deriv_exprs,namespace={}):
+  rows = []
+  try:
+    for expr in deriv_exprs:
+      row = []
+      for v in stvars:
+        _,pyexpr = lambdoplib.to_python(lambdoplib.derivative(expr,v))
+        row.append("(%s)" % pyexpr)
+      rows.append("[%s]" % (",".join(row)))
+  except lambdoplib.DerivativeUnsupported as e:
+    print("[warn] no analytic jacobian: %s" % e)
+    return None
+
+  src = "def jac(_t,_x):\n"
+  for idx,v in enumerate(stvars):
+    src += "  %s = _x[%d]\n" % (v,idx)
+  src += "  return np.array([%s],dtype=float)\n" % (",".join(rows))
+
+  env = dict(namespace)
+  env['np'] = np
+  env['math'] = math
+  exec(compile(src,"<jac>","exec"),env)
+  return env['jac']
+
+
+def _integrate_zvode(rhs,x0,times):
+  from scipy.integrate import ode
+  T = np.zeros(len(times))
+  Y = np.zeros((len(times),len(x0)),dtype=complex)
+  r = ode(rhs).set_integrator('zvode',method='bdf')
+  r.set_initial_value(x0,t=0.0)
+  npts = 0
+  for t in tqdm.tqdm(times):
+    if t > 0.0:
+      r.integrate(t)
+    if not r.successful():
+      break
+
+    T[npts] = r.t
+    Y[npts,:] = r.y
+    npts += 1
+
+  return T[:npts],Y[:npts,:]
+
+def _integrate_ivp(rhs,jac,x0,times,method,rtol,atol):
+  from scipy.integrate import solve_ivp
+  kwargs = {'rtol':rtol,'atol':atol}
+  if method.uses_jacobian and not jac is None:
+    kwargs['jac'] = jac
+
+  sol = solve_ivp(rhs,(times[0],times[-1]),x0, \
+                  method=method.value, \
+                  dense_output=True, \
+                  **kwargs)
+  if not sol.success:
+    print("[warn] integration stopped at t=%f: %s" % (sol.t[-1],sol.message))
+
+  npts = int(np.searchsorted(times,sol.t[-1],side='right'))
+  T = np.array(times[:npts])
+  Y = np.zeros((npts,len(x0)))
+  if npts > 0:
+    Y[:,:] = sol.sol(T).T
+  return T,Y
+
+'''
+integrate the system from t=0 to sim_time and sample it at n uniformly
+spaced points. Returns the time array and an (n x len(x0)) array of states.
+'''
+def integrate(rhs,x0,sim_time,n=1000, \
+              method=Integrator.LSODA,jac=None, \
+              rtol=RTOL,atol=ATOL):
+  times = np.linspace(0,sim_time,int(n))
+  if len(x0) == 0:
+    return times,np.zeros((len(times),0))
+
+  if method == Integrator.ZVODE:
+    return _integrate_zvode(rhs,x0,times)
+  else:
+    return _integrate_ivp(rhs,jac,np.real(np.array(x0,dtype=complex)), \
+                          times,method,rtol,atol)
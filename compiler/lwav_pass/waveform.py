@@ -1,4 +1,5 @@
 from enum import Enum
+import numpy as np
 
 import compiler.lwav_pass.waveform_align as alignutil
 import matplotlib.pyplot as plt
@@ -50,17 +51,11 @@ class Waveform:
 
 
     def trim(self,min_time,max_time):
-        start = 0
-        for i,t in enumerate(self.times):
-            if t >= min_time:
-                start = i
-                break;
-
-        end = len(self.times)
-        for i,t in enumerate(self.times):
-            if t > max_time:
-                end = i
-                break;
+        times = np.asarray(self.times)
+        after_start = np.flatnonzero(times >= min_time)
+        start = after_start[0] if len(after_start) > 0 else 0
+        after_end = np.flatnonzero(times > max_time)
+        end = after_end[0] if len(after_end) > 0 else len(times)
 
         self.times = self.times[start:end]
         self.values = self.values[start:end]
@@ -89,8 +84,10 @@ class Waveform:
                         mag_scale=obj['mag_scale'])
 
     def recover(self):
-        times = list(map(lambda t: self.rec_time(t), self.times))
-        values = list(map(lambda v: self.rec_value(v), self.values))
+        # the unit conversions are elementwise, so they apply to the
+        # (possibly memory-mapped) sample arrays directly.
+        times = self.rec_time(np.asarray(self.times))
+        values = self.rec_value(np.asarray(self.values))
 
         return Waveform(variable=self.variable, \
                         times=times, \
@@ -257,39 +257,40 @@ class DSProg:
 
         return s
 
-    def _execute(self,dssim):
-        from scipy.integrate import ode
-        stvars,ics,derivs,fnvars,fns = self.build_ode_prob()
-
-        def dt_func(t,values):
-            vs = dict(zip(map(lambda v: "%s" % v, stvars), \
-                        values))
-            for fvar in fnvars:
-                vs["%s" % fvar] = _evaluate(fns[fvar],vs)
+    def build_jacobian_exprs(self):
+        stvars,_,_,fnvars,_ = self.build_ode_prob()
+        inlined = {}
+        for fvar in fnvars:
+            expr = self._bindings[fvar]
+            # external variables are simulated as zero (see to_python)
+            if expr.op == op.OpType.EXTVAR:
+                inlined[fvar] = op.Const(0.0)
+            else:
+                inlined[fvar] = expr.substitute(inlined)
 
-            next_vs = {}
-            for stvar in stvars:
-                next_vs[stvar] = _evaluate(derivs[stvar],vs)
+        return list(map(lambda v: self._bindings[v].deriv \
+                        .substitute(inlined), stvars))
 
-            return list(map(lambda v: next_vs[v],stvars))
+    def _execute(self,dssim,n=1000,method=None):
+        import compiler.lsim_pass.integrator as integlib
+        stvars,ics,derivs,fnvars,fns = self.build_ode_prob()
+        if method is None:
+            method = integlib.Integrator.LSODA
+
+        namespace = {'randlist':util.randlist}
+        rhs = integlib.compile_rhs(stvars, \
+                                   list(map(lambda v: (v,fns[v]), fnvars)), \
+                                   list(map(lambda v: derivs[v], stvars)), \
+                                   namespace)
+        jac = None
+        if method.uses_jacobian and len(stvars) > 0:
+            jac = integlib.compile_jacobian(stvars, \
+                                            self.build_jacobian_exprs(), \
+                                            namespace)
 
-        time = dssim.sim_time
-        n = 1000.0
-        dt = time/n
-        r = ode(dt_func).set_integrator('zvode',method='bdf')
         x0 = list(map(lambda v: _evaluate(ics[v],{}),stvars))
-        r.set_initial_value(x0,t=0.0)
-        T = []
-        Y = []
-        tqdm_segs = 500
-        last_seg = 0
-        while r.successful() and r.t < time:
-            T.append(r.t)
-            Y.append(r.y)
-            r.integrate(r.t + dt)
-            seg = int(tqdm_segs*float(r.t)/float(time))
-
-        return T,Y
+        return integlib.integrate(rhs,x0,dssim.sim_time,n=n, \
+                                  method=method,jac=jac)
 
 
     def execute_and_profile(self, dssim):
@@ -357,34 +358,27 @@ class DSProg:
         result = subprocess.check_output(cmd, shell=True);
         return float(result)
 
-    def execute(self,dssim):
-        T,Y = self._execute(dssim)
+    def execute(self,dssim,n=1000,method=None):
+        T,Y = self._execute(dssim,n=n,method=method)
         stvars,ics,derivs,fnvars,fns = self.build_ode_prob()
-        def fn_func(t,values):
-            vs = dict(zip(map(lambda v: v, stvars), \
-                            values))
-            vals = {}
-            for fvar in fnvars:
-                vals[fvar] = _evaluate(fns[fvar],vs)
-                vs[fvar] = vals[fvar]
-
-            for v in stvars:
-                vals[v] = vs[v]
-            return vals
-
-        if(len(stvars) == 0):
-            time = dssim.sim_time
-            T = np.linspace(0,time,1000)
-            Z =dict(map(lambda v: (v,[]), fnvars))
-            for t in T:
-                for var,value in fn_func(t,[]).items():
-                    Z[var].append(value)
-
-        else:
-            Z =dict(map(lambda v: (v,[]), stvars+fnvars))
-            for t,y in zip(T,Y):
-                for var,value in fn_func(t,y).items():
-                    Z[var].append(value)
-
+        npts = len(T)
+        Y = np.real(Y)
+
+        # external variables are simulated as zero (see to_python)
+        bindings = {}
+        for var in fnvars:
+            for node in self._bindings[var].nodes():
+                if node.op == op.OpType.EXTVAR:
+                    bindings[node.name] = 0.0
+
+        Z = {}
+        for idx,var in enumerate(stvars):
+            bindings[var] = Y[:,idx]
+            Z[var] = Y[:,idx]
+
+        for fvar in fnvars:
+            value = op.compute_array(self._bindings[fvar],bindings,npts)
+            bindings[fvar] = np.real(value)
+            Z[fvar] = bindings[fvar]
 
         return T,Z
@@ -24,12 +24,19 @@ parser = argparse.ArgumentParser(description='Grendel runtime.')
 subparsers = parser.add_subparsers(dest='subparser_name',
                                    help='runtime tools.')
 
+def add_emulation_args(subp):
+    subp.add_argument('--emulate',action='store_true',help='answer commands with an emulator instead of the board')
+    subp.add_argument('--emulate-db',type=str,help='model database the emulator answers with (default=model number)')
+    subp.add_argument('--serial-latency',type=float,default=0.0,help='round-trip latency of the emulated serial link in seconds')
+
 
 exec_subp = subparsers.add_parser('exec', help='execute benchmark')
 exec_subp.add_argument('adp', type=str,help='benchmark to compile')
 exec_subp.add_argument('--runtime',type=float,help='runtime in simulation units')
 exec_subp.add_argument('--model-number',type=str,help='model database to use')
 exec_subp.add_argument('--osc',action='store_true',help='oscilloscope connected')
+exec_subp.add_argument('--no-batch',action='store_true',help='send one configuration command per round trip')
+add_emulation_args(exec_subp)
 
 testosc_subp = subparsers.add_parser('test_osc', help='test the oscilloscope')
 testosc_subp.add_argument('adp', type=str,help='benchmark to compile')
@@ -50,6 +57,7 @@ char_subp.add_argument('--adp-locs',action='store_true', \
                        help="only characterize the locations which appear in the adp")
 char_subp.add_argument('--widen',action='store_true', \
                        help="widen adp modes to all modes which introduce constant coefficients")
+add_emulation_args(char_subp)
 
 
 
@@ -60,6 +68,12 @@ dectree_subp.add_argument('--max-depth',type=int,default=2,\
 dectree_subp.add_argument('--num-leaves',type=int,default=3,\
                           help='number of leaves (default=3)')
 dectree_subp.add_argument('--shrink',action='store_true', help='shrink model')
+dectree_subp.add_argument('--split-bins',type=int,default=None,\
+                          help='only consider this many quantile thresholds per split (default=all)')
+dectree_subp.add_argument('--jobs',type=int,default=1,\
+                          help='number of processes used to fit decision trees')
+dectree_subp.add_argument('--seed',type=int,default=0,\
+                          help='base random seed of the decision tree fits')
 
 
 
@@ -78,6 +92,7 @@ calib_subp = subparsers.add_parser('cal', help='calibrate blocks in configuratio
 calib_subp.add_argument('adp', type=str,help='adp to characterize')
 calib_subp.add_argument('method', type=str,help='calibration objective function (minimize_error/maximize_fit)')
 calib_subp.add_argument('--model-number',type=str,help='model number')
+add_emulation_args(calib_subp)
 
 
 prof_subp = subparsers.add_parser('prof', help='profile calibrated blocks')
@@ -93,6 +108,7 @@ prof_subp.add_argument('--min-points',type=int,default=0, \
 prof_subp.add_argument('--missing',action='store_true', \
                        help="calibrate missing")
 prof_subp.add_argument('--force',action="store_true",help='force')
+add_emulation_args(prof_subp)
 
 
 
@@ -109,6 +125,9 @@ delta_subp = subparsers.add_parser('mkdeltas', help='build delta models from pro
 delta_subp.add_argument('--model-number',type=str,help='model number')
 delta_subp.add_argument('--force',action="store_true",help='force')
 delta_subp.add_argument('--min-points',default=10,help='minimum number of points to fit model')
+delta_subp.add_argument('--jobs',type=int,default=1,help='number of processes used for fitting')
+delta_subp.add_argument('--only-stale',action="store_true",help='only refit models whose profile data changed since the last fit')
+delta_subp.add_argument('--batch-size',type=int,default=64,help='number of delta models committed per transaction')
 args = parser.parse_args()
 
 if args.subparser_name == "exec":
@@ -4,21 +4,39 @@ import itertools
 
 class Location:
   WILDCARD = "*"
+  # wildcards are encoded as a negative integer in the hash key
+  WILDCARD_CODE = -1
+  __slots__ = ('_address','_key','_hash')
 
   def __init__(self,address):
     assert(all(map(lambda item: isinstance(item,int) or \
                    item == Location.WILDCARD, \
                    address)))
-    self.address = address
-  
+    self._set_address(tuple(address))
+
+  def _set_address(self,address):
+    self._address = address
+    self._key = tuple(map(lambda item: Location.WILDCARD_CODE \
+                          if item == Location.WILDCARD else item, \
+                          address))
+    self._hash = hash(self._key)
+
+  @property
+  def address(self):
+    return self._address
+
+  @property
+  def key(self):
+    return self._key
+
   def copy(self):
-    return Location(list(self.address))
+    return Location(self._address)
 
   def to_json(self):
-    return self.address
+    return list(self._address)
 
   def file_string(self):
-    return ":".join(map(lambda a: str(a), self.address))
+    return ":".join(map(lambda a: str(a), self._address))
 
   @staticmethod
   def from_json(addr):
@@ -32,36 +50,37 @@ class Location:
     return Location(addr)
 
   def __str__(self):
-    tup = ",".join(map(lambda i: str(i), self.address))
+    tup = ",".join(map(lambda i: str(i), self._address))
     return "loc(%s)" % (tup)
 
   def __hash__(self):
-    return hash(str(self))
+    return self._hash
 
   def __eq__(self,loc):
     if not (isinstance(loc,Location)):
       raise Exception("cannot compare %s with %s" % (self,loc))
-    return str(loc) == str(self)
+    return self._key == loc._key
 
   def __len__(self):
-    return len(self.address)
+    return len(self._address)
 
   def __repr__(self):
     return str(self)
 
   def __iter__(self):
-    for it in self.address:
-      yield it
+    return iter(self._address)
 
   def __setitem__(self,idx,val):
      assert(isinstance(idx,int))
      assert(isinstance(val,int))
-     self.address[idx] = val
+     addr = list(self._address)
+     addr[idx] = val
+     self._set_address(tuple(addr))
 
 
   def __getitem__(self,idx):
      assert(isinstance(idx,int))
-     return self.address[idx]
+     return self._address[idx]
 
 class Layer:
 
@@ -79,6 +98,20 @@ class Layout:
     self._blocks = {}
     self._src2sink = {}
     self._sink2src = {}
+    self._route_index = None
+    self._matches = {}
+    self._prefixes = {}
+
+  @property
+  def route_index(self):
+    if self._route_index is None:
+      self._route_index = RouteIndex(self._dev)
+    return self._route_index
+
+  def invalidate(self):
+    self._route_index = None
+    self._matches = {}
+    self._prefixes = {}
 
   @staticmethod
   def is_pattern(loc):
@@ -89,14 +122,14 @@ class Layout:
 
   @staticmethod
   def intersection(loc1,loc2):
+    wildcard = Layout.WILDCARD
     isect = []
+    append = isect.append
     for l1,l2 in zip(loc1,loc2):
-      if l1 == l2:
-        isect.append(l1)
-      elif l1 == Layout.WILDCARD:
-        isect.append(l2)
-      elif l2 == Layout.WILDCARD:
-        isect.append(l1)
+      if l1 == l2 or l2 == wildcard:
+        append(l1)
+      elif l1 == wildcard:
+        append(l2)
       else:
         return None
 
@@ -134,6 +167,7 @@ class Layout:
     self._dev.get_block(dblk).inputs[dport]
     assert(self.valid_loc(dloc))
     assert(self.valid_loc(sloc))
+    self.invalidate()
     if not (sblk,sport) in self._src2sink:
       self._src2sink[(sblk,sport)] = {}
     if not (dblk,dport) in self._src2sink[(sblk,sport)]:
@@ -180,12 +214,42 @@ class Layout:
     for loc in self._blocks[block_name]:
       yield loc
 
+  def matching_instances(self,block_name,pattern):
+    '''
+    instances of the block that intersect the (possibly wildcarded)
+    address pattern. Results are tabulated per block and pattern.
+    '''
+    key = (block_name,tuple(pattern))
+    if not key in self._matches:
+      self._matches[key] = list(filter(lambda inst: \
+                                       not Layout.intersection(inst,pattern) \
+                                       is None, \
+                                       self.instances(block_name)))
+    return self._matches[key]
+
+  def instance_prefixes(self,block_name,view):
+    '''
+    table from address prefixes at the given view to the instances of the
+    block with that prefix, in layout order.
+    '''
+    key = (block_name,view)
+    if not key in self._prefixes:
+      table = {}
+      for inst in self.instances(block_name):
+        prefix = tuple(self.prefix(inst,view))
+        if not prefix in table:
+          table[prefix] = []
+        table[prefix].append(inst)
+      self._prefixes[key] = table
+    return self._prefixes[key]
+
   def block_at(self,block_name,loc):
     self._dev.get_block(block_name)
     if not block_name in self._blocks:
       self._blocks[block_name] = []
     assert(self.valid_loc(loc))
     self._blocks[block_name].append(loc)
+    self.invalidate()
 
   def locs(self,name):
     indices = list(map(lambda view : self._locs[view], \
@@ -197,6 +261,142 @@ class Layout:
     assert(locname in self._views)
     self._locs[locname] = indices
 
+class RouteIndex:
+  '''
+  reachability index over the layout connections. Edges are classified
+  once into edges entering the route network (start), edges between route
+  blocks (interim) and edges leaving the route network (end). Path existence
+  and path enumeration queries are memoized.
+  '''
+
+  def __init__(self,dev):
+    self._dev = dev
+    self.route_blocks = set()
+    for blk in dev.blocks:
+      if blk.type == blocklib.BlockType.ROUTE:
+        assert(len(blk.inputs) == 1)
+        assert(len(blk.outputs) == 1)
+        self.route_blocks.add(blk.name)
+
+    # location-level adjacency, in layout connection order
+    self.start_edges = {}
+    self.interim_edges = {}
+    self.end_edges = {}
+    # block-level adjacency
+    self.block_start = {}
+    self.block_interim = {}
+    self.block_end = {}
+
+    for sblk,sloc,sport,dblk,dloc,dport in dev.layout.connections:
+      src_route = sblk in self.route_blocks
+      dest_route = dblk in self.route_blocks
+      if src_route and dest_route:
+        self.interim_edges.setdefault(sblk,[]).append((sloc,dblk,dloc))
+        self.block_interim.setdefault(sblk,set()).add(dblk)
+      elif src_route:
+        self.end_edges.setdefault((dblk,dport),{}) \
+                      .setdefault(sblk,[]).append((sloc,dloc))
+        self.block_end.setdefault(sblk,set()).add((dblk,dport))
+      elif dest_route:
+        self.start_edges.setdefault((sblk,sport),[]).append((sloc,dblk,dloc))
+        self.block_start.setdefault((sblk,sport),set()).add(dblk)
+
+    self._exists = {}
+    self._paths = {}
+
+  def path_exists(self,sblk,sport,dblk,dport,num_route_blocks=4):
+    key = (sblk,sport,dblk,dport,num_route_blocks)
+    if not key in self._exists:
+      self._exists[key] = self._compute_path_exists(*key)
+    return self._exists[key]
+
+  def _compute_path_exists(self,sblk,sport,dblk,dport,num_route_blocks):
+    if self._direct(sblk,sport,dblk,dport):
+      return True
+
+    frontier = self.block_start.get((sblk,sport),set())
+    visited = set()
+    for _ in range(num_route_blocks):
+      for rblk in frontier:
+        if (dblk,dport) in self.block_end.get(rblk,set()):
+          return True
+
+      # a route block reached with fewer hops dominates later visits
+      visited |= frontier
+      next_frontier = set()
+      for rblk in frontier:
+        next_frontier |= self.block_interim.get(rblk,set())
+      frontier = next_frontier - visited
+
+    return False
+
+  def _direct(self,sblk,sport,dblk,dport):
+    try:
+      for _ in self._dev.layout.get_connections(sblk,sport,dblk,dport):
+        return True
+      return False
+    except Exception:
+      return False
+
+  def distinct_paths(self,sblk,sloc,sport,dblk,dloc,dport, \
+                     num_route_blocks=4):
+    key = (sblk,tuple(sloc),sport,dblk,tuple(dloc),dport,num_route_blocks)
+    if not key in self._paths:
+      self._paths[key] = list(self._walk_paths(sblk,sloc,sport, \
+                                               dblk,dloc,dport, \
+                                               num_route_blocks))
+    return self._paths[key]
+
+  def _walk_paths(self,sblk,sloc,sport,dblk,dloc,dport,num_route_blocks):
+    end_edges = self.end_edges.get((dblk,dport),{})
+
+    def has_direct_connection():
+      try:
+        for sl,dl in self._dev.layout.get_connections(sblk,sport, \
+                                                      dblk,dport):
+          if not Layout.intersection(dl,dloc) is None and \
+             not Layout.intersection(sl,sloc) is None:
+            return True
+        return False
+      except Exception:
+        return False
+
+    # walk over paths, starting from shortest
+    def walk_paths(curr_path):
+      if len(curr_path) - 2 >= num_route_blocks:
+        return
+
+      db,dl = curr_path[-1]
+      for csl,cdl in end_edges.get(db,[]):
+        cdl = Layout.intersection(cdl,dloc)
+        if cdl is None:
+          continue
+        new_dl = Layout.intersection(dl,csl)
+        if not new_dl is None:
+          new_path = list(curr_path)
+          new_path[-1] = (db,new_dl)
+          new_path.append((dblk,cdl,dport))
+          yield new_path
+
+      for csl,cdb,cdl in self.interim_edges.get(db,[]):
+        new_dl = Layout.intersection(dl,csl)
+        if not new_dl is None:
+          new_path = list(curr_path)
+          new_path[-1] = (db,new_dl)
+          new_path.append((cdb,cdl))
+          for path in walk_paths(new_path):
+            yield path
+
+    if has_direct_connection():
+      yield [(sblk,sloc,sport),(dblk,dloc,dport)]
+
+    for csl,db,dl in self.start_edges.get((sblk,sport),[]):
+      csl = Layout.intersection(csl,sloc)
+      if not csl is None:
+        for path in walk_paths([(sblk,csl,sport),(db,dl)]):
+          yield path
+
+
 class PinInfo:
 
   def __init__(self,pin,block,loc,port,chan):
@@ -237,6 +437,9 @@ class Device:
 
     return self._physdb
 
+  def set_physdb(self,physdb):
+    self._physdb = physdb
+
   def set_external_pin(self,pin_id,block,loc,port,chan):
     assert(not pin_id in self._pins)
     assert(block.name in self._blocks)
@@ -251,6 +454,7 @@ class Device:
     assert(isinstance(blk,blocklib.Block))
     assert(not blk.name in self._blocks)
     self._blocks[blk.name] = blk
+    self.layout.invalidate()
 
   def get_block(self,name):
     if not name in self._blocks:
@@ -261,171 +465,22 @@ class Device:
   def blocks(self):
     return self._blocks.values()
 
+def _copy_path(path):
+  return list(map(lambda node: tuple(map(lambda v: list(v) \
+                                         if isinstance(v,list) else v, \
+                                         node)), \
+                  path))
+
 def path_exists(dev,sblk,sport,dblk,dport, \
                 num_route_blocks=4):
-  route_blocks = []
-  interim_paths = []
-  start_paths = []
-  end_paths = []
-  for blk in dev.blocks:
-    if blk.type == blocklib.BlockType.ROUTE:
-      assert(len(blk.inputs) == 1)
-      assert(len(blk.outputs) == 1)
-      route_blocks.append(blk.name)
-
-
-  for csblk,csloc,csport, \
-      cdblk,cdloc,cdport in dev.layout.connections:
-    # internal edge on path
-    if csblk in route_blocks and cdblk in route_blocks and \
-       not (csblk,cdblk) in interim_paths:
-      interim_paths.append((csblk,cdblk))
-
-    # ending edge on path
-    elif csblk in route_blocks and cdblk == dblk and \
-         cdport == dport and not (csblk,cdblk,cdport) in end_paths:
-      end_paths.append((csblk, \
-                        cdblk,cdport))
-    # starting edge on path
-    elif cdblk in route_blocks and csblk == sblk and \
-         csport == sport and not (csblk,csport,cdblk) in start_paths:
-      start_paths.append((csblk,csport, \
-                          cdblk))
-
-
-
-  # return if there's a direct connection without route blocks
-  def has_direct_connection():
-    try:
-      for sl,dl in dev.layout.get_connections(sblk,sport, \
-                                              dblk,dport):
-        return True
-      return False
-    except Exception as e:
-      return False
-
-  # walk over paths, starting from shortest
-  def walk_paths(curr_path):
-    if len(curr_path) - 2 >= num_route_blocks:
-      return
-
-    if len(curr_path) == 0:
-      if has_direct_connection():
-          yield [(sblk,sport),(dblk,dport)]
-
-      for sb,sp,db in start_paths:
-        for path in walk_paths([(sb,sp),(db)]):
-          yield path
-
-    else:
-      db = curr_path[-1]
-      for csb,cdb,cdp in end_paths:
-        if csb == db:
-          new_path = list(curr_path)
-          new_path.append((cdb,cdp))
-          yield new_path
-
-      # find
-      for csb,cdb in interim_paths:
-        if csb == db:
-          new_path = list(curr_path)
-          new_path.append((cdb))
-          for path in walk_paths(new_path):
-            yield path
-
-  # enumerate all paths
-  for path in walk_paths([]):
-    return True
-  return False
+  return dev.layout.route_index.path_exists(sblk,sport,dblk,dport, \
+                                            num_route_blocks)
 
 
 def distinct_paths(dev,sblk,sloc,sport,dblk,dloc,dport, \
                    num_route_blocks=4):
-  route_blocks = []
-  interim_paths = []
-  start_paths = []
-  end_paths = []
-  for blk in dev.blocks:
-    if blk.type == blocklib.BlockType.ROUTE:
-      assert(len(blk.inputs) == 1)
-      assert(len(blk.outputs) == 1)
-      route_blocks.append(blk.name)
-
-  for csblk,csloc,csport, \
-      cdblk,cdloc,cdport in dev.layout.connections:
-    # internal edge on path
-    if csblk in route_blocks and cdblk in route_blocks:
-      interim_paths.append((csblk,csloc, \
-                            cdblk,cdloc))
-    # ending edge on path
-    elif csblk in route_blocks and cdblk == dblk and \
-         cdport == dport:
-      cdloc = Layout.intersection(cdloc,dloc)
-      if not cdloc is None:
-        end_paths.append((csblk,csloc, \
-                          cdblk,cdloc,cdport))
-    # starting edge on path
-    elif cdblk in route_blocks and csblk == sblk and \
-         csport == sport:
-      csloc = Layout.intersection(csloc,sloc)
-      if not csloc is None:
-        start_paths.append((csblk,csloc,csport, \
-                            cdblk,cdloc))
-
-
-  # return if there's a direct connection without route blocks
-  def has_direct_connection():
-    try:
-      direct_connections = False
-      for sl,dl in dev.layout.get_connections(sblk,sport, \
-                                                dblk,dport):
-        dl = Layout.intersection(dl,dloc)
-        sl = Layout.intersection(sl,sloc)
-        if not dl is None and not sl is None:
-          direct_connections = True
-          break
-
-      return direct_connections
-    except Exception as e:
-      return False
-
-  # walk over paths, starting from shortest
-  def walk_paths(curr_path):
-    if len(curr_path) - 2 >= num_route_blocks:
-      return
-
-    if len(curr_path) == 0:
-      if has_direct_connection():
-          yield [(sblk,sloc,sport),(dblk,dloc,dport)]
-
-      for sb,sl,sp,db,dl in start_paths:
-        for path in walk_paths([(sb,sl,sp),(db,dl)]):
-          yield path
-
-    else:
-      db,dl = curr_path[-1]
-      for csb,csl,cdb,cdl,cdp in end_paths:
-        if csb == db and \
-           not Layout.intersection(csl,dl) is None:
-          new_dl = Layout.intersection(dl,csl)
-          new_path = list(curr_path)
-          new_path[-1] = (db,new_dl)
-          new_path.append((cdb,cdl,cdp))
-          yield new_path
-
-      # find
-      for csb,csl,cdb,cdl in interim_paths:
-        if csb == db and \
-           not Layout.intersection(csl,dl) is None:
-          new_dl = Layout.intersection(dl,csl)
-          new_path = list(curr_path)
-          new_path[-1] = (db,new_dl)
-          new_path.append((cdb,cdl))
-          for path in walk_paths(new_path):
-            yield path
-
-
-  # enumerate all paths
-  for path in walk_paths([]):
-    yield path
-
+  paths = dev.layout.route_index.distinct_paths(sblk,sloc,sport, \
+                                                dblk,dloc,dport, \
+                                                num_route_blocks)
+  for path in paths:
+    yield _copy_path(path)
@@ -6,9 +6,13 @@ import hwlib.hcdc.llcmd_characterize as llcmd_characterize
 
 set_conn = llcmd_config.set_conn
 set_state = llcmd_config.set_state
+set_conn_cmd = llcmd_config.set_conn_cmd
+set_state_cmd = llcmd_config.set_state_cmd
+execute_batch = llcmd_config.execute_batch
 execute_simulation = llcmd_sim.execute_simulation
 calibrate = llcmd_calibrate.calibrate
 characterize = llcmd_characterize.characterize
 profile = llcmd_profile.profile
+profile_sweep = llcmd_profile.profile_sweep
 test_oscilloscope = llcmd_sim.test_oscilloscope
 write_lut = llcmd_config.write_lut
@@ -2,6 +2,8 @@ import hwlib.hcdc.hcdcv2 as hcdclib
 import hwlib.hcdc.llenums as llenums
 import hwlib.block as blocklib
 import hwlib.adp as adplib
+import hwlib.hcdc.llstructs as llstructs
+import lab_bench.grendel_util as grendel_util
 import runtime.models.exp_delta_model as exp_delta_lib
 
 import ops.generic_op as genoplib
@@ -94,12 +96,14 @@ def _compensate_for_offsets(blk,cfg,calib_cfg):
         print("=> updated data field %s : %f -> %f" % (data_field, old_val, \
                                                        cfg[data_field].value))
 
-def set_state(runtime,board,blk,loc,adp, \
-              calib_obj=llenums.CalibrateObjective.MINIMIZE_ERROR):
+# returns the set_state circuit command for the block, or None if the
+# block has no state.
+def set_state_cmd(board,blk,loc,adp, \
+                  calib_obj=llenums.CalibrateObjective.MINIMIZE_ERROR):
     assert(isinstance(adp,adplib.ADP))
     if not llenums.BlockType(blk.ll_name).has_state():
         print("[SKIPPING] %s.%s no state required" % (blk.name,loc))
-        return
+        return None
 
 
     cfg = adp.configs.get(blk.name,loc)
@@ -110,20 +114,29 @@ def set_state(runtime,board,blk,loc,adp, \
     state_t = {blk.name:block_state}
     loc_t,loc_d = make_block_loc_t(blk,loc)
     state_data = {'inst':loc_d, 'state':state_t}
-    cmd_t,cmd_data = make_circ_cmd(llenums.CircCmdType.SET_STATE, \
-                                       state_data)
+    return make_circ_cmd(llenums.CircCmdType.SET_STATE, \
+                         state_data)
+
+def set_state(runtime,board,blk,loc,adp, \
+              calib_obj=llenums.CalibrateObjective.MINIMIZE_ERROR):
+    circ_cmd = set_state_cmd(board,blk,loc,adp,calib_obj=calib_obj)
+    if circ_cmd is None:
+        return
+
+    cmd_t,cmd_data = circ_cmd
     cmd = cmd_t.build(cmd_data,debug=True)
     runtime.execute(cmd)
     return unpack_response(runtime.result())
 
 
 
-
-def set_conn(runtime,src_blk,src_loc,src_port, \
-             dest_blk,dest_loc,dest_port):
+# returns the connect circuit command, or None if one of the blocks is a
+# lookup table.
+def set_conn_cmd(src_blk,src_loc,src_port, \
+                 dest_blk,dest_loc,dest_port):
     if dest_blk.name == 'lut' or \
        src_blk.name == 'lut':
-        return
+        return None
 
     ident = src_blk.outputs[src_port].ll_identifier
     sloc_t,sloc_d = make_port_loc(src_blk,src_loc,ident)
@@ -132,13 +145,76 @@ def set_conn(runtime,src_blk,src_loc,src_port, \
     dloc_t,dloc_d = make_port_loc(dest_blk,dest_loc, \
                                   ident)
     conn_data = {"src":sloc_d, "dest":dloc_d}
-    cmd_t,cmd_data = make_circ_cmd(llenums.CircCmdType.CONNECT, \
-                                   conn_data)
+    return make_circ_cmd(llenums.CircCmdType.CONNECT, \
+                         conn_data)
+
+def set_conn(runtime,src_blk,src_loc,src_port, \
+             dest_blk,dest_loc,dest_port):
+    circ_cmd = set_conn_cmd(src_blk,src_loc,src_port, \
+                            dest_blk,dest_loc,dest_port)
+    if circ_cmd is None:
+        return
+
+    cmd_t,cmd_data = circ_cmd
     cmd = cmd_t.build(cmd_data,debug=True)
     runtime.execute(cmd)
     return unpack_response(runtime.result())
 
 
+# the batch payload must fit in the firmware receive buffer after the
+# command header and the line terminator.
+BATCH_PAYLOAD_BYTES = grendel_util.INBUF_SIZE - grendel_util.CMD_HEADER_SIZE - 2
+BATCH_MAX_COMMANDS = 255
+
+def _pack_batch_entry(circ_cmd):
+    _,cmd_data = circ_cmd
+    entry = llstructs.circ_cmd_t().build(cmd_data['cmd_data']['circ_cmd'])
+    return bytes([len(entry)]) + entry
+
+def _execute_batch(runtime,entries):
+    header = {'n':len(entries)}
+    cmd_t,cmd_data = make_circ_cmd(llenums.CircCmdType.BATCH, header)
+    cmd = cmd_t.build(cmd_data,debug=True)
+    payload = b"".join(entries)
+    # the firmware terminates a message at the first line terminator, and
+    # has no way to escape one.
+    if b"\r\n" in cmd + payload:
+        if len(entries) == 1:
+            raise Exception("cannot send a batch entry that contains a line terminator")
+        mid = len(entries)//2
+        return _execute_batch(runtime,entries[:mid]) + \
+            _execute_batch(runtime,entries[mid:])
+
+    runtime.execute_with_payload(cmd,payload)
+    statuses = unpack_response(runtime.result())
+    assert(len(statuses) == len(entries))
+    return statuses
+
+def execute_batch(runtime,circ_cmds):
+    '''
+    execute set_state/set_conn circuit commands with as few round trips as
+    the firmware receive buffer allows. Commands that are None are skipped.
+    Returns the status of each executed command, zero on success.
+    '''
+    statuses = []
+    chunk = []
+    chunk_size = 0
+    for circ_cmd in filter(lambda cmd: not cmd is None, circ_cmds):
+        entry = _pack_batch_entry(circ_cmd)
+        if len(chunk) == BATCH_MAX_COMMANDS or \
+           chunk_size + len(entry) > BATCH_PAYLOAD_BYTES:
+            statuses += _execute_batch(runtime,chunk)
+            chunk,chunk_size = [],0
+
+        chunk.append(entry)
+        chunk_size += len(entry)
+
+    if len(chunk) > 0:
+        statuses += _execute_batch(runtime,chunk)
+
+    return statuses
+
+
 
 def disable(runtime,blk,loc):
     loc_t,loc_d = make_block_loc_t(blk,loc)
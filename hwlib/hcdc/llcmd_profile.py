@@ -1,57 +1,78 @@
 import hwlib.hcdc.hcdcv2 as hcdclib
 import hwlib.hcdc.llenums as llenums
 import hwlib.hcdc.llcmd_util as llutil
+import hwlib.hcdc.llstructs as llstructs
 import hwlib.adp as adplib
+import lab_bench.grendel_util as grendel_util
 
 import runtime.models.exp_profile_dataset as exp_profile_lib
+import numpy as np
 
-def profile(runtime,dev, \
-            blk,loc,adp,output_port, \
-            inputs, \
-            method=llenums.ProfileOpType.INPUT_OUTPUT):
-    state_t = {blk.name:blk.state.concretize(adp,loc)}
-    # build profiling command
-    loc_t,loc_d = llutil.make_block_loc_t(blk,loc)
+# the sweep payload is the point count followed by two float32 inputs per
+# point, and must fit in the firmware receive buffer after the command
+# header and the line terminator.
+SWEEP_PAYLOAD_BYTES = grendel_util.INBUF_SIZE - grendel_util.CMD_HEADER_SIZE - 2
+SWEEP_MAX_POINTS = (SWEEP_PAYLOAD_BYTES - 4)//8
+
+def _in_vals(inputs):
     values = [0.0]*2
     for input_ident,input_val in inputs.items():
         values[input_ident.code()] = input_val
-    print("profile-inputs: %s" % values)
-    profile_data = {"method": method.name, \
-                    "inst": loc_d,
-                    "in_vals": values, \
-                    "state":state_t,
-                    "output":output_port.name}
+    return values
 
-    cmd_t, cmd_data = llutil.make_circ_cmd(llenums.CircCmdType.PROFILE,
-                             profile_data)
-    cmd = cmd_t.build(cmd_data,debug=True)
-    # execute profiling command
-    runtime.execute(cmd)
-    resp = llutil.unpack_response(runtime.result())
+def _profile_spec(blk,loc,adp,output_port,inputs,method):
+    state_t = {blk.name:blk.state.concretize(adp,loc)}
+    loc_t,loc_d = llutil.make_block_loc_t(blk,loc)
+    return {"method": method.name, \
+            "inst": loc_d,
+            "in_vals": _in_vals(inputs), \
+            "state":state_t,
+            "output":output_port.name}
 
+def unpack_profile_spec(dev,spec):
     # reconstruct analog device program
     new_adp= adplib.ADP()
-    blk,loc = llutil.from_block_loc_t(dev,resp['spec']['inst'])
+    blk,loc = llutil.from_block_loc_t(dev,spec['inst'])
     new_adp.add_instance(blk,loc)
-    state = resp['spec']['state'][blk.name]
+    state = spec['state'][blk.name]
     blk.state.lift(new_adp,loc,dict(state))
     blkcfg = new_adp.configs.get(blk.name,loc)
 
+    new_out = llutil.get_by_ll_identifier(blk.outputs,  \
+                                llenums.PortType \
+                                   .from_code(int(spec['output'])))
+
+    new_method = llenums.ProfileOpType.from_code(int(spec['method']))
+    return blk,loc,blkcfg,new_out,new_method
+
+def unpack_profile_inputs(blk,in_vals):
     # retrieve parameters for new result
     inputs = {}
     port = llutil.get_by_ll_identifier(blk.inputs,llenums.PortType.IN0)
     if not port is None:
-        inputs[port.name] = resp['spec']['in_vals'][llenums.PortType.IN0.code()]
+        inputs[port.name] = in_vals[llenums.PortType.IN0.code()]
         print("in %s = %f" % (port.name,inputs[port.name]))
     port = llutil.get_by_ll_identifier(blk.inputs,llenums.PortType.IN1)
     if not port is None:
-        inputs[port.name]= resp['spec']['in_vals'][llenums.PortType.IN1.code()]
-    
-    new_out = llutil.get_by_ll_identifier(blk.outputs,  \
-                                llenums.PortType \
-                                   .from_code(int(resp['spec']['output'])))
+        inputs[port.name]= in_vals[llenums.PortType.IN1.code()]
+    return inputs
 
-    new_method = llenums.ProfileOpType.from_code(int(resp['spec']['method']))
+def profile(runtime,dev, \
+            blk,loc,adp,output_port, \
+            inputs, \
+            method=llenums.ProfileOpType.INPUT_OUTPUT):
+    # build profiling command
+    profile_data = _profile_spec(blk,loc,adp,output_port,inputs,method)
+    print("profile-inputs: %s" % profile_data['in_vals'])
+    cmd_t, cmd_data = llutil.make_circ_cmd(llenums.CircCmdType.PROFILE,
+                             profile_data)
+    cmd = cmd_t.build(cmd_data,debug=True)
+    # execute profiling command
+    runtime.execute(cmd)
+    resp = llutil.unpack_response(runtime.result())
+
+    blk,loc,blkcfg,new_out,new_method = unpack_profile_spec(dev,resp['spec'])
+    inputs = unpack_profile_inputs(blk,resp['spec']['in_vals'])
     out_mean = resp['mean']
     out_std = resp['stdev']
     out_status = llenums.ProfileStatus.from_code(int(resp['status']))
@@ -59,19 +80,80 @@ def profile(runtime,dev, \
     print(blkcfg)
     # insert into database
     if out_status == llenums.ProfileStatus.SUCCESS:
-        dataset= exp_profile_lib.load(dev,blk,loc,new_out,blkcfg,method)
-        if dataset is None:
-            dataset = exp_profile_lib.ExpProfileDataset(blk, \
-                                                        loc, \
-                                                        new_out, \
-                                                        blkcfg, \
-                                                        new_method)
+        dataset = exp_profile_lib.ExpProfileDataset(blk, \
+                                                    loc, \
+                                                    new_out, \
+                                                    blkcfg, \
+                                                    new_method)
 
         dataset.add(config=blkcfg, \
                     inputs=inputs, \
                     mean=out_mean, \
                     std=out_std)
 
-        exp_profile_lib.update(dev,dataset)
+        exp_profile_lib.append(dev,dataset)
+
+    return blkcfg
+
+def _sweep(runtime,profile_data,points):
+    header_t,header_d = llutil.make_circ_cmd(llenums.CircCmdType.PROFILE_SWEEP, \
+                                             profile_data)
+    cmd = header_t.build(header_d,debug=True)
+    values = [float(len(points))]
+    for in_vals in points:
+        values += in_vals
+    payload_t,payload_d = llutil.make_dataset_t(values)
+    runtime.execute_with_payload(cmd,payload_d)
+    results = llutil.unpack_response(runtime.result())
+    assert(len(results) == len(points))
+    return results
+
+def profile_sweep(runtime,dev, \
+                  blk,loc,adp,output_port, \
+                  points, \
+                  method=llenums.ProfileOpType.INPUT_OUTPUT):
+    '''
+    profile the block at each of the input points (one dictionary of
+    input identifiers to values per point) with the configuration of the
+    adp held fixed. The points are measured with as few sweep commands as
+    the firmware receive buffer allows, and the successful measurements are
+    written to the database as one dataset.
+    '''
+    if len(points) == 0:
+        return None
+
+    profile_data = _profile_spec(blk,loc,adp,output_port,{},method)
+    # decode the spec the way the firmware sees it. The padding lets every
+    # variant of the state union parse.
+    spec = llstructs.profile_spec_t().parse( \
+              llstructs.profile_spec_t().build(profile_data) + bytes(64))
+    blk,loc,blkcfg,new_out,new_method = unpack_profile_spec(dev,spec)
+    dataset = exp_profile_lib.ExpProfileDataset(blk, \
+                                                loc, \
+                                                new_out, \
+                                                blkcfg, \
+                                                new_method)
+
+    # record the inputs at the float32 precision the firmware measures at
+    all_in_vals = list(map(lambda pt: list(map(lambda v: float(np.float32(v)), \
+                                               _in_vals(pt))), points))
+    for offset,chunk in llutil.divide_list_into_chunks(all_in_vals, \
+                                                      SWEEP_MAX_POINTS):
+        print("-> profiling points %d-%d" % (offset,offset+len(chunk)))
+        results = _sweep(runtime,profile_data,chunk)
+        for in_vals,result in zip(chunk,results):
+            inputs = unpack_profile_inputs(blk,in_vals)
+            out_status = llenums.ProfileStatus.from_code(int(result.status))
+            print("datum inputs=%s out=%f std=%f status=%s" \
+                  % (inputs,result.mean,result.stdev,out_status.value))
+            if out_status == llenums.ProfileStatus.SUCCESS:
+                dataset.add(config=blkcfg, \
+                            inputs=inputs, \
+                            mean=result.mean, \
+                            std=result.stdev)
+
+    print(blkcfg)
+    if len(dataset) > 0:
+        exp_profile_lib.append(dev,dataset)
 
     return blkcfg
@@ -92,10 +92,7 @@ def save_data_from_arduino(dataset,board,dsprog,adp,sim_time,trial=0):
                                              variable=var, \
                                              trial=trial)
 
-        with open(filename.format(variable=var),'w') as fh:
-            print("-> compressing data")
-            strdata = util.compress_json(json_data)
-            fh.write(strdata)
+        util.save_waveform(filename.format(variable=var),json_data)
         print("<wrote file>")
 
 
@@ -132,10 +129,7 @@ def save_data_from_oscilloscope(osc,board,dsprog,adp,sim_time,trial=0):
                                              variable=var, \
                                              trial=trial)
 
-        with open(filename.format(variable=var),'w') as fh:
-            print("-> compressing data")
-            strdata = util.compress_json(json_data)
-            fh.write(strdata)
+        util.save_waveform(filename.format(variable=var),json_data)
         print("<wrote file>")
 
 
@@ -124,6 +124,11 @@ def unpack_response(resp):
     elif payload_type == llenums.ResponseType.PROFILE_RESULT.value:
       payload_result = llstructs.parse(llstructs.profile_result_t(), \
                                        bytes(resp.array))
+    elif payload_type == llenums.ResponseType.PROFILE_SWEEP_RESULT.value:
+      payload_result = llstructs.parse(llstructs.sweep_results_t(), \
+                                       bytes(resp.array))
+    elif payload_type == llenums.ResponseType.BATCH_STATUS.value:
+      payload_result = list(map(lambda st: int(st), resp.array))
     else:
       payload_result = resp.array
 
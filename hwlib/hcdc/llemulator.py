@@ -0,0 +1,498 @@
+import hwlib.hcdc.llenums as llenums
+import hwlib.hcdc.llstructs as llstructs
+import hwlib.hcdc.llcmd_util as llutil
+import hwlib.hcdc.llcmd_profile as llprofile
+import hwlib.hcdc.llcmd_sim as llsim
+import hwlib.block as blocklib
+import hwlib.adp as adplib
+import construct
+import numpy as np
+import time
+import zlib
+
+import lab_bench.grendel_util as grendel_util
+import lab_bench.devices.sigilent_osc as osclib
+from lab_bench.devices.loopback_due import LoopbackDue
+from lab_bench.grendel_runner import GrendelRunner
+
+import runtime.models.exp_delta_model as exp_delta_model_lib
+import runtime.models.exp_phys_model as exp_phys_model_lib
+
+'''
+Serial-level emulator of the grendel firmware. It decodes the commands the
+host writes and replies the way the firmware does, so the configuration
+path can be exercised without a board. Connections and block states are
+recorded instead of being applied to a chip, profiling and calibration
+commands are answered by a measurement and a calibration function, and
+experiments replay a signal the host attaches to the emulator.
+'''
+
+BATCHABLE = [llenums.CircCmdType.SET_STATE, \
+             llenums.CircCmdType.CONNECT, \
+             llenums.CircCmdType.BREAK, \
+             llenums.CircCmdType.DISABLE]
+
+def _loc_key(loc):
+    return (str(loc.block),loc.chip,loc.tile,loc.slice,loc.idx)
+
+def _port_key(port_loc):
+    return _loc_key(port_loc.loc) + (str(port_loc.port),)
+
+def _payload(msg):
+    # the firmware reads the payload at sizeof(cmd_t), whatever the header
+    return msg[grendel_util.CMD_HEADER_SIZE:]
+
+def _spec_data(spec):
+    block = llenums.BlockType.by_name(str(spec.inst.block)).value
+    return {'inst':spec.inst, \
+            'method':spec.method, \
+            'output':spec.output, \
+            'in_vals':list(spec.in_vals), \
+            'state':{block:spec.state[block]}}
+
+# the firmware sends the state union at the size of its largest variant
+STATE_BYTES = max(map(lambda st: st.sizeof(), \
+                      [llstructs.lut_state_t(), llstructs.dac_state_t(), \
+                       llstructs.mult_state_t(), llstructs.integ_state_t(), \
+                       llstructs.fanout_state_t(), llstructs.adc_state_t()]))
+
+def _response_code(response_type):
+    return llstructs.response_type_t().build(response_type.value)[0]
+
+# the firmware samples one channel into a buffer of this many entries
+# and starts sampling this many seconds before the simulation starts.
+DATABUF_SIZE = 2048
+WARM_UP_TIME = 0.00005
+
+# default measurement: every profiled point succeeds and reads zero
+def zero_measure(spec,in_vals):
+    return 0.0,0.0,llenums.ProfileStatus.SUCCESS
+
+# default calibration: the hidden codes are left as they were set
+def keep_codes(calib_obj,inst,state):
+    return state
+
+def _block_name(inst):
+    return llenums.BlockType.by_name(str(inst.block)).value
+
+def _state_bytes(block,state):
+    data = llstructs.state_t().build({block:state})
+    return data + bytes(STATE_BYTES - len(data))
+
+def volts_to_codes(volts):
+    # inverse of the conversion in llcmd_sim.unpack_arduino_waveform
+    codes = np.round(2048.0 - np.asarray(volts)*2048.0/3.3)
+    return np.clip(codes,0,4095).astype(np.uint32)
+
+class GrendelEmulator(LoopbackDue):
+  '''
+  measure(spec,in_vals) returns the (mean,stdev,status) of profiling the
+  block described by the parsed profile spec at the two input values.
+  calibrate(calib_obj,inst,state) returns the block state the firmware
+  reports after calibrating the block at inst from the given state.
+
+  Every round trip waits latency seconds, plus the time to move the bytes
+  exchanged over a serial line at baud_rate if one is given.
+  '''
+
+  def __init__(self, binary=True, measure=zero_measure, \
+               calibrate=keep_codes, latency=0.0, baud_rate=None):
+    LoopbackDue.__init__(self, binary=binary)
+    self.measure = measure
+    self.calibrate = calibrate
+    self.latency = latency
+    self.baud_rate = baud_rate
+    self.n_profiled = 0
+    self.n_calibrated = 0
+    self.conns = set()
+    self.states = {}
+    self.disabled = set()
+    self.n_commands = 0
+    self.n_round_trips = 0
+    self.serial_time = 0.0
+    self.sim_time = 0.0
+    self.signal = None
+
+  def set_signal(self, times, volts):
+    '''
+    the first analog channel reads the (times,volts) signal during an
+    experiment, with times in seconds since the simulation started.
+    '''
+    self.signal = (np.asarray(times,dtype=np.float64), \
+                   np.asarray(volts,dtype=np.float64))
+
+  def wait(self, nbytes):
+    delay = self.latency
+    if not self.baud_rate is None:
+      # eight data bits, a start and a stop bit per byte
+      delay += nbytes*10.0/self.baud_rate
+
+    self.serial_time += delay
+    if delay > 0:
+      time.sleep(delay)
+
+  def receive(self, msg):
+    n_sent = len(self._rx)
+    self.dispatch(msg)
+    self.wait(len(msg) + 2 + len(self._rx) - n_sent)
+
+  def dispatch(self, msg):
+    if msg == grendel_util.FRAMING_REQUEST:
+      self._ack_framing()
+      return
+
+    if msg == grendel_util.SWEEP_REQUEST:
+      self._ack_sweep()
+      return
+
+    self.n_round_trips += 1
+    # the firmware does not bound its receive buffer, so an oversized
+    # message would corrupt it instead of being answered.
+    if len(msg) + 2 > grendel_util.INBUF_SIZE:
+      self.send_error("emulator: message of %d bytes overruns the receive buffer" \
+                      % len(msg))
+      return
+
+    # pad the message so every variant of the command union can be parsed
+    cmd = llstructs.cmd_t().parse(msg + bytes(256))
+    self.send_process()
+    cmd_type = llenums.CmdType[str(cmd.cmd_type)]
+    if cmd_type == llenums.CmdType.CIRC_CMD:
+      self.exec_circ_cmd(cmd.cmd_data.circ_cmd,msg)
+    elif cmd_type == llenums.CmdType.EXPERIMENT_CMD:
+      self.exec_exp_cmd(cmd.cmd_data[cmd_type.value])
+    elif cmd_type == llenums.CmdType.FLUSH_CMD:
+      self.send_response("flushed",0)
+    else:
+      self.send_error("emulator: unsupported command %s" % cmd_type.name)
+
+  def send_error(self, msg):
+    self._send("\nAC:>[error]%s\r\n" % msg)
+
+  def apply(self, circ_cmd):
+    cmd_type = llenums.CircCmdType[str(circ_cmd.circ_cmd_type)]
+    data = circ_cmd.circ_cmd_data[cmd_type.value]
+    self.n_commands += 1
+    if cmd_type == llenums.CircCmdType.SET_STATE:
+      self.states[_loc_key(data.inst)] = data.state
+    elif cmd_type == llenums.CircCmdType.CONNECT:
+      self.conns.add((_port_key(data.src),_port_key(data.dest)))
+    elif cmd_type == llenums.CircCmdType.BREAK:
+      self.conns.discard((_port_key(data.src),_port_key(data.dest)))
+    elif cmd_type == llenums.CircCmdType.DISABLE:
+      self.disabled.add(_loc_key(data.inst))
+    else:
+      return False
+    return True
+
+  def _measure(self, spec, in_vals):
+    self.n_profiled += 1
+    return self.measure(spec,in_vals)
+
+  def exec_batch(self, n, payload):
+    statuses = []
+    offset = 0
+    for _ in range(n):
+      size = payload[offset]
+      entry = payload[offset+1:offset+1+size]
+      offset += size+1
+      circ_cmd = llstructs.circ_cmd_t().parse(entry + bytes(256))
+      statuses.append(0 if self.apply(circ_cmd) else 1)
+    return statuses
+
+  def exec_circ_cmd(self, circ_cmd, msg):
+    cmd_type = llenums.CircCmdType[str(circ_cmd.circ_cmd_type)]
+    if cmd_type == llenums.CircCmdType.BATCH:
+      n = circ_cmd.circ_cmd_data[cmd_type.value].n
+      statuses = self.exec_batch(n,_payload(msg))
+      self.send_response("executed batch",1)
+      self.send_payload(_response_code(llenums.ResponseType.BATCH_STATUS), \
+                        statuses)
+
+    elif cmd_type == llenums.CircCmdType.PROFILE:
+      spec = circ_cmd.circ_cmd_data[cmd_type.value]
+      mean,stdev,status = self._measure(spec,list(spec.in_vals))
+      spec_data = _spec_data(spec)
+      result = llstructs.profile_result_t().build({'mean':mean, \
+                                                   'stdev':stdev, \
+                                                   'status':status.name, \
+                                                   'spec':spec_data})
+      state = list(spec_data['state'].values())[0]
+      block = list(spec_data['state'].keys())[0]
+      state_size = len(llstructs.state_t().build({block:state}))
+      result += bytes(STATE_BYTES - state_size)
+      self.send_response("returning profile",1)
+      self.send_payload(_response_code(llenums.ResponseType.PROFILE_RESULT), \
+                        result)
+
+    elif cmd_type == llenums.CircCmdType.PROFILE_SWEEP:
+      spec = circ_cmd.circ_cmd_data[cmd_type.value]
+      payload = _payload(msg)
+      n = int(construct.Float32l.parse(payload[:4]))
+      values = construct.Array(2*n,construct.Float32l).parse(payload[4:])
+      results = []
+      for idx in range(n):
+        mean,stdev,status = self._measure(spec,list(values[2*idx:2*idx+2]))
+        results.append({'mean':mean,'stdev':stdev,'status':status.name})
+      self.send_response("returning sweep",1)
+      self.send_payload(_response_code(llenums.ResponseType.PROFILE_SWEEP_RESULT), \
+                        llstructs.sweep_results_t().build(results))
+
+    elif cmd_type == llenums.CircCmdType.CALIBRATE:
+      data = circ_cmd.circ_cmd_data[cmd_type.value]
+      key = _loc_key(data.inst)
+      if not key in self.states:
+        self.send_error("emulator: no state set for %s" % str(key))
+        return
+
+      block = _block_name(data.inst)
+      calib_obj = llenums.CalibrateObjective[str(data.calib_obj)]
+      self.n_calibrated += 1
+      state = self.calibrate(calib_obj,data.inst,self.states[key][block])
+      result = _state_bytes(block,state)
+      self.states[key] = llstructs.state_t().parse(result)
+      self.send_response("calibration terminated",1)
+      self.send_payload(_response_code(llenums.ResponseType.BLOCK_STATE), \
+                        result)
+
+    elif cmd_type == llenums.CircCmdType.GET_STATE:
+      data = circ_cmd.circ_cmd_data[cmd_type.value]
+      key = _loc_key(data.inst)
+      if not key in self.states:
+        self.send_error("emulator: no state set for %s" % str(key))
+        return
+
+      block = _block_name(data.inst)
+      self.send_response("returning codes",1)
+      self.send_payload(_response_code(llenums.ResponseType.BLOCK_STATE), \
+                        _state_bytes(block,self.states[key][block]))
+
+    elif cmd_type in BATCHABLE:
+      self.apply(circ_cmd)
+      messages = {
+        llenums.CircCmdType.SET_STATE: "set codes",
+        llenums.CircCmdType.CONNECT: "connected",
+        llenums.CircCmdType.BREAK: "disconnected",
+        llenums.CircCmdType.DISABLE: "disabled block"
+      }
+      self.send_response(messages[cmd_type],0)
+
+    elif cmd_type == llenums.CircCmdType.WRITE_LUT:
+      self.n_commands += 1
+      self.send_response("write lut",0)
+
+    elif cmd_type == llenums.CircCmdType.DEFAULTS:
+      self.send_response("set defaults",0)
+
+    else:
+      self.send_error("emulator: unsupported circuit command %s" \
+                      % cmd_type.name)
+
+  def experiment_dataset(self):
+    # the firmware fills its sample buffer over 1.3x the simulation time
+    samples = DATABUF_SIZE
+    freq = int(samples/(self.sim_time*1.3+WARM_UP_TIME))
+    times = np.arange(samples)/float(freq) - WARM_UP_TIME
+    if self.signal is None:
+      volts = np.zeros(samples)
+    else:
+      volts = np.interp(times,self.signal[0],self.signal[1])
+
+    return [freq,samples,0] + volts_to_codes(volts).tolist()
+
+  def exec_exp_cmd(self, exp_cmd):
+    cmd_type = llenums.ExpCmdType[str(exp_cmd.type)]
+    if cmd_type == llenums.ExpCmdType.RESET:
+      self.sim_time = 0.0
+      self.send_response("resetted",0)
+    elif cmd_type == llenums.ExpCmdType.USE_ANALOG_CHIP:
+      self.send_response("use_analog_chip=true",0)
+    elif cmd_type == llenums.ExpCmdType.USE_OSC:
+      self.send_response("enable_trigger=true",0)
+    elif cmd_type == llenums.ExpCmdType.SET_SIM_TIME:
+      self.sim_time = exp_cmd.args.floats[0]
+      self.send_response("set_sim_time",0)
+    elif cmd_type == llenums.ExpCmdType.RUN:
+      self.send_response("ran experiment",1)
+      self.send_payload(_response_code(llenums.ResponseType.DATASET), \
+                        self.experiment_dataset(),width=4)
+    else:
+      self.send_error("emulator: unsupported experiment command %s" \
+                      % cmd_type.name)
+
+
+def _hidden_codes(blk,cfg):
+  codes = {}
+  for st in filter(lambda st: isinstance(st.impl,blocklib.BCCalibImpl), \
+                   blk.state):
+    codes[st.name] = cfg[st.name].value
+  return codes
+
+class BoardModel:
+  '''
+  answers the emulator's profiling and calibration commands with the
+  models in the physical database of the board. A block output behaves as
+  its fully configured delta model if one was fit, otherwise as the
+  physical model of the block evaluated at the hidden codes, otherwise as a
+  synthetic delta model whose parameters are drawn around their ideal
+  values with a relative standard deviation of spread. Measurements have
+  gaussian noise with a standard deviation of noise.
+  '''
+
+  def __init__(self,board,noise=0.0,spread=0.0,seed=0):
+    self.board = board
+    self.noise = noise
+    self.spread = spread
+    self.seed = seed
+    self.rng = np.random.RandomState(seed)
+    self._synthetic = {}
+
+  def synthetic_params(self,blk,loc,output,cfg):
+    spec = output.deltas[cfg.mode]
+    key = (blk.name,str(loc),output.name,str(cfg.mode))
+    if not key in self._synthetic:
+      rng = np.random.RandomState(zlib.crc32(("%d:%s" % (self.seed,key)) \
+                                             .encode('utf-8')))
+      params = {}
+      for par in spec.params:
+        ideal = spec[par].val
+        params[par] = ideal*(1.0 + rng.normal(0.0,self.spread)) \
+                      if self.spread > 0 else ideal
+      self._synthetic[key] = params
+
+    return self._synthetic[key]
+
+  def delta_params(self,blk,loc,output,cfg):
+    for model in exp_delta_model_lib \
+        .get_fully_configured_outputs(self.board,blk,loc,output,cfg):
+      if model.complete:
+        return model.params
+
+    phys_model = exp_phys_model_lib.load(self.board,blk,cfg)
+    spec = output.deltas[cfg.mode]
+    if not phys_model is None and \
+       all(map(lambda par: par in phys_model.params, spec.params)):
+      codes = _hidden_codes(blk,cfg)
+      return dict(map(lambda tup: (tup[0],tup[1].evaluate(codes)), \
+                      phys_model.params.items()))
+
+    return self.synthetic_params(blk,loc,output,cfg)
+
+  def relation(self,blk,loc,output,cfg,method):
+    spec = output.deltas[cfg.mode]
+    if spec is None:
+      rel = output.relation[cfg.mode]
+    else:
+      rel = spec.get_model(self.delta_params(blk,loc,output,cfg))
+    return method.get_expr(blk,rel)
+
+  def measure(self,spec,in_vals):
+    blk,loc,cfg,output,method = llprofile.unpack_profile_spec(self.board,spec)
+    assigns = llprofile.unpack_profile_inputs(blk,in_vals)
+    for stmt in cfg.stmts_of_type(adplib.ConfigStmtType.CONSTANT):
+      assigns[stmt.name] = stmt.value
+
+    mean = self.relation(blk,loc,output,cfg,method).compute(assigns)
+    if self.noise > 0:
+      mean += self.rng.normal(0.0,self.noise)
+    return mean,self.noise,llenums.ProfileStatus.SUCCESS
+
+  def calibrated_codes(self,blk,loc,cfg,calib_obj):
+    models = exp_delta_model_lib.get_calibrated(self.board,blk,loc,cfg, \
+                                                calib_obj)
+    if len(models) > 0:
+      return dict(models[0].hidden_codes())
+
+    phys_model = exp_phys_model_lib.load(self.board,blk,cfg)
+    if not phys_model is None:
+      _,codes = phys_model.model_error.find_minimum()
+      return dict(map(lambda tup: (tup[0], \
+                                   blk.state[tup[0]].nearest_value(tup[1])), \
+                      codes.items()))
+
+    return {}
+
+  def calibrate(self,calib_obj,inst,state):
+    blk,loc = llutil.from_block_loc_t(self.board,inst)
+    adp = adplib.ADP()
+    adp.add_instance(blk,loc)
+    blk.state.lift(adp,loc,dict(state))
+    cfg = adp.configs.get(blk.name,loc)
+    for name,value in self.calibrated_codes(blk,loc,cfg,calib_obj).items():
+      cfg[name].value = value
+
+    return blk.state.concretize(adp,loc)
+
+
+def simulate_waveforms(board,dsprog,adp,samples=1000):
+  '''
+  simulate the adp with lsim and return the (times,volts) signal of each
+  observable variable, with times in wall-clock seconds.
+  '''
+  import compiler.lsim as lsim
+  from dslang.dsprog import DSProgDB
+
+  dssim = DSProgDB.get_sim(dsprog.name)
+  times,values = lsim.run_adp_simulation(board,adp,dssim,samples=samples)
+  sources = {}
+  for cfg in adp.configs:
+    for port in cfg.stmts_of_type(adplib.ConfigStmtType.PORT):
+      if not port.source is None:
+        sources[port.source.name] = str(port.source)
+
+  wall_clock = np.asarray(times)*board.time_constant
+  signals = {}
+  for var,scf,chans in adp.observable_ports(board):
+    signals[var] = (wall_clock,np.real(np.asarray(values[sources[var]])))
+  return signals
+
+
+class EmulatedGrendelRunner(GrendelRunner):
+  '''
+  GrendelRunner backed by an in-process GrendelEmulator that answers with
+  the models of the board, for running the runtime flows without hardware.
+  '''
+
+  def __init__(self,board, \
+               latency=0.0, \
+               baud_rate=None, \
+               noise=0.0, \
+               spread=0.0, \
+               seed=0, \
+               quiet=False, \
+               framing=grendel_util.Framing.BINARY):
+    self.model = BoardModel(board,noise=noise,spread=spread,seed=seed)
+    emulator = GrendelEmulator(binary=True, \
+                               measure=self.model.measure, \
+                               calibrate=self.model.calibrate, \
+                               latency=latency, \
+                               baud_rate=baud_rate)
+    GrendelRunner.__init__(self,quiet=quiet,framing=framing,device=emulator)
+
+  def attach_simulation(self,board,dsprog,adp,osc=None,samples=1000):
+    '''
+    the observable outputs of the adp follow its lsim simulation in the
+    experiments that follow. The first analog channel of the emulator and,
+    if given, the channels of the dummy oscilloscope show the signals.
+    '''
+    signals = simulate_waveforms(board,dsprog,adp,samples=samples)
+    for var,scf,chans in adp.observable_ports(board):
+      times,volts = signals[var]
+      pos = chans[llenums.Channels.POS].pin
+      if pos == llenums.ExternalPins.OUT0:
+        self.due.set_signal(times,volts)
+
+      if not osc is None:
+        assert(isinstance(osc,osclib.DummySigilent1020XEOscilloscope))
+        osc.set_signal(llsim.get_osc_chan_for_pin(pos),times,volts)
+        if llenums.Channels.NEG in chans:
+          neg = chans[llenums.Channels.NEG].pin
+          osc.set_signal(llsim.get_osc_chan_for_pin(neg), \
+                         times,np.zeros(len(times)))
+
+  def close(self):
+    GrendelRunner.close(self)
+    if not self.quiet:
+      print("[emulator] round-trips=%d profiled=%d calibrated=%d serial-time=%fs" \
+            % (self.due.n_round_trips,self.due.n_profiled, \
+               self.due.n_calibrated,self.due.serial_time))
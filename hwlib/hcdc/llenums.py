@@ -45,6 +45,9 @@ class CalibrateObjective(Enum):
 class ResponseType(Enum):
     PROFILE_RESULT = "resp_profile_result"
     BLOCK_STATE = "resp_block_state"
+    DATASET = "resp_dataset"
+    BATCH_STATUS = "resp_batch_status"
+    PROFILE_SWEEP_RESULT = "resp_profile_sweep_result"
 
 class ProfileStatus(Enum):
     SUCCESS = "success"
@@ -134,6 +137,8 @@ class CircCmdType(Enum):
     GET_STATE = "get_state";
     DEFAULTS = "defaults";
     PROFILE = "profile";
+    BATCH = "batch";
+    PROFILE_SWEEP = "profile_sweep";
     NULLCMD = "no_circ_cmd"
 
 class ExpCmdType(Enum):
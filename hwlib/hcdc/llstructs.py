@@ -202,7 +202,9 @@ def circ_cmd_type():
         llenums.CircCmdType.GET_STATE.name:7,
         llenums.CircCmdType.SET_STATE.name:8,
         llenums.CircCmdType.DEFAULTS.name:9,
-        llenums.CircCmdType.PROFILE.name:10
+        llenums.CircCmdType.PROFILE.name:10,
+        llenums.CircCmdType.BATCH.name:11,
+        llenums.CircCmdType.PROFILE_SWEEP.name:12
     }
     return cstruct.Enum(cstruct.Int8ul,
                         **kwargs)
@@ -258,6 +260,18 @@ def profile_result_t():
         "spec" / profile_spec_t()
     )
 
+# one measurement of a profiling sweep
+def sweep_result_t():
+    return cstruct.Struct(
+        "mean" / cstruct.Float32l,
+        "stdev" / cstruct.Float32l,
+        "status" / profile_status_t(),
+        cstruct.Padding(3)
+    )
+
+def sweep_results_t():
+    return cstruct.GreedyRange(sweep_result_t())
+
 # high-level commmands
 def cmd_set_state_t():
     return cstruct.Struct(
@@ -298,6 +312,11 @@ def cmd_block_loc_t():
     )
 
 
+def cmd_batch_t():
+    return cstruct.Struct(
+        "n" / cstruct.Int8ul
+    )
+
 def cmd_calib_t():
     return cstruct.Struct(
         "calib_obj" / calibrate_objective_t(),
@@ -317,6 +336,8 @@ def circ_cmd_data():
         llenums.CircCmdType.GET_STATE.value: cmd_block_loc_t(),
         llenums.CircCmdType.DEFAULTS.value: cmd_block_loc_t(),
         llenums.CircCmdType.PROFILE.value: cmd_profile_t(),
+        llenums.CircCmdType.BATCH.value: cmd_batch_t(),
+        llenums.CircCmdType.PROFILE_SWEEP.value: cmd_profile_t(),
 
     }
     return cstruct.Union(None, **kwargs)
@@ -360,7 +381,10 @@ def cmd_t():
 def response_type_t():
     kwargs = {
         llenums.ResponseType.PROFILE_RESULT.value: 0,
-        llenums.ResponseType.BLOCK_STATE.value: 1
+        llenums.ResponseType.BLOCK_STATE.value: 1,
+        llenums.ResponseType.DATASET.value: 2,
+        llenums.ResponseType.BATCH_STATUS.value: 3,
+        llenums.ResponseType.PROFILE_SWEEP_RESULT.value: 4
     }
     return cstruct.Enum(cstruct.Int8ul,
                         **kwargs)
@@ -25,6 +25,12 @@ Fabric* setup_board(){
                           unsigned int n){
   sprintf(FMTBUF,"%d",n+2);
   comm::data(FMTBUF,"I");
+  if(comm::binary()){
+    comm::frame(resp,1,n);
+    Serial.write((const uint8_t *) bytes, n);
+    Serial.flush();
+    return;
+  }
   comm::payload();
   Serial.print(resp,DEC);
   Serial.print(" ");
@@ -37,7 +43,44 @@ Fabric* setup_board(){
 }
 
 
+/*
+ execute a configuration command of a batch without writing a response.
+ returns 0 on success and 1 if the command cannot be batched.
+*/
+uint8_t exec_batched_command(Fabric * fab, cmd_t& cmd){
+  Fabric::Chip::Tile::Slice::FunctionUnit::Interface* src;
+  Fabric::Chip::Tile::Slice::FunctionUnit::Interface* dst;
+  switch(cmd.type){
+  case cmd_type_t::DISABLE:
+    common::disable_block(fab,cmd.data.disable.inst);
+    return 0;
+  case cmd_type_t::CONNECT:
+    src = common::get_output_port(fab,cmd.data.conn.src);
+    dst = common::get_input_port(fab,cmd.data.conn.dst);
+    Fabric::Chip::Connection(src,dst).setConn();
+    return 0;
+  case cmd_type_t::BREAK:
+    src = common::get_output_port(fab,cmd.data.conn.src);
+    dst = common::get_input_port(fab,cmd.data.conn.dst);
+    Fabric::Chip::Connection(src,dst).brkConn();
+    return 0;
+  case cmd_type_t::SET_STATE:
+    calibrate::set_state(fab,
+                         cmd.data.set_state.inst,
+                         cmd.data.set_state.state);
+    return 0;
+  default:
+    return 1;
+  }
+}
+
 void exec_command(Fabric * fab, cmd_t& cmd, float* inbuf){
+  sweep_result_t sweep[SWEEP_MAX_POINTS];
+  profile_spec_t spec;
+  int npts;
+  cmd_t subcmd;
+  uint8_t statuses[256];
+  uint8_t * bytebuf;
   cmd_write_lut_t wrlutd;
   cmd_connect_t connd;
   block_state_t state;
@@ -104,6 +147,29 @@ void exec_command(Fabric * fab, cmd_t& cmd, float* inbuf){
                        (const char *) &result, sizeof(result));
     break;
 
+  case cmd_type_t::PROFILE_SWEEP:
+    npts = (int) inbuf[0];
+    comm::test(npts <= SWEEP_MAX_POINTS, "too many sweep points");
+    sprintf_profile_spec(cmd.data.prof, FMTBUF);
+    print_info(FMTBUF);
+    calibrate::set_state(fab,
+                         cmd.data.prof.inst,
+                         cmd.data.prof.state);
+    print_log("profiling sweep...");
+    spec = cmd.data.prof;
+    for(int idx=0; idx < npts; idx+=1){
+      spec.inputs[0] = inbuf[1+2*idx];
+      spec.inputs[1] = inbuf[2+2*idx];
+      result = calibrate::measure(fab, spec);
+      sweep[idx].mean = result.mean;
+      sweep[idx].stdev = result.stdev;
+      sweep[idx].status = result.status;
+    }
+    comm::response("returning sweep",1);
+    write_struct_bytes(response_type_t::PROFILE_SWEEP_RESULT,
+                       (const char *) sweep, npts*sizeof(sweep_result_t));
+    break;
+
   case cmd_type_t::CALIBRATE:
     print_log("calibrating...");
     calibrate::calibrate(fab,
@@ -141,6 +207,19 @@ void exec_command(Fabric * fab, cmd_t& cmd, float* inbuf){
     comm::response("set defaults",0);
     break;
 
+  case cmd_type_t::BATCH:
+    bytebuf = (uint8_t*) inbuf;
+    for(int idx=0; idx < cmd.data.batch.n; idx+=1){
+      memset(&subcmd,0,sizeof(subcmd));
+      memcpy(&subcmd,&bytebuf[1],min(bytebuf[0],sizeof(subcmd)));
+      statuses[idx] = exec_batched_command(fab,subcmd);
+      bytebuf += bytebuf[0]+1;
+    }
+    comm::response("executed batch",1);
+    write_struct_bytes(response_type_t::BATCH_STATUS,
+                       (const char *) statuses, cmd.data.batch.n);
+    break;
+
   default:
     comm::error("unknown command");
     break;
@@ -23,9 +23,30 @@ namespace circ {
     GET_STATE,
     SET_STATE,
     DEFAULTS,
-    PROFILE
+    PROFILE,
+    BATCH,
+    PROFILE_SWEEP
   } cmd_type_t;
 
+  /*
+   a batch carries n circuit commands in the payload, each prefixed with
+   its length in bytes.
+  */
+  typedef struct {
+    uint8_t n;
+  } cmd_batch_t;
+
+  /*
+   a profile sweep reuses the profile spec. The payload holds the number
+   of points followed by the two inputs of each point.
+  */
+  #define SWEEP_MAX_POINTS 58
+  typedef struct {
+    float mean;
+    float stdev;
+    profile_status_t status;
+  } sweep_result_t;
+
 
   typedef struct write_lut {
     block_loc_t inst;
@@ -74,6 +95,7 @@ namespace circ {
     cmd_set_state_t set_state;
     cmd_calib_t calib;
     cmd_profile_t prof;
+    cmd_batch_t batch;
   } cmd_data_t;
 
   typedef struct cmd {
@@ -84,7 +106,9 @@ namespace circ {
   typedef enum {
     PROFILE_RESULT,
     BLOCK_STATE,
-    DATASET
+    DATASET,
+    BATCH_STATUS,
+    PROFILE_SWEEP_RESULT
   } response_type_t;
 
   //Fabric* setup_board();
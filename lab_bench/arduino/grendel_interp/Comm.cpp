@@ -10,6 +10,7 @@ int RPOS=0;
 int MSGNO = 0;
 int TRYNO = 0;
 bool DONE=false;
+bool BINARY=false;
 
 
 bool read_mode(){
@@ -36,6 +37,23 @@ void payload(){
   header();
   Serial.print("[array]");
 }
+void set_binary(bool enable){
+  BINARY = enable;
+}
+bool binary(){
+  return BINARY;
+}
+/*
+ binary payload: the frame line is followed by the payload type, the element
+ width, the element count and the little-endian elements.
+*/
+void frame(uint8_t type, uint8_t width, uint32_t n){
+  header();
+  Serial.println("[frame]");
+  Serial.write(type);
+  Serial.write(width);
+  Serial.write((const uint8_t *) &n, 4);
+}
 void data(const char * msg,const char * type_sig){
   header();
   Serial.print("[data][");
@@ -12,6 +12,9 @@ void process_command();
 void response(const char* data, int ndata);
 void data(const char* msg, const char * type);
 void payload();
+void frame(uint8_t type, uint8_t width, uint32_t n);
+void set_binary(bool enable);
+bool binary();
 void error(const char* msg);
 
 void* get_data_ptr(int offset);
@@ -99,6 +99,22 @@ namespace experiment {
     uint32_t dataset_size = samples*N_CHANS+N_CHANS+2;
     sprintf(FMTBUF,"%d",dataset_size+2);
     comm::data(FMTBUF,"I");
+    if(comm::binary()){
+      uint32_t value;
+      comm::frame(circ::response_type_t::DATASET,4,dataset_size);
+      Serial.write((const uint8_t *) &freq, 4);
+      Serial.write((const uint8_t *) &samples, 4);
+      for(unsigned int ch = 0; ch < N_CHANS; ch +=1){
+        value = ch;
+        Serial.write((const uint8_t *) &value, 4);
+        for(unsigned int i = 0; i < samples; i+=1){
+          value = DATABUF[ch][i];
+          Serial.write((const uint8_t *) &value, 4);
+        }
+      }
+      Serial.flush();
+      return;
+    }
     comm::payload();
     Serial.print(circ::response_type_t::DATASET,DEC);
     Serial.print(" ");
@@ -55,7 +55,14 @@ void loop() {
         // in the event the fabric has not been initialized, initialize it
         break;
       case cmd_type_t::FLUSH_CMD:
-        comm::response("flushed",0);
+        // a flush byte of 2 queries support for profiling sweeps
+        if(nbytes > 4 && cmd.data.flush_cmd == 2){
+          comm::response("flushed sweep",0);
+          break;
+        }
+        // a flush byte of 1 requests binary payload frames
+        comm::set_binary(nbytes > 4 && cmd.data.flush_cmd == 1);
+        comm::response(comm::binary() ? "flushed binary" : "flushed",0);
         break;
       default:
         sprintf(FMTBUF,": unknown toplevel command: %d", cmd.type);
@@ -76,6 +76,17 @@ namespace circ {
       Serial.print("defaults");
       break;
 
+    case cmd_type_t::PROFILE_SWEEP:
+      Serial.print("profile_sweep ");
+      sprintf_block_inst(cmd.data.prof.inst,FMTBUF);
+      Serial.print(FMTBUF);
+      break;
+
+    case cmd_type_t::BATCH:
+      Serial.print("batch n=");
+      Serial.print(cmd.data.batch.n);
+      break;
+
     default:
       Serial.print(cmd.type);
       Serial.print(" <unimpl print circuit>");
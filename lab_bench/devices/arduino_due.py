@@ -62,9 +62,14 @@ class ArduinoDue:
 
   def readline(self):
     line_bytes = self._comm.readline()
-    line_valid_bytes = bytearray(filter(lambda b: b < 128, line_bytes))
-    strline = line_valid_bytes.decode('utf-8')
-    return strline
+    # drop any non-ascii noise on the line
+    return line_bytes.decode('ascii',errors='ignore')
+
+  def read(self, n):
+    data = self._comm.read(n)
+    if len(data) != n:
+      raise Exception("short read: expected=%d, num=%d" % (n,len(data)))
+    return data
 
   def reads_available(self):
     return self._comm.in_waiting > 0
@@ -0,0 +1,120 @@
+import lab_bench.grendel_util as grendel_util
+
+class LoopbackDue:
+  '''
+  in-memory stand-in for ArduinoDue. Bytes written by the host are kept in
+  the written list, and the host reads whatever was queued with the
+  send_* methods, encoded as the grendel firmware encodes its replies.
+  The loopback acknowledges framing requests if binary is set and sweep
+  queries if sweep is set. Subclasses override receive to reply to other
+  messages.
+  '''
+
+  def __init__(self, binary=True, sweep=True):
+    self.binary = binary
+    self.sweep = sweep
+    self.framing = grendel_util.Framing.TEXT
+    self.written = []
+    self._rx = bytearray()
+    self._rpos = 0
+    self._open = False
+    self._pending = bytearray()
+
+  def open(self):
+    self._open = True
+    return True
+
+  def close(self):
+    self._open = False
+
+  def ready(self):
+    return self._open
+
+  def flush(self):
+    pass
+
+  def reads_available(self):
+    return self._rpos < len(self._rx)
+
+  def readline(self):
+    end = self._rx.find(b'\n',self._rpos)
+    if end < 0:
+      raise Exception("loopback: no line available")
+    line = bytes(self._rx[self._rpos:end+1])
+    self._rpos = end+1
+    return line.decode('ascii',errors='ignore')
+
+  def try_readline(self):
+    return self.readline() if self.reads_available() else None
+
+  def read(self, n):
+    if self._rpos + n > len(self._rx):
+      raise Exception("short read: expected=%d, num=%d" \
+                      % (n,len(self._rx)-self._rpos))
+    data = bytes(self._rx[self._rpos:self._rpos+n])
+    self._rpos += n
+    return data
+
+  def write_bytes(self, byts):
+    self._pending += byts
+    if self._pending.endswith(b'\r\n'):
+      msg = bytes(self._pending[:-2])
+      self._pending = bytearray()
+      self.written.append(msg)
+      self.receive(msg)
+
+  def write(self, msg):
+    self.write_bytes(msg.encode())
+
+  def writeline(self, string):
+    self.write("%s\r\n" % string)
+
+  def write_newline(self):
+    self.write("\r\n")
+
+  def receive(self, msg):
+    if msg == grendel_util.FRAMING_REQUEST:
+      self._ack_framing()
+    elif msg == grendel_util.SWEEP_REQUEST:
+      self._ack_sweep()
+
+  def _ack_sweep(self):
+    self.send_process()
+    if self.sweep:
+      self.send_response(grendel_util.SWEEP_ACK, 0)
+    else:
+      # older firmware treats the query as a flush that disables framing
+      self.framing = grendel_util.Framing.TEXT
+      self.send_response("flushed", 0)
+
+  def _ack_framing(self):
+    self.framing = grendel_util.Framing.BINARY if self.binary \
+                   else grendel_util.Framing.TEXT
+    self.send_process()
+    self.send_response(grendel_util.FRAMING_ACK if self.binary \
+                       else "flushed", 0)
+
+  def _send(self, text):
+    self._rx += text.encode('ascii')
+
+  def send_process(self):
+    self._send("\nAC:>[process]\r\n")
+
+  def send_message(self, msg):
+    self._send("\nAC:>[msg]%s\r\n" % msg)
+
+  def send_response(self, msg, n_args):
+    self._send("\nAC:>[resp][%d]%s\r\n" % (n_args,msg))
+
+  def send_data(self, value, type_sig):
+    self._send("\nAC:>[data][%s] %s\r\n" % (type_sig,value))
+
+  def send_payload(self, payload_type, array, width=1):
+    self.send_data(len(array)+2,"I")
+    if self.framing == grendel_util.Framing.BINARY:
+      self._send("\nAC:>[frame]\r\n")
+      self._rx += grendel_util.encode_frame(payload_type,array,width)
+    else:
+      self._send("\nAC:>[array]%d %d %s\r\n" % \
+                 (payload_type,len(array), \
+                  " ".join(map(lambda v: str(int(v)), array))))
@@ -4,6 +4,7 @@ import argparse
 import struct
 import datetime
 from enum import Enum
+import numpy as np
 from lab_bench.devices.sicp_device import SICPDevice
 import lab_bench.generic_util as util
 
@@ -25,6 +26,54 @@ def extract_number_and_unit(st):
     return number,unit
 
 
+# number of horizontal divisions on the screen and adc codes per vertical
+# division of the waveform data block.
+WAVEFORM_NHDIV = 14
+WAVEFORM_NVDIV = 25
+
+def waveform_block(resp):
+    '''
+    locate the #9<nnnnnnnnn> header of a WF? DAT2 response and return the
+    raw data block as a uint8 array that shares memory with resp.
+    '''
+    code_idx = resp.find(b'#9')
+    if code_idx < 0:
+        raise Exception("could not find marker")
+
+    idx_start = code_idx+2+9
+    if len(resp) < idx_start:
+        raise Exception("message too small %s" % resp[:64])
+
+    data_size = int(resp[code_idx+2:idx_start])
+    return np.frombuffer(resp,dtype=np.uint8, \
+                         count=min(data_size,len(resp)-idx_start), \
+                         offset=idx_start)
+
+def decode_waveform(resp,tdiv,sara,vdiv,voff):
+    '''
+    convert a WF? DAT2 response to (times,volts) arrays.
+    '''
+    data = waveform_block(resp).astype(np.float64)
+    # codes above 127 are negative
+    data[data > 127] -= 255
+    volts = data*(vdiv/WAVEFORM_NVDIV)-voff
+    times = -tdiv*WAVEFORM_NHDIV/2.0 + \
+        np.arange(len(data),dtype=np.float64)*(1.0/sara)
+    return times,volts
+
+def concat_frames(dataframes):
+    '''
+    concatenate (delta,times,values) history frames into one waveform,
+    shifting each frame so it starts at its capture time.
+    '''
+    if len(dataframes) == 0:
+        return np.zeros(0),np.zeros(0)
+
+    times = np.concatenate(list(map(lambda fr: fr[1] + (fr[0] + abs(fr[1].min())), \
+                                    dataframes)))
+    values = np.concatenate(list(map(lambda fr: fr[2], dataframes)))
+    return times,values
+
 # use python 2
 def pairwise(arr):
     for idx in range(0,len(arr)-1,2):
@@ -171,9 +220,52 @@ class DummySigilent1020XEOscilloscope:
         self.TIME_DIVISIONS = 14
         self.VALUE_DIVISIONS = 8
         self.trigger = None
+        self.max_samples = 14000
+        self.seconds_per_division = 1e-3
+        self.sampling_rate = 1e6
+        self._signals = {}
+        self._volts_per_division = {}
+        self._voltage_offset = {}
+
+    def set_signal(self,chan,times,volts):
+        '''
+        the channel displays the (times,volts) signal, with times in
+        seconds since the trigger. Channels without a signal read zero.
+        '''
+        assert(chan in self._channels)
+        self._signals[chan] = (np.asarray(times,dtype=np.float64), \
+                               np.asarray(volts,dtype=np.float64))
+
+    def waveform_codes(self,chan,sara):
+        window = self.seconds_per_division*WAVEFORM_NHDIV
+        n = max(1,int(round(window*sara)))
+        if not chan in self._signals:
+            return bytes(n)
+
+        # sample at the times decode_waveform assigns to the codes, which
+        # center the screen on the trigger.
+        times,volts = self._signals[chan]
+        values = np.interp(-window/2.0 + np.arange(n)/sara,times,volts)
+        # quantize the way the physical oscilloscope does. Codes above
+        # 127 are negative.
+        vdiv = self._volts_per_division.get(chan,1.0)
+        voff = self._voltage_offset.get(chan,0.0)
+        codes = np.clip(np.round((values+voff)*WAVEFORM_NVDIV/vdiv),-127,127)
+        codes[codes < 0] += 255
+        return codes.astype(np.uint8).tobytes()
 
     def waveform(self,chan):
-        return [0],[0]
+        # encode a WF? DAT2 response and decode it with the same routine
+        # as the physical oscilloscope.
+        window = self.seconds_per_division*WAVEFORM_NHDIV
+        sara = min(self.sampling_rate,self.max_samples/window)
+        data = self.waveform_codes(chan,sara)
+        header = ("%s:WF DAT2,#9%09d" % (chan.value,len(data)))
+        resp = header.encode('utf-8') + data + b"\n\n"
+        return decode_waveform(resp,self.seconds_per_division, \
+                               sara, \
+                               self._volts_per_division.get(chan,1.0), \
+                               self._voltage_offset.get(chan,0.0))
 
     def analog_channel(self,idx):
         if isinstance(idx,Sigilent1020XEOscilloscope.Channels):
@@ -190,12 +282,14 @@ class DummySigilent1020XEOscilloscope:
 
     def set_volts_per_division(self,channel,volts_per_div):
         assert(channel in self._channels)
+        self._volts_per_division[channel] = volts_per_div
         cmd = '%s:VDIV %fV' % (channel.value,volts_per_div)
         print(cmd)
         return cmd
 
     def set_voltage_offset(self,channel,volts_offset):
         assert(channel in self._channels)
+        self._voltage_offset[channel] = volts_offset
         cmd = "%s:OFST %fV" % (channel.value,volts_offset)
         print(cmd)
         return cmd
@@ -215,6 +309,7 @@ class DummySigilent1020XEOscilloscope:
 
     def set_seconds_per_division(self,time_s,round_mode=util.RoundMode.UP):
         time_s = self.closest_seconds_per_division(time_s,round_mode)
+        self.seconds_per_division = time_s
         unit = None
         if time_s >= 1.0:
             time = time_s
@@ -668,10 +763,6 @@ class Sigilent1020XEOscilloscope(SICPDevice):
                             % (channel,self._channels))
 
         props = self.get_properties()
-        #NHDIV = 14
-        #NVDIV = 8
-        NHDIV = 14
-        NVDIV=25
         tdiv = props['seconds_per_division']
         sara = props['sampling_rate']
         vdiv = props['volts_per_division'][channel.name]
@@ -679,44 +770,13 @@ class Sigilent1020XEOscilloscope(SICPDevice):
 
         cmd = "%s:WF? DAT2" % channel.value
         resp = self.query(cmd,decode=None,timeout_sec=180)
-        code_idx = None
-        for idx,byte in enumerate(resp):
-            chrs = chr(byte)
-            if len(resp) < idx+2:
-                raise Exception("message too small %s" % resp)
-            chrs += chr(resp[idx+1])
-            if chrs == '#9':
-                code_idx = idx
-                break
-
-        if(code_idx is None):
-            raise Exception("could not find marker")
-
-        idx_start = code_idx+2+9
-        data_size = int(resp[idx+2:idx_start])
-        data_ba = resp[idx_start:idx_start+data_size]
-
-        times = []
-        volts = []
-        for idx,value in enumerate(data_ba):
-            if value > 127:
-                value -= 255
-
-            volt = value/NVDIV*vdiv-voff
-            time = -tdiv*NHDIV/2.0+idx*(1.0/sara)
-            volts.append(volt)
-            times.append(time)
-
-
-        return list(times),list(volts)
+        return decode_waveform(resp,tdiv,sara,vdiv,voff)
 
 
     def full_waveform(self,channel):
         curr_frame = 1
         start_time = None
         done = False
-        abs_times = []
-        abs_values = []
         self.set_history_mode(True)
         self.set_history_list_open(True)
         assert(self.is_history_list_open())
@@ -736,18 +796,12 @@ class Sigilent1020XEOscilloscope(SICPDevice):
             assert(not curr_time is None)
             delta = curr_time - start_time
             times,values = self.waveform(channel)
-            dataframes.append((curr_frame,delta,times,values))
+            dataframes.append((delta,times,values))
             curr_frame += 1
 
         self.set_history_list_open(False)
         print("-> build data")
-        times = []
-        values = []
-        for frame_idx,delta,dfr_times,dfr_values in dataframes:
-            min_time = min(dfr_times)
-            offset = delta + abs(min_time)
-            times += list(map(lambda time: time + offset, dfr_times))
-            values += dfr_values
+        times,values = concat_frames(dataframes)
 
         print("-> returning data")
         return times,values
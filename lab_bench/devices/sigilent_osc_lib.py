@@ -37,25 +37,16 @@ def get_waveform(osc,chan1,chan2,differential=True):
         if differential:
             out_t1,out_v1 = data1
             out_t2,out_v2 = data2
-            def compute(i):
-                v1 = out_v1[i]*CHAN1_SLOPE+CHAN1_OFFSET
-                v2 = out_v2[i]*CHAN2_SLOPE+CHAN2_OFFSET
-                return v1-v2
-
-            n = len(out_v1)
-            out_v = list(map(lambda i: compute(i), range(n)))
-            assert(all(np.equal(out_t1,out_t2)))
+            assert(np.array_equal(out_t1,out_t2))
             out_t = out_t1
+            out_v = (out_v1*CHAN1_SLOPE+CHAN1_OFFSET) - \
+                (out_v2*CHAN2_SLOPE+CHAN2_OFFSET)
 
         else:
             out_t,out_v = data1
-            def compute(i):
-                v1 = out_v[i]*CHAN1_SLOPE+CHAN1_OFFSET
-                return v
+            out_v = out_v*CHAN1_SLOPE+CHAN1_OFFSET
 
-            out_v = list(map(lambda i: compute(i), range(n)))
-
-        return list(out_t),list(out_v)
+        return np.asarray(out_t),np.asarray(out_v)
 
 
 def set_trigger(osc):
@@ -1,6 +1,5 @@
 from lab_bench.devices.arduino_due import ArduinoDue
 import lab_bench.grendel_util as grendel_util
-import lab_bench.generic_util as generic_util
 
 class GrendelRunner:
 
@@ -9,13 +8,45 @@ class GrendelRunner:
                board_name="board6", \
                file_desc=None, \
                native=False, \
-               quiet=False):
-    self.due = ArduinoDue(file_desc,native=native)
+               quiet=False, \
+               framing=grendel_util.Framing.BINARY, \
+               device=None):
+    self.due = ArduinoDue(file_desc,native=native) if device is None \
+               else device
     self.board_name = board_name
     self.quiet = quiet
+    self.requested_framing = grendel_util.Framing(framing)
+    self.framing = grendel_util.Framing.TEXT
+    self.sweep = False
 
   def initialize(self):
     self.due.open()
+    if not self.due.ready():
+      return
+
+    self.negotiate_sweep()
+    if self.requested_framing == grendel_util.Framing.BINARY:
+      self.negotiate_framing()
+
+  def negotiate_sweep(self):
+    # firmware without profiling sweeps treats the query as a plain flush
+    self.execute(bytearray(grendel_util.SWEEP_REQUEST))
+    resp = self.result()
+    self.sweep = (resp.message == grendel_util.SWEEP_ACK)
+    if not self.quiet:
+      print("[sweep] %s" % ("supported" if self.sweep else "unsupported"))
+
+  def negotiate_framing(self):
+    # firmware without binary framing treats the request as a plain flush
+    self.execute(bytearray(grendel_util.FRAMING_REQUEST))
+    resp = self.result()
+    if resp.message == grendel_util.FRAMING_ACK:
+      self.framing = grendel_util.Framing.BINARY
+    else:
+      self.framing = grendel_util.Framing.TEXT
+
+    if not self.quiet:
+      print("[framing] %s" % self.framing.value)
 
   def close(self):
     self.due.close()
@@ -28,11 +59,12 @@ class GrendelRunner:
     self.due.write_newline()
 
   def execute_with_payload(self,header_data,payload_data):
-    pad_size= 80 - 10*4
-    n_pad = generic_util.compute_pad_bytes(len(header_data), \
-                                           pad_size)
+    # the payload starts at the fixed header offset the firmware reads at
+    n_pad = grendel_util.CMD_HEADER_SIZE - len(header_data)
+    assert(n_pad >= 0)
     pad_data = bytearray([0]*n_pad)
     rawbuf = header_data+pad_data+payload_data
+    assert(len(rawbuf) + 2 <= grendel_util.INBUF_SIZE)
     self.execute(rawbuf)
 
   def dispatch(self):
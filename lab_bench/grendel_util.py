@@ -2,6 +2,8 @@ import re
 import math
 from enum import Enum
 import sys
+import numpy as np
+import construct as cstruct
 
 class OptionalValue:
   def __init__(self, value, success=True):
@@ -59,6 +61,44 @@ class ArduinoResponseType(Enum):
   PAYLOAD = "array"
   MESSAGE = "msg"
   RESPONSE = "resp"
+  FRAME = "frame"
+
+
+class Framing(Enum):
+  TEXT = "text"
+  BINARY = "binary"
+
+# the binary framing mode is requested with a flush command whose data byte
+# is set. Firmware that supports it acknowledges with FRAMING_ACK, older
+# firmware replies with the plain flush response.
+FRAMING_REQUEST = bytes([3,0,0,0,1])
+FRAMING_ACK = "flushed binary"
+
+# support for the PROFILE_SWEEP command is queried the same way, with a
+# flush data byte of 2. Older firmware answers with the plain flush
+# response, and the host then profiles one point per command. The query is
+# sent before FRAMING_REQUEST, so framing is always negotiated last.
+SWEEP_REQUEST = bytes([3,0,0,0,2])
+SWEEP_ACK = "flushed sweep"
+
+# the firmware reads the command header into a cmd_t and finds a command
+# payload right after it, at sizeof(cmd_t). The whole message, including the
+# line terminator, must fit in its INBUF receive buffer.
+CMD_HEADER_SIZE = 40
+INBUF_SIZE = 512
+
+# a binary frame follows an AC:>[frame] line: the payload type, the width
+# of each element in bytes, the number of elements, and then the
+# little-endian elements.
+def frame_header_t():
+  return cstruct.Struct(
+    "payload_type" / cstruct.Int8ul,
+    "width" / cstruct.Int8ul,
+    "n" / cstruct.Int32ul
+  )
+
+FRAME_HEADER_SIZE = 6
+FRAME_DTYPES = {1:np.dtype('<u1'), 2:np.dtype('<u2'), 4:np.dtype('<u4')}
 
 
 class ArduinoResponseState(Enum):
@@ -242,10 +282,46 @@ class PayloadArduinoResponse(GenericArduinoResponse):
     resp.set_array(buf)
     return resp
 
+  @staticmethod
+  def parse_frame(header,body):
+    hdr = frame_header_t().parse(header)
+    if not hdr.width in FRAME_DTYPES:
+      raise Exception("unsupported frame element width <%d>" % hdr.width)
+
+    if len(body) != hdr.n*hdr.width:
+      raise Exception("byte # mismatch: expected=%d, num=%d" % \
+                      (hdr.n*hdr.width,len(body)))
+
+    resp = PayloadArduinoResponse(hdr.payload_type,hdr.n)
+    resp.set_array(np.frombuffer(body,dtype=FRAME_DTYPES[hdr.width], \
+                                 count=hdr.n))
+    return resp
+
+  @staticmethod
+  def read_frame(ard):
+    header = ard.read(FRAME_HEADER_SIZE)
+    hdr = frame_header_t().parse(header)
+    body = ard.read(hdr.n*hdr.width)
+    return PayloadArduinoResponse.parse_frame(header,body)
+
   def __repr__(self):
     return "payload-resp(%s,n=%d)" % (str(self._array), self._n)
 
 
+def encode_frame(payload_type,array,width=1):
+  '''
+  serialize a payload as a binary frame, the inverse of
+  PayloadArduinoResponse.read_frame.
+  '''
+  if isinstance(array,(bytes,bytearray)):
+    array = np.frombuffer(array,dtype=np.uint8)
+  data = np.asarray(array).astype(FRAME_DTYPES[width])
+  header = frame_header_t().build(dict(payload_type=payload_type, \
+                                       width=width, \
+                                       n=len(data)))
+  return header + data.tobytes()
+
+
 def __arduino_command_header():
     return "AC:>"
 
@@ -268,6 +344,10 @@ def __parse_response(msg):
 
   elif typ == ArduinoResponseType.ERROR:
     return ErrorArduinoResponse.parse(args[1:])
+
+  elif typ == ArduinoResponseType.FRAME:
+    return None
+
   else:
     return GenericArduinoResponse(typ)
 
@@ -286,6 +366,10 @@ def get_response(ard,quiet=False):
     line = ard.readline()
     if __is_response(line):
       resp = __parse_response(line)
+      if resp is None:
+        # binary frames are read in bulk and handled like text payloads
+        resp = PayloadArduinoResponse.read_frame(ard)
+
       if resp.type == ArduinoResponseType.PROCESS:
         if not (state == ArduinoResponseState.PENDING):
           raise Exception("expected pending, received <%s>" % resp)
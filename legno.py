@@ -40,6 +40,15 @@ lgraph_subp.add_argument('--asm-fragments',type=int,default=3,
                          help='number of assembly fragments that are generated')
 lgraph_subp.add_argument('--synth-depth',type=int,default=20,
                          help='depth of synthesis fragments that are generated')
+lgraph_subp.add_argument('--no-cache',action='store_true',
+                         help='do not use the synthesized fragment cache')
+lgraph_subp.add_argument('--jobs',type=int,default=1,
+                         help='number of processes used for synthesis')
+lgraph_subp.add_argument('--route-solver',type=str,default="cbc",
+                         choices=["cbc","highs","ortools"],
+                         help='ilp solver used for routing')
+lgraph_subp.add_argument('--unify-seed',type=int,default=0,
+                         help='seed for the unification search order')
 
 lgraph_subp.add_argument('program', type=str,help='benchmark to compile')
 
@@ -56,6 +65,9 @@ lscale_subp.add_argument('--model-number', type=str, \
                        help='identifier for board.')
 lscale_subp.add_argument('--scale-adps', type=int,default=5, \
                        help='number of scaled adps to generate per adp.')
+lscale_subp.add_argument('--diversity', type=str,default=None, \
+                       choices=['lex','box'], \
+                       help='also maximize the distance from earlier solutions, with this objective priority.')
 lscale_subp.add_argument('program', type=str,help='benchmark to compile')
 
 
@@ -77,6 +89,11 @@ sim_subp.add_argument('--unscaled', action='store_true', \
                        help='simulate unscaled circuit.')
 sim_subp.add_argument('--reference', action='store_true', \
                        help='generate reference sim.')
+sim_subp.add_argument('--samples', type=int, \
+                       help='number of time points to sample.')
+sim_subp.add_argument('--integrator', type=str, default="LSODA", \
+                       choices=['zvode','LSODA','BDF','Radau','RK45'], \
+                       help='ode solver (zvode,LSODA,BDF,Radau,RK45).')
 
 
 
@@ -27,7 +27,20 @@ class OpType(Enum):
   MIN ="min"
   MAX ="max"
 
+class OpJsonUnsupported(Exception):
+    pass
+
 class Op:
+    # op trees are immutable once constructed, so the string form, the
+    # structural hash and the derived node/variable collections are
+    # computed at most once per node and shared by every tree that
+    # contains the node.
+    _repr_cache = None
+    _hash_cache = None
+    _free_vars_cache = None
+    _nodes_cache = None
+    _count_cache = None
+    _depth_cache = None
 
     def __init__(self,op,args):
         for arg in args:
@@ -52,22 +65,28 @@ class Op:
         return self._args
 
     def nodes(self):
-        child_nodes = [self]
-        for nodes in map(lambda a: a.nodes(), self._args):
-          child_nodes += nodes
+        if self._nodes_cache is None:
+          child_nodes = [self]
+          for nodes in map(lambda a: a.nodes(), self._args):
+            child_nodes += nodes
+          self._nodes_cache = tuple(child_nodes)
 
-        return child_nodes
+        return list(self._nodes_cache)
 
     def count(self):
-        child_nodes = sum(map(lambda a: a.count(), self._args))
-        return 1 + child_nodes
+        if self._count_cache is None:
+          child_nodes = sum(map(lambda a: a.count(), self._args))
+          self._count_cache = 1 + child_nodes
+        return self._count_cache
 
     def depth(self):
-        if len(self._args) == 0:
-            return 0
+        if self._depth_cache is None:
+          if len(self._args) == 0:
+            self._depth_cache = 0
+          else:
+            self._depth_cache = 1 + max(map(lambda a: a.depth(), self._args))
 
-        child_depth = max(map(lambda a: a.depth(), self._args))
-        return 1 + child_depth
+        return self._depth_cache
 
     def concretize(self):
         return self
@@ -76,22 +95,38 @@ class Op:
         argstr = " ".join(map(lambda arg: str(arg),self._args))
         return "(%s %s)" % (self._op.value,argstr)
 
+    def __str__(self):
+        if self._repr_cache is None:
+            self._repr_cache = self.__repr__()
+        return self._repr_cache
+
     def __eq__(self,other):
         assert(isinstance(other,Op))
+        if self is other:
+            return True
+        if hash(self) != hash(other):
+            return False
         return str(self) == str(other)
 
     def __hash__(self):
-        return hash(str(self))
+        if self._hash_cache is None:
+            self._hash_cache = hash(str(self))
+        return self._hash_cache
 
     def bwvars(self):
         return self.vars()
 
+    def free_vars(self):
+        if self._free_vars_cache is None:
+            self._free_vars_cache = frozenset(self.vars())
+        return self._free_vars_cache
+
     def vars(self):
-        vars = []
+        vars = set()
         for arg in self._args:
-            vars += arg.vars()
+            vars.update(arg.free_vars())
 
-        return list(set(vars))
+        return list(vars)
 
     def to_json(self):
       args = list(map(lambda arg: arg.to_json(), \
@@ -127,19 +162,26 @@ class Op:
             return lambd.Sin.from_json(obj)
         elif op == OpType.COS:
             return lambd.Cos.from_json(obj)
+        elif op == OpType.INTEG:
+            return generic.Integ.from_json(obj)
+        elif op == OpType.EMIT:
+            return generic.Emit.from_json(obj)
+        elif op == OpType.EXTVAR:
+            return generic.ExtVar.from_json(obj)
         elif op == OpType.MAX:
             return lambd.Max.from_json(obj)
         elif op == OpType.MIN:
             return lambd.Min.from_json(obj)
         else:
-            raise Exception("unimpl: %s" % obj)
+            raise OpJsonUnsupported("unimpl: %s" % obj)
 
 
     def is_constant(self):
       return False
 
+    # op trees are immutable, so copies can share the tree
     def copy(self):
-      return Op.from_json(self.to_json())
+      return self
 
 
     def substitute(self,bindings={}):
@@ -148,6 +190,12 @@ class Op:
     def compute(self,bindings={}):
       raise Exception("compute not implemented: %s" % self)
 
+    # evaluate the expression over a batch of points. The bindings map
+    # each variable to a numpy array (or a scalar), and the result is
+    # broadcast over the bound arrays.
+    def compute_array(self,bindings={}):
+      raise Exception("compute_array not implemented: %s" % self)
+
     def is_constant(self):
         if len(self._args) == 0:
             raise Exception("unimpl: is_constant for %s" % self)
@@ -193,6 +241,11 @@ class GenericOp2(GenericOp):
         arg2 = self._args[1].compute(bindings)
         return self.compute_op2(arg1,arg2)
 
+    def compute_array(self,bindings={}):
+        arg1 = self._args[0].compute_array(bindings)
+        arg2 = self._args[1].compute_array(bindings)
+        return self.compute_op2(arg1,arg2)
+
     def compute_op2(self,arg1,arg2):
         raise Exception("compute_op2 not implemented: %s" % self)
 
@@ -12,6 +12,11 @@ class Integ(GenericOp2):
         ic = self.arg(1).substitute(bindings)
         return Integ(inp,ic)
 
+    @staticmethod
+    def from_json(obj):
+        return Integ(Op.from_json(obj['args'][0]), \
+                     Op.from_json(obj['args'][1]))
+
     @property
     def handle(self):
         return self._handle
@@ -47,6 +52,9 @@ class ExtVar(GenericOp):
     def compute(self,bindings={}):
       return bindings[self._name]
 
+    def compute_array(self,bindings={}):
+      return bindings[self._name]
+
     def __repr__(self):
       return "(%s %s)" % \
         (self._op.value,self._name)
@@ -63,7 +71,7 @@ class ExtVar(GenericOp):
     def to_json(self):
       obj = Op.to_json(self)
       obj['name'] = self._name
-      obj['physical'] = self._physical
+      obj['physical'] = self._loc
       return obj
 
 class Var(Op):
@@ -104,6 +112,12 @@ class Var(Op):
 
         return bindings[self._name]
 
+    def compute_array(self,bindings={}):
+        if not self._name in bindings:
+            raise Exception("<%s> not bound" % self._name)
+
+        return bindings[self._name]
+
 
     def vars(self):
         return [self._name]
@@ -132,6 +146,9 @@ class Const(GenericOp):
     def compute(self,bindings={}):
         return self._value
 
+    def compute_array(self,bindings={}):
+        return self._value
+
     @property
     def value(self):
         return self._value
@@ -152,6 +169,14 @@ class Emit(Op):
         inp = self.arg(0).substitute(bindings)
         return Emit(inp,self._loc)
 
+    @staticmethod
+    def from_json(obj):
+        return Emit(Op.from_json(obj['args'][0]),obj.get('loc'))
+
+    def to_json(self):
+        obj = Op.to_json(self)
+        obj['loc'] = self._loc
+        return obj
 
     @property
     def loc(self):
@@ -160,6 +185,9 @@ class Emit(Op):
     def compute(self,bindings={}):
         return self.arg(0).compute(bindings)
 
+    def compute_array(self,bindings={}):
+        return self.arg(0).compute_array(bindings)
+
 
 
 
@@ -176,6 +204,9 @@ class Paren(Op):
     def compute(self,bindings={}):
         return self.arg(0).compute(bindings)
 
+    def compute_array(self,bindings={}):
+        return self.arg(0).compute_array(bindings)
+
 
     def substitute(self,args):
         return Paren(self.arg(0).substitute(args))
@@ -253,6 +284,13 @@ class Call(GenericOp):
         value = self._func.compute(new_bindings)
         return value
 
+    def compute_array(self,bindings={}):
+        new_bindings = {}
+        for func_arg,var in zip(self._func.func_args,self._params):
+            new_bindings[func_arg] = var.compute_array(bindings)
+
+        return self._func.compute_array(new_bindings)
+
     @property
     def func(self):
         return self._func
@@ -1,6 +1,7 @@
 from ops.base_op import *
 import ops.generic_op as genop
 import ops.interval as interval
+import numpy as np
 import math
 
 def to_python(e):
@@ -87,6 +88,74 @@ def to_python(e):
         raise Exception("unimpl: %s" % e)
 
 
+class DerivativeUnsupported(Exception):
+    pass
+
+def _is_const(e,value):
+    return e.op == OpType.CONST and e.value == value
+
+def _deriv_add(e1,e2):
+    if _is_const(e1,0.0):
+        return e2
+    elif _is_const(e2,0.0):
+        return e1
+    return genop.Add(e1,e2)
+
+def _deriv_mult(e1,e2):
+    if _is_const(e1,0.0) or _is_const(e2,0.0):
+        return genop.Const(0.0)
+    elif _is_const(e1,1.0):
+        return e2
+    elif _is_const(e2,1.0):
+        return e1
+    return genop.Mult(e1,e2)
+
+def derivative(e,var):
+    if e.op == OpType.VAR:
+        return genop.Const(1.0 if e.name == var else 0.0)
+
+    elif e.op == OpType.CONST or e.op == OpType.EXTVAR or \
+         e.op == OpType.SGN:
+        return genop.Const(0.0)
+
+    elif e.op == OpType.ADD:
+        return _deriv_add(derivative(e.arg(0),var), \
+                          derivative(e.arg(1),var))
+
+    elif e.op == OpType.MULT:
+        return _deriv_add( \
+                           _deriv_mult(derivative(e.arg(0),var),e.arg(1)), \
+                           _deriv_mult(e.arg(0),derivative(e.arg(1),var)))
+
+    elif e.op == OpType.POW:
+        if var in e.arg(1).vars():
+            raise DerivativeUnsupported("variable exponent: %s" % e)
+
+        # d(a^c) = c*a^(c-1)*da
+        expo = genop.Add(e.arg(1),genop.Const(-1.0))
+        return _deriv_mult(_deriv_mult(e.arg(1),Pow(e.arg(0),expo)), \
+                           derivative(e.arg(0),var))
+
+    elif e.op == OpType.SIN:
+        return _deriv_mult(Cos(e.arg(0)),derivative(e.arg(0),var))
+
+    elif e.op == OpType.COS:
+        return _deriv_mult(genop.Const(-1.0), \
+                           _deriv_mult(Sin(e.arg(0)),derivative(e.arg(0),var)))
+
+    elif e.op == OpType.ABS:
+        return _deriv_mult(Sgn(e.arg(0)),derivative(e.arg(0),var))
+
+    elif e.op == OpType.PAREN or e.op == OpType.EMIT:
+        return derivative(e.arg(0),var)
+
+    elif e.op == OpType.CALL:
+        return derivative(e.concretize(),var)
+
+    else:
+        raise DerivativeUnsupported("unimpl: %s" % e)
+
+
 class Func(Op):
     def __init__(self, params, expr):
         Op.__init__(self,OpType.FUNC,[])
@@ -99,6 +168,12 @@ class Func(Op):
 
         return self._expr.compute(bindings)
 
+    def compute_array(self,bindings):
+        for v in self._vars:
+            assert(v in bindings)
+
+        return self._expr.compute_array(bindings)
+
     @property
     def expr(self):
         return self._expr
@@ -156,6 +231,11 @@ class Max(Op):
         a1 = self.arg(1).compute(bindings)
         return max(a0,a1)
 
+    def compute_array(self,bindings):
+        a0 = self.arg(0).compute_array(bindings)
+        a1 = self.arg(1).compute_array(bindings)
+        return np.maximum(a0,a1)
+
     @staticmethod
     def from_json(obj):
         return Max( \
@@ -181,6 +261,11 @@ class Min(Op):
         a1 = self.arg(1).compute(bindings)
         return min(a0,a1)
 
+    def compute_array(self,bindings):
+        a0 = self.arg(0).compute_array(bindings)
+        a1 = self.arg(1).compute_array(bindings)
+        return np.minimum(a0,a1)
+
 
     @staticmethod
     def from_json(obj):
@@ -207,6 +292,11 @@ class Clamp(Op):
         result = self.arg(0).compute(bindings)
         return self._interval.clamp(result)
 
+    def compute_array(self,bindings):
+        result = self.arg(0).compute_array(bindings)
+        return np.clip(result,self._interval.lower, \
+                       self._interval.upper)
+
     def __repr__(self):
         return "clamp(%s,%s)" % (self.arg(0), \
                               self._interval)
@@ -224,6 +314,9 @@ class Abs(Op):
     def compute(self,bindings):
         return abs(self.arg(0).compute(bindings))
 
+    def compute_array(self,bindings):
+        return np.abs(self.arg(0).compute_array(bindings))
+
 
     def substitute(self,args):
         return Abs(self.arg(0).substitute(args))
@@ -245,6 +338,9 @@ class Sgn(Op):
     def compute(self,bindings):
         return math.copysign(1.0,self.arg(0).compute(bindings).real)
 
+    def compute_array(self,bindings):
+        return np.copysign(1.0,np.real(self.arg(0).compute_array(bindings)))
+
 
 class Ln(Op):
 
@@ -269,6 +365,9 @@ class Sin(Op):
     def compute(self,bindings):
         return math.sin(self.arg(0).compute(bindings).real)
 
+    def compute_array(self,bindings):
+        return np.sin(np.real(self.arg(0).compute_array(bindings)))
+
 
     def substitute(self,args):
         return Sin(self.arg(0).substitute(args))
@@ -286,6 +385,9 @@ class Cos(Op):
     def compute(self,bindings):
         return math.cos(self.arg(0).compute(bindings).real)
 
+    def compute_array(self,bindings):
+        return np.cos(np.real(self.arg(0).compute_array(bindings)))
+
 
     @staticmethod
     def from_json(obj):
@@ -327,6 +429,10 @@ class Pow(Op):
     def compute(self,bindings):
         return self.arg(0).compute(bindings)**self.arg(1).compute(bindings)
 
+    def compute_array(self,bindings):
+        return np.power(self.arg(0).compute_array(bindings), \
+                        self.arg(1).compute_array(bindings))
+
 
 
 def Sqrt(a):
@@ -560,15 +666,59 @@ def from_sympy(symexpr,no_aliasing=False):
         print(symexpr.func)
         raise Exception(sympy.srepr(symexpr))
 
-def equivalent(expr1,expr2):
+LOC_OPS = [OpType.EMIT, OpType.EXTVAR]
+
+def memo_key(expr):
+    '''
+    the structural form of the expression, followed by the locations of its
+    emit and external variable ops, which the structural form omits.
+    '''
+    locs = map(lambda node: str(node.loc), \
+               filter(lambda node: node.op in LOC_OPS, expr.nodes()))
+    return "%s@%s" % (expr,",".join(locs))
+
+class Memo:
+    '''
+    memo table for sympy queries over op trees, keyed by memo_key.
+    '''
+
+    def __init__(self,name):
+        self.name = name
+        self.table = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self,key,compute):
+        if key in self.table:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.table[key] = compute()
+        return self.table[key]
+
+    def __repr__(self):
+        return "%s-memo entries=%d hits=%d misses=%d" \
+            % (self.name,len(self.table),self.hits,self.misses)
+
+EQUIVALENT_MEMO = Memo("equivalent")
+SIMPLIFY_MEMO = Memo("simplify")
+
+def _equivalent(expr1,expr2):
     e1_syms,e2_syms = {},{}
     se1 = to_sympy(expr1,e1_syms)
     se2 = to_sympy(expr2,e2_syms)
     is_equal = se1 - se2 == 0
     return is_equal
 
-def simplify(expr):
+def equivalent(expr1,expr2):
+    return EQUIVALENT_MEMO.get((memo_key(expr1),memo_key(expr2)), \
+                               lambda: _equivalent(expr1,expr2))
+
+def _simplify(expr):
     e_syms = {}
     se = to_sympy(expr,e_syms)
     se_simpl = sympy.simplify(se)
     return from_sympy(se_simpl)
+
+def simplify(expr):
+    return SIMPLIFY_MEMO.get(memo_key(expr), lambda: _simplify(expr))
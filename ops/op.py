@@ -16,3 +16,7 @@ def mkadd(terms):
         for i in range(2,len(terms)):
             curr = Add(curr,terms[i])
         return curr
+
+def compute_array(expr,bindings,npts):
+    value = expr.compute_array(bindings)
+    return np.broadcast_to(value,(npts,)).copy()
@@ -27,6 +27,9 @@ class Z3Ctx:
     else:
       self._solver = z3.Solver()
     self._do_optimize = False
+    self._objective = None
+    self._objective_scope = 0
+    self._scope = 0
     self._z3vars = {}
     self._smtvars = {}
     self._smtenv = env
@@ -35,7 +38,15 @@ class Z3Ctx:
 
   def set_objective(self,objfun):
     self._objective_fun = objfun
+    self._objective = None
     self._do_optimize = True
+
+  def set_priority(self,priority):
+    '''
+    how multiple objectives are combined: lex, box or pareto
+    '''
+    assert(isinstance(self._solver,z3.Optimize))
+    self._solver.set(priority=priority)
  
   def sat(self):
     return self._sat
@@ -61,9 +72,14 @@ class Z3Ctx:
 
   def push(self):
     self._solver.push()
+    self._scope += 1
 
   def pop(self):
     self._solver.pop()
+    self._scope -= 1
+    # an objective registered inside the popped scope is gone from the solver
+    if self._objective_scope > self._scope:
+      self._objective = None
 
   def cstr(self,cstr):
     self._solver.add(cstr)
@@ -88,20 +104,49 @@ class Z3Ctx:
 
     return assigns
 
-  def optimize(self):
+  def optimize(self,maximize=[]):
+    '''
+    minimize the objective function. The objective is registered with the
+    solver once, so repeated calls reuse the solver state. The additional
+    objectives to maximize only apply to this call.
+    '''
     rmap = {
       'unsat': False,
       'unknown': False,
       'sat': True
     }
     assert(self._do_optimize)
-    handle = self._solver.minimize(self._objective_fun)
+    if self._objective is None:
+      self._objective = self._solver.minimize(self._objective_fun)
+      self._objective_scope = self._scope
+
+    if len(maximize) > 0:
+      self._solver.push()
+      for objfun in maximize:
+        self._solver.maximize(objfun)
+
     result = self._solver.check()
     self._sat = rmap[str(result)]
     if self.sat():
-      m = self._solver.model()
-      self._model = m
-      return self.translate(m)
+      self._model = self._solver.model()
+      assigns = self.translate(self._model)
+
+    if len(maximize) > 0:
+      self._solver.pop()
+
+    if self.sat():
+      return assigns
+
+  def distance(self,models):
+    '''
+    number of variable assignments that differ from the given models
+    '''
+    terms = []
+    for model in models:
+      for var,value in model.items():
+        terms.append(z3.If(self.z3var(var) != value,1,0))
+
+    return z3.Sum(terms) if len(terms) > 0 else z3.IntVal(0)
 
 
   def solve(self):
@@ -133,6 +178,9 @@ class Z3Ctx:
       sln = solve_once()
 
   def negate_model(self,model):
+    if len(model) == 0:
+      return False
+
     clauses = []
     for var,value in model.items():
       clause = SMTNeq(SMTVar(var),SMTConst(value))
@@ -140,6 +188,7 @@ class Z3Ctx:
 
     neg_cstr = SMTMapOr(clauses)
     self.cstr(neg_cstr.to_z3(self))
+    return True
 
   def next_solution(self):
     assert(self._sat)
@@ -9,6 +9,11 @@ import runtime.dectree.dectree as dectreelib
 import numpy as np
 import warnings
 
+# split scores closer than this are ties. The prefix sum scores differ from
+# the per-split regression scores by float noise, so exact comparisons would
+# not break ties the way the exhaustive scan does.
+SCORE_TOL = 1e-9
+
 def gini_score(inputs,output):
   reg = LinearRegression().fit(inputs, output)
   if len(output) >= 2:
@@ -52,7 +57,7 @@ def to_terminal(inputs,output):
 
 
 # Create child splits for a node or make terminal
-def split(node, max_depth, min_size, depth):
+def split(node, max_depth, min_size, depth, bins=None):
     input_left, input_right = node['input_groups']
     output_left, output_right = node['output_groups']
     del (node['input_groups'])
@@ -81,15 +86,15 @@ def split(node, max_depth, min_size, depth):
     if len(input_left) <= min_size:
         node['left'] = to_terminal(input_left,output_left)
     else:
-        node['left'] = get_split(input_left,output_left)
-        split(node['left'], max_depth, min_size, depth + 1)
+        node['left'] = get_split(input_left,output_left,bins)
+        split(node['left'], max_depth, min_size, depth + 1, bins)
 
     # process right child
     if len(input_right) <= min_size:
         node['right'] = to_terminal(input_right,output_right)
     else:
-        node['right'] = get_split(input_right,output_right)
-        split(node['right'], max_depth, min_size, depth + 1)
+        node['right'] = get_split(input_right,output_right,bins)
+        split(node['right'], max_depth, min_size, depth + 1, bins)
 
 
 # Split a dataset based on an attribute and an attribute value
@@ -108,34 +113,93 @@ def test_split(input_index, input_value, inputs, output):
     return (left_inputs,right_inputs), (left_output,right_output)
 
 
+# R2 score of the least squares fit of every group, computed from the
+# sufficient statistics ZtZ, Zty, yty and sum(y) of each group.
+def r2_scores(ztz,zty,yty,ysum,counts):
+    ss_res = yty - np.einsum('ki,ki->k',zty, \
+                             np.einsum('kij,kj->ki',np.linalg.pinv(ztz),zty))
+    ss_tot = yty - np.square(ysum)/np.maximum(counts,1)
+    tol = 1e-12*(1.0+np.max(np.abs(yty)))
+    scores = np.ones(len(counts))
+    nonconst = ss_tot > tol
+    scores[nonconst] = 1.0 - ss_res[nonconst]/ss_tot[nonconst]
+    scores[counts < 2] = 0.0
+    return scores
+
+
+def candidate_thresholds(values,bins=None):
+    thresholds = np.unique(values)
+    if not bins is None and len(thresholds) > bins+1:
+        quantiles = np.unique(np.round(np.linspace(0,len(thresholds)-1,bins+1)) \
+                              .astype(int))
+        thresholds = thresholds[quantiles]
+    return thresholds
+
+
+# Score every threshold of one input. The rows are sorted by the input
+# once, and the sufficient statistics of each split are read off the
+# prefix sums, so each threshold is scored in constant time. Also returns
+# the row each threshold first occurs at, which the stable sort places at
+# the start of the threshold's run.
+def score_thresholds(x,Z,y,bins=None):
+    n = len(y)
+    order = np.argsort(x,kind='stable')
+    xs = x[order]
+    Zs = Z[order]
+    ys = y[order]
+
+    def prefix(arr):
+      cum = np.cumsum(arr,axis=0)
+      return np.concatenate([np.zeros((1,)+arr.shape[1:]),cum],axis=0)
+
+    ztz = prefix(Zs[:,:,None]*Zs[:,None,:])
+    zty = prefix(Zs*ys[:,None])
+    yty = prefix(np.square(ys))
+    ysum = prefix(ys)
+
+    thresholds = candidate_thresholds(x,bins)
+    # rows strictly below the threshold go left
+    left = np.searchsorted(xs,thresholds,side='left')
+    left_scores = r2_scores(ztz[left],zty[left],yty[left],ysum[left],left)
+    right_scores = r2_scores(ztz[n]-ztz[left],zty[n]-zty[left], \
+                             yty[n]-yty[left],ysum[n]-ysum[left],n-left)
+    gini = ((1.0-left_scores)*left + (1.0-right_scores)*(n-left))/float(n)
+    return thresholds,gini,order[left]
+
+
 # Select the best split point for a dataset
-def get_split(inputs, output):
-    n_rows = len(inputs)
-    n_inputs = len(inputs[0])
+def get_split(inputs, output, bins=None):
+    X = np.array(inputs,dtype=float)
+    y = np.array(output,dtype=float)
+    n_rows,n_inputs = X.shape
+    # the scores are shift invariant, so center the data for conditioning
+    Xc = X - np.mean(X,axis=0)
+    Z = np.concatenate([Xc,np.ones((n_rows,1))],axis=1)
+    yc = y - np.mean(y)
+
     b_index, b_value, b_score = 999, 999, 999
-    b_input_groups,b_output_groups = None, None
     for index in range(n_inputs):
-        for row in inputs:
-            input_groups,output_groups = test_split(index, \
-                                                    row[index], \
-                                                    inputs, \
-                                                    output)
-            gini = gini_index(input_groups,output_groups)
-            if gini < b_score:
-                b_index, b_value, b_score = index, row[index], gini
-                b_input_groups = input_groups
-                b_output_groups = output_groups
-
+        thresholds,gini,first_row = score_thresholds(X[:,index],Z,yc,bins)
+        # break ties like an exhaustive scan over the rows would, by
+        # picking the threshold that first occurs in the dataset.
+        tied = np.nonzero(gini <= np.min(gini) + SCORE_TOL)[0]
+        best = min(tied, key=lambda i: first_row[i])
+        # earlier inputs win ties
+        if gini[best] < b_score - SCORE_TOL:
+            b_index, b_score = index, gini[best]
+            b_value = inputs[first_row[best]][index]
+
+    input_groups,output_groups = test_split(b_index,b_value,inputs,output)
     return {'index':b_index, \
             'value':b_value, \
-            'input_groups':b_input_groups, \
-            'output_groups':b_output_groups}
+            'input_groups':input_groups, \
+            'output_groups':output_groups}
 
 
 # Build a decision tree
-def build_tree(inputs, output, max_depth, min_size):
-    root = get_split(inputs, output)
-    split(root, max_depth, min_size, 1)
+def build_tree(inputs, output, max_depth, min_size, bins=None):
+    root = get_split(inputs, output, bins)
+    split(root, max_depth, min_size, 1, bins)
     return root
 
 
@@ -178,8 +242,9 @@ def finalize_tree(input_names,node):
 
 
 # Classification and Regression Tree Algorithm
-def fit_decision_tree(input_names,inputs, output, bounds, max_depth, min_size):
-    tree = build_tree(inputs, output, max_depth, min_size)
+def fit_decision_tree(input_names,inputs, output, bounds, max_depth, min_size, \
+                      bins=None):
+    tree = build_tree(inputs, output, max_depth, min_size, bins)
     clstree = finalize_tree(input_names,tree)
     clstree.update(regionlib.Region(bounds))
     predictions = list()
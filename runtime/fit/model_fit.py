@@ -8,130 +8,119 @@ import ops.lambda_op as lambdoplib
 import ops.op as oplib
 import itertools
 import math
+import time
 import numpy as np
-import scipy
-
-def _prepare_minimize_model(variables,expr,params,bounds={}):
-  n_inputs = len(variables)
-  #if phys.model.complete:
-  #  return False
-
-  repl = {}
-  dataset = [None]*n_inputs
-  for idx,bound_var in enumerate(variables):
-    repl[bound_var] = genoplib.Var("x[%d]" % idx)
+from scipy import optimize
 
-  for par,value in params.items():
-    repl[par] = genoplib.Const(value)
+class CompiledExpr:
+  '''
+  vectorized evaluation of an expression over numpy arrays of inputs, along
+  with its analytic gradient with respect to a list of free variables. The
+  expression is differentiated once; every evaluation walks the op tree with
+  compute_array, so no source code is generated. If some op cannot be
+  differentiated, jacobian() is None and scipy uses finite differences.
+  '''
+
+  def __init__(self,expr,free_vars,inputs={},consts={},npts=None):
+    self.expr = expr
+    self.free_vars = list(free_vars)
+    self.inputs = dict(map(lambda tup: (tup[0],np.asarray(tup[1],dtype=float)), \
+                           inputs.items()))
+    self.consts = dict(consts)
+    if npts is None:
+      npts = max([1]+list(map(lambda arr: len(arr), self.inputs.values())))
+    self.npts = npts
+    try:
+      self.deriv_exprs = list(map(lambda v: lambdoplib.derivative(expr,v), \
+                                  self.free_vars))
+    except lambdoplib.DerivativeUnsupported as e:
+      print("[warn] no analytic jacobian: %s" % e)
+      self.deriv_exprs = None
+
+  def bindings(self,x):
+    assigns = dict(self.inputs)
+    assigns.update(self.consts)
+    for v,value in zip(self.free_vars,x):
+      assigns[v] = value
+    return assigns
+
+  def evaluate(self,x):
+    return np.real(oplib.compute_array(self.expr,self.bindings(x),self.npts))
+
+  def jacobian(self,x):
+    assigns = self.bindings(x)
+    cols = list(map(lambda e: np.real(oplib.compute_array(e,assigns,self.npts)), \
+                    self.deriv_exprs))
+    return np.stack(cols,axis=1)
+
+  @property
+  def has_jacobian(self):
+    return not self.deriv_exprs is None
 
-  bounds_arr = [(None,None)]*n_inputs
+def _prepare_minimize_model(variables,expr,params,bounds={}):
+  bounds_arr = [(None,None)]*len(variables)
   for var,(lower,upper) in bounds.items():
     if not var in variables:
        continue
     idx = variables.index(var)
     bounds_arr[idx] = (lower,upper)
 
-  conc_expr = expr.substitute(repl)
-  _,pyexpr = lambdoplib.to_python(conc_expr)
-  return {
-    'expr':pyexpr,
-    'bounds':bounds_arr,
-    'variable_array':variables
-  }
-
-GLOBAL_MIN_PROG = '''
-from scipy import optimize
-import numpy as np
-
-def func(x):
-  return {expr}
-
-
-x0={x0}
-bnds={bounds}
-lbls={variable_array}
-res = optimize.dual_annealing(func,bounds=bnds)
-assigns = dict(zip(lbls,res.x))
-'''
+  objective = CompiledExpr(expr,variables,consts=params)
+  return objective,bounds_arr
 
-def global_minimize_model(variables,expr,params,bounds={}):
-  fields = _prepare_minimize_model(variables,expr,params,bounds)
-  fields["x0"] = list(map(lambda v: 1, variables))
-  print(scipy.__version__)
-  snippet = GLOBAL_MIN_PROG.format(**fields) \
-                    .replace('math.','np.')
-  loc = {}
-  exec(snippet,globals(),loc)
+def _minimize_result(variables,res,start):
   return {
-    'values': loc['assigns'],
-    'success': loc['res'].success,
-    'objective_val': loc['res'].fun
+    'values': dict(zip(variables,res.x)),
+    'success': res.success,
+    'objective_val': res.fun,
+    'diagnostics': {
+      'nfev': res.nfev,
+      'message': res.message,
+      'time': time.time() - start
+    }
   }
 
-
-
-LOCAL_MIN_PROG = '''
-from scipy.optimize import minimize
-import numpy as np
-
-def func(x):
-  return {expr}
-
-
-x0={x0}
-bnds={bounds}
-lbls={variable_array}
-res = minimize(func,x0,bounds=bnds)
-assigns = dict(zip(lbls,res.x))
-'''
-
+def global_minimize_model(variables,expr,params,bounds={}):
+  start = time.time()
+  objective,bnds = _prepare_minimize_model(variables,expr,params,bounds)
+  res = optimize.dual_annealing(lambda x: objective.evaluate(x)[0], \
+                                bounds=bnds)
+  return _minimize_result(variables,res,start)
 
 def local_minimize_model(variables,expr,params,bounds={}):
-  fields = _prepare_minimize_model(variables,expr,params,bounds)
-  fields["x0"] = list(map(lambda v: 1, variables))
-  snippet = LOCAL_MIN_PROG.format(**fields) \
-                    .replace('math.','np.')
-  loc = {}
-  exec(snippet,globals(),loc)
-  return {
-    'values': loc['assigns'],
-    'success': loc['res'].success,
-    'objective_val': loc['res'].fun
-  }
+  start = time.time()
+  objective,bnds = _prepare_minimize_model(variables,expr,params,bounds)
+  x0 = list(map(lambda v: 1, variables))
+  jac = (lambda x: objective.jacobian(x)[0]) \
+        if objective.has_jacobian else None
+  res = optimize.minimize(lambda x: objective.evaluate(x)[0],x0, \
+                          jac=jac,bounds=bnds)
+  return _minimize_result(variables,res,start)
 
 
 def minimize_model(variables,expr,params,bounds={}):
   return local_minimize_model(variables,expr,params,bounds)
 
-FIT_PROG = '''
-from scipy.optimize import curve_fit
-import numpy as np
-
-def func(x,{free_vars}):
-  return {expr}
-
-
-xdata = {x_dataset}
-#print("xdata:",xdata)
-
-ydata = {y_dataset}
-#print("ydata:",ydata)
-
-#print("func:",func)
-
-
-popt,pcov = curve_fit(func,xdata,ydata)
-#print("popt:",popt)
-#print("pcov:",pcov)
-lbls = [{free_var_array}]
-assigns = dict(zip(lbls,popt))
-perr = np.sqrt(np.diag(pcov))
-'''
-
+def _param_stdevs(res,npts):
+  '''
+  standard deviation of the fitted parameters, computed from the jacobian
+  at the solution the same way scipy.optimize.curve_fit computes pcov.
+  '''
+  n_params = len(res.x)
+  _,svals,vt = np.linalg.svd(res.jac,full_matrices=False)
+  threshold = np.finfo(float).eps * max(res.jac.shape) * svals[0] \
+              if len(svals) > 0 else 0.0
+  svals = svals[svals > threshold]
+  vt = vt[:len(svals)]
+  pcov = np.dot(vt.T / svals**2, vt)
+  if npts > n_params:
+    pcov = pcov * (2.0*res.cost / (npts - n_params))
+  else:
+    pcov.fill(np.inf)
+  return np.sqrt(np.diag(pcov))
 
 def fit_model(all_vars,expr,data):
-
-  #print("*********START OF FIT_MODEL*********")
+  start = time.time()
   inputs = {}
   for varname,datum in data['inputs'].items():
     if varname in expr.vars():
@@ -146,52 +135,38 @@ def fit_model(all_vars,expr,data):
     print("no variables to fit... all-vars=%s expr=%s" % (all_vars,expr))
     return
 
-  #print("inputs:", inputs)
-  meas_output = data['meas_mean']
-  #print("meas_output:", meas_output)
-  n_inputs = len(inputs.keys())
-
-  #if phys.model.complete:
-  #  return False
-  repl = {}
-  dataset = [None]*n_inputs
-  for idx,bound_var in enumerate(inputs.keys()):
-    assert(len(inputs[bound_var]) == len(meas_output))
-    dataset[idx] = inputs[bound_var]
-    #print("dataset[idx] is:", dataset[idx])
-    repl[bound_var] = genoplib.Var("x[%d]" % idx)
-    #print("repl[bound_var]: ",repl[bound_var])
-
-  conc_expr = expr.substitute(repl)
-  #print("conc_expr", conc_expr)
-  _,pyexpr = lambdoplib.to_python(conc_expr)
-  #print("variables:",variables)
-  fields = {
-    'free_vars':",".join(variables),
-    'free_var_array':",".join(map(lambda p: '"%s"' % p, variables)),
-    'x_dataset': str(dataset),
-    'y_dataset': str(meas_output),
-    'expr':pyexpr
-  }
-  #print("fields:",fields)
-  snippet = FIT_PROG.format(**fields) \
-                    .replace('math.','np.')
-
-  loc = {}
-  if len(data['meas_mean']) == 0:
+  meas_output = np.asarray(data['meas_mean'],dtype=float)
+  if len(meas_output) == 0:
     raise Exception("fit_model: cannot fit empty dataset")
 
-  exec(snippet,globals(),loc)
-  parameters = loc['lbls']
-  #print("parameters:",parameters)
-  parameter_values = loc['popt']
-  #print("parameter_values:",parameter_values)
-  parameter_stdevs = loc['perr']
-  #print("parameter_stdevs:",parameter_stdevs)
-  #print("*********END OF FIT_MODEL*********")
+  for bound_var,datum in inputs.items():
+    assert(len(datum) == len(meas_output))
+
+  # an underdetermined fit returns arbitrary parameters
+  if len(meas_output) < len(variables):
+    raise Exception("fit_model: insufficient data: %d points for %d parameters" \
+                    % (len(meas_output),len(variables)))
+
+  model = CompiledExpr(expr,variables,inputs=inputs,npts=len(meas_output))
+  residual = lambda x: model.evaluate(x) - meas_output
+  jac = model.jacobian if model.has_jacobian else '2-point'
+  # levenberg-marquardt, the curve_fit default
+  x0 = np.ones(len(variables))
+  res = optimize.least_squares(residual,x0,jac=jac,method='lm')
+  if not res.success:
+    raise Exception("fit_model: %s" % res.message)
+
   return {
-    'params': dict(zip(parameters,parameter_values)),
-    'param_error': parameter_stdevs
+    'params': dict(zip(variables,res.x)),
+    'param_error': _param_stdevs(res,len(meas_output)),
+    'diagnostics': {
+      'npts': len(meas_output),
+      'nfev': res.nfev,
+      'cost': res.cost,
+      'rmse': math.sqrt(2.0*res.cost/len(meas_output)),
+      'analytic_jacobian': model.has_jacobian,
+      'time': time.time() - start
+    }
   }
 
 def predict_output(variable_assigns,expr,data):
@@ -230,6 +205,11 @@ def fit_delta_model_to_data(delta_model,relation,data):
   if result is None:
     return False
 
+  diag = result['diagnostics']
+  print("fit %d points nfev=%d rmse=%f time=%.3fs" % (diag['npts'], \
+                                                     diag['nfev'], \
+                                                     diag['rmse'], \
+                                                     diag['time']))
   for par,val in result['params'].items():
     if par in relation.vars():
       delta_model.bind(par,val)
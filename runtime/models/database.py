@@ -9,6 +9,7 @@ import ops.op as oplib
 import base64
 import json
 import numpy as np
+from contextlib import contextmanager
 from enum import Enum
 
 
@@ -25,6 +26,23 @@ primary key (block,loc,output,static_config,hidden_config,method)
 );
 '''
 
+CREATE_POINTS_TABLE = '''
+CREATE TABLE IF NOT EXISTS profile_points (
+block text,
+loc text,
+output text,
+static_config text,
+hidden_config text,
+method text,
+point text
+);
+'''
+
+CREATE_POINTS_INDEX = '''
+CREATE INDEX IF NOT EXISTS profile_points_key ON profile_points
+(block,loc,output,static_config,hidden_config,method);
+'''
+
 CREATE_DELTA_TABLE = '''
 CREATE TABLE IF NOT EXISTS delta_models (
 block text,
@@ -48,21 +66,47 @@ primary key (block,static_config)
 );
 '''
 
+# secondary indexes for the lookups performed by
+# exp_delta_model.get_models_by_* and exp_profile_dataset.get_datasets*
+CREATE_INDICES = [
+  '''CREATE INDEX IF NOT EXISTS delta_models_block_config ON delta_models
+  (block,static_config);''',
+  '''CREATE INDEX IF NOT EXISTS delta_models_block_instance ON delta_models
+  (block,loc,static_config,calib_obj);''',
+  '''CREATE INDEX IF NOT EXISTS delta_models_calib_obj ON delta_models
+  (calib_obj);''',
+  '''CREATE INDEX IF NOT EXISTS profile_data_block_config ON profile_data
+  (block,static_config,hidden_config);'''
+]
+
 class PhysicalDatabase:
   class DB(Enum):
     DELTA_MODELS = "delta_models"
     PHYS_MODELS = "phys_models"
     PROFILE_DATASET = "profile_data"
+    PROFILE_POINTS = "profile_points"
 
-  def __init__(self,filename):
+  def __init__(self,filename,readonly=False):
     self.filename = filename
 
-    self.conn = sqlite3.connect(self.filename)
-    self.curs = self.conn.cursor()
-    self.curs.execute(CREATE_PHYS_TABLE)
-    self.curs.execute(CREATE_DELTA_TABLE)
-    self.curs.execute(CREATE_DATA_TABLE)
-    self.conn.commit()
+    if readonly:
+      # the tables of a read-only database must already exist
+      self.conn = sqlite3.connect("file:%s?mode=ro" % self.filename,uri=True)
+      self.curs = self.conn.cursor()
+    else:
+      self.conn = sqlite3.connect(self.filename)
+      self.conn.execute("PRAGMA journal_mode=WAL")
+      self.conn.execute("PRAGMA synchronous=NORMAL")
+      self.curs = self.conn.cursor()
+      self.curs.execute(CREATE_PHYS_TABLE)
+      self.curs.execute(CREATE_DELTA_TABLE)
+      self.curs.execute(CREATE_DATA_TABLE)
+      self.curs.execute(CREATE_POINTS_TABLE)
+      self.curs.execute(CREATE_POINTS_INDEX)
+      for cmd in CREATE_INDICES:
+        self.curs.execute(cmd)
+      self.conn.commit()
+    self._batch_depth = 0
     self.keys = {}
     self.keys[PhysicalDatabase.DB.PHYS_MODELS] = ['block','static_config','model']
     self.keys[PhysicalDatabase.DB.DELTA_MODELS] = ['block','loc','output', \
@@ -71,81 +115,149 @@ class PhysicalDatabase:
     self.keys[PhysicalDatabase.DB.PROFILE_DATASET] = ['block','loc','output', \
                                               'static_config','hidden_config', \
                                               'method','dataset']
+    self.keys[PhysicalDatabase.DB.PROFILE_POINTS] = ['block','loc','output', \
+                                              'static_config','hidden_config', \
+                                              'method','point']
 
     self.updateable = {}
     self.updateable[PhysicalDatabase.DB.PHYS_MODELS] = ['model']
     self.updateable[PhysicalDatabase.DB.DELTA_MODELS] = ['model','model_error']
     self.updateable[PhysicalDatabase.DB.PROFILE_DATASET] = ['dataset']
+    self.updateable[PhysicalDatabase.DB.PROFILE_POINTS] = []
+
+  @staticmethod
+  def _value(v):
+    # every column is stored as text
+    return str(v)
 
+  def _commit(self):
+    if self._batch_depth == 0:
+      self.conn.commit()
+
+  @contextmanager
+  def transaction(self):
+    '''
+    group all the writes performed in the block into one transaction. The
+    transaction is committed when the outermost block exits, and rolled
+    back if it raises an exception.
+    '''
+    self._batch_depth += 1
+    try:
+      yield self
+    except:
+      self._batch_depth -= 1
+      if self._batch_depth == 0:
+        self.conn.rollback()
+      raise
+    else:
+      self._batch_depth -= 1
+      if self._batch_depth == 0:
+        self.conn.commit()
+
+  def snapshot(self,filename):
+    '''
+    write a consistent copy of the committed contents of the database to
+    filename.
+    '''
+    dest = sqlite3.connect(filename)
+    try:
+      self.conn.backup(dest)
+    finally:
+      dest.close()
+
+  def _insert_cmd(self,db,verb="INSERT"):
+    row_fields = ",".join(self.keys[db])
+    row_values = ",".join(map(lambda k: "?", self.keys[db]))
+    return "%s INTO %s (%s) VALUES (%s)" % (verb,db.value, \
+                                            row_fields, \
+                                            row_values)
 
+  def _row(self,db,fields):
+    return tuple(map(lambda k: self._value(fields[k]), self.keys[db]))
 
   def insert(self,db,fields):
     assert(isinstance(db,PhysicalDatabase.DB))
-    row_fields = ",".join(self.keys[db])
-    row_values = ",".join(map(lambda k: "'{%s}'" % k, self.keys[db]))
-    INSERT = '''INSERT INTO %s (%s) VALUES (%s)''' % (db.value, \
-                                                        row_fields, \
-                                                        row_values)
-    cmd = INSERT.format(**fields)
-    self.curs.execute(cmd)
-    self.conn.commit()
+    self.curs.execute(self._insert_cmd(db),self._row(db,fields))
+    self._commit()
+
+  def upsert(self,db,fields):
+    self.bulk_upsert(db,[fields])
+
+  def bulk_upsert(self,db,rows):
+    '''
+    insert the rows, replacing any existing row with the same primary key.
+    All the rows are written with a single statement in one transaction.
+    '''
+    assert(isinstance(db,PhysicalDatabase.DB))
+    cmd = self._insert_cmd(db,verb="INSERT OR REPLACE")
+    self.curs.executemany(cmd,map(lambda fields: self._row(db,fields), rows))
+    self._commit()
 
   def _where_clause(self,db,fields):
     assert(isinstance(db,PhysicalDatabase.DB))
     reqs = []
+    args = []
     where_clause = dict(filter(lambda tup: tup[0] in self.keys[db], \
                                fields.items()))
     for k,v in where_clause.items():
-      reqs.append("%s='%s'" % (k,v.replace("'","''")))
+      reqs.append("%s=?" % k)
+      args.append(self._value(v))
 
     if len(reqs) > 0:
-      return "WHERE "+(" AND ".join(reqs))
+      return "WHERE "+(" AND ".join(reqs)),args
     else:
-      return ""
+      return "",args
 
   def update(self,db,where_clause,fields):
     assert(isinstance(db,PhysicalDatabase.DB))
-    where_clause_frag = self._where_clause(db,where_clause)
+    where_clause_frag,where_args = self._where_clause(db,where_clause)
     assert(len(where_clause_frag) > 0)
-    upd_frag = ",".join(map(lambda upd: "%s='{%s}'" % (upd,upd), \
+    upd_frag = ",".join(map(lambda upd: "%s=?" % upd, \
                             self.updateable[db]))
+    upd_args = list(map(lambda upd: self._value(fields[upd]), \
+                        self.updateable[db]))
 
     UPDATE = "UPDATE %s SET %s %s" % (db.value,upd_frag, \
                                       where_clause_frag)
-    cmd = UPDATE.format(**fields)
-    self.curs.execute(cmd)
-    self.conn.commit()
+    self.curs.execute(UPDATE,upd_args + where_args)
+    self._commit()
 
-  def _select(self,db,action_clause,where_clause,distinct=False):
+  def _select(self,db,action_clause,where_clause,distinct=False, \
+              order_by=None):
     assert(isinstance(db,PhysicalDatabase.DB))
-    where_clause_frag = self._where_clause(db,where_clause)
+    where_clause_frag,where_args = self._where_clause(db,where_clause)
     if distinct:
       command = "SELECT DISTINCT"
     else:
       command = "SELECT"
 
-    cmd_templ = "{command} {action} FROM {db} {where}"
+    cmd_templ = "{command} {action} FROM {db} {where} {order}"
 
     SELECT = cmd_templ.format(command=command, \
                               action=action_clause, \
                               db=db.value,
-                              where=where_clause_frag)
+                              where=where_clause_frag,
+                              order="" if order_by is None \
+                              else "ORDER BY %s" % order_by)
 
-    result = self.curs.execute(SELECT)
-    for row in self.curs.fetchall():
+    # use a dedicated cursor, so rows are streamed without
+    # interfering with writes issued while the caller iterates.
+    curs = self.conn.cursor()
+    for row in curs.execute(SELECT,where_args):
       yield row
 
   def delete(self,db,where_clause):
     assert(isinstance(db,PhysicalDatabase.DB))
-    where_clause_frag = self._where_clause(db,where_clause)
+    where_clause_frag,where_args = self._where_clause(db,where_clause)
     DELETE = '''DELETE FROM {table} {where}'''
     cmd = DELETE.format(table=db.value, where=where_clause_frag)
-    self.curs.execute(cmd)
-    self.conn.commit()
+    self.curs.execute(cmd,where_args)
+    self._commit()
 
-  def select(self,db,fields):
+  def select(self,db,fields,order_by=None):
     assert(isinstance(db,PhysicalDatabase.DB))
-    for row in self._select(db,"*",fields):
+    for row in self._select(db,",".join(self.keys[db]),fields, \
+                            order_by=order_by):
       yield dict(zip(self.keys[db],row))
 
   def select_field(self,db,field_names,where_clause):
@@ -160,5 +272,3 @@ class PhysicalDatabase:
                                      where_clause,\
                                      distinct=True):
       yield dict(zip(field_names,field_values))
-
-
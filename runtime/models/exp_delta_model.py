@@ -8,6 +8,7 @@ import runtime.runtime_util as runtime_util
 import runtime.models.database as dblib
 
 import ops.generic_op as genoplib
+import ops.op as oplib
 import numpy as np
 
 class ExpDeltaModel:
@@ -27,6 +28,8 @@ class ExpDeltaModel:
     self._params = {}
     self._model_error = ExpDeltaModel.MAX_MODEL_ERROR
     self.calib_obj = calib_obj
+    # fingerprint of the profile datasets the model was fit to
+    self.dataset_fingerprint = None
 
   @property
   def params(self):
@@ -152,24 +155,15 @@ class ExpDeltaModel:
               correctable_only=False):
     inputs = {}
     for k,v in dataset.inputs.items():
-      inputs[k] = v
+      inputs[k] = np.array(v)
     for k,v in dataset.data.items():
-      inputs[k] = v
-
-    params = dict(self.params)
+      inputs[k] = np.array(v)
 
     rel = self.get_subexpr(init_cond=init_cond, \
                            correctable_only=correctable_only)
 
     n = len(dataset)
-    predictions = []
-    for idx in range(0,n):
-      assigns = dict(map(lambda k : (k,inputs[k][idx]), \
-                         inputs.keys()))
-      pred = rel.compute(assigns)
-      predictions.append(pred)
-
-    return predictions
+    return oplib.compute_array(rel,inputs,n)
 
 
   @property
@@ -227,7 +221,8 @@ class ExpDeltaModel:
         'config': self.config.to_json(),
         'model_error':self._model_error,
         'params': self._params,
-        'calib_obj':self.calib_obj.value
+        'calib_obj':self.calib_obj.value,
+        'dataset_fingerprint':self.dataset_fingerprint
     }
   #'phys_model': self.phys_models.to_json(),
 
@@ -244,6 +239,7 @@ class ExpDeltaModel:
     phys._params = obj['params']
     phys._model_error = obj['model_error']
     phys.calib_obj = llenums.CalibrateObjective(obj['calib_obj'])
+    phys.dataset_fingerprint = obj.get('dataset_fingerprint',None)
     return phys
 
 
@@ -262,31 +258,26 @@ def __to_delta_models(dev,matches):
     except Exception as e:
       continue
 
-def update(dev,model):
+def _model_fields(model):
     assert(isinstance(model,ExpDeltaModel))
-    #fields['phys_model'] = phys_util.encode_dict(fields['phys_model'])
-    where_clause = {
+    return {
       'block': model.block.name,
       'loc': str(model.loc),
       'output': model.output.name,
       'static_config': model.static_cfg,
       'hidden_config': model.hidden_cfg,
-      'calib_obj': model.calib_obj.value
-
+      'calib_obj': model.calib_obj.value,
+      'model': runtime_util.encode_dict(model.to_json()),
+      'model_error': model.model_error
     }
-    insert_clause = dict(where_clause)
-    insert_clause['model'] = runtime_util.encode_dict(model.to_json())
-    insert_clause['calib_obj'] = model.calib_obj.value
-    insert_clause['model_error'] = model.model_error
-    matches = list(dev.physdb \
-                   .select(dblib.PhysicalDatabase.DB.DELTA_MODELS,where_clause))
-    if len(matches) == 0:
-      dev.physdb.insert(dblib.PhysicalDatabase.DB.DELTA_MODELS,insert_clause)
-    elif len(matches) == 1:
-      dev.physdb.update(dblib.PhysicalDatabase.DB.DELTA_MODELS, \
-                        where_clause,insert_clause)
-    else:
-      raise Exception("cannot haave more than one match")
+
+def update(dev,model):
+    dev.physdb.upsert(dblib.PhysicalDatabase.DB.DELTA_MODELS, \
+                      _model_fields(model))
+
+def update_all(dev,models):
+    dev.physdb.bulk_upsert(dblib.PhysicalDatabase.DB.DELTA_MODELS, \
+                           list(map(_model_fields, models)))
 
 
 
@@ -9,6 +9,10 @@ import runtime.models.database as dblib
 import ops.generic_op as genoplib
 import ops.op as oplib
 
+import numpy as np
+import hashlib
+import json
+
 
 class ExpProfileDataset:
 
@@ -101,18 +105,52 @@ class ExpProfileDataset:
   def add(self,config,inputs,mean,std):
     assigns = {}
     for input_name in self.inputs.keys():
-      self.inputs[input_name].append(inputs[input_name])
-      assigns[input_name] = self.inputs[input_name][-1]
+      self.inputs[input_name] = _append(self.inputs[input_name], \
+                                        inputs[input_name])
+      assigns[input_name] = inputs[input_name]
 
     for data_name in self.data.keys():
       value = config[data_name].value
-      self.data[data_name].append(value)
-      assigns[data_name] = self.data[data_name][-1]
+      self.data[data_name] = _append(self.data[data_name],value)
+      assigns[data_name] = value
 
     value = self.relation().compute(assigns)
-    self.ideal_mean.append(value)
-    self.meas_mean.append(mean)
-    self.meas_stdev.append(std)
+    self.ideal_mean = _append(self.ideal_mean,value)
+    self.meas_mean = _append(self.meas_mean,mean)
+    self.meas_stdev = _append(self.meas_stdev,std)
+
+  def point_to_json(self,idx):
+    return {
+      'inputs': dict(map(lambda tup: (tup[0],float(tup[1][idx])), \
+                         self.inputs.items())),
+      'data': dict(map(lambda tup: (tup[0],float(tup[1][idx])), \
+                       self.data.items())),
+      'ideal': float(self.ideal_mean[idx]),
+      'mean': float(self.meas_mean[idx]),
+      'stdev': float(self.meas_stdev[idx])
+    }
+
+  def set_points(self,points):
+    '''
+    replace the measured points with the (json) points, stored as numpy
+    columns.
+    '''
+    for input_name in self.inputs.keys():
+      self.inputs[input_name] = np.array(list(map(lambda pt: \
+                                                  pt['inputs'][input_name], \
+                                                  points)),dtype=float)
+
+    for data_name in self.data.keys():
+      self.data[data_name] = np.array(list(map(lambda pt: \
+                                               pt['data'][data_name], \
+                                               points)),dtype=float)
+
+    self.ideal_mean = np.array(list(map(lambda pt: pt['ideal'], points)), \
+                               dtype=float)
+    self.meas_mean = np.array(list(map(lambda pt: pt['mean'], points)), \
+                              dtype=float)
+    self.meas_stdev = np.array(list(map(lambda pt: pt['stdev'], points)), \
+                               dtype=float)
 
   @property
   def size(self):
@@ -127,33 +165,27 @@ class ExpProfileDataset:
     method = llenums.ProfileOpType(data['method'])
 
     ds = ExpProfileDataset(blk,loc,output,cfg,method)
-
-    for input_name in ds.inputs.keys():
-      ds.inputs[input_name] = data['inputs'][input_name]
-
-    for data_name in ds.data.keys():
-      ds.data[data_name] = data['data'][data_name]
-
-    ds.ideal_mean = data['ideal']
-    ds.meas_mean = data['meas']['mean']
-    ds.meas_stdev = data['meas']['stdev']
-
-
+    ds.set_points(_json_points(data))
     return ds
 
-  def to_json(self):
+  def to_json(self,points=True):
+    def column(values):
+      return list(np.asarray(values,dtype=float).tolist()) if points else []
+
     return {
       'block': self.block.name,
       'loc':self.loc.to_json(),
       'config': self.config.to_json(),
       'output': self.output.name,
-      'inputs': self.inputs,
+      'inputs': dict(map(lambda tup: (tup[0],column(tup[1])), \
+                         self.inputs.items())),
       'method': self.method.value,
-      'data': self.data,
-      'ideal': self.ideal_mean,
+      'data': dict(map(lambda tup: (tup[0],column(tup[1])), \
+                       self.data.items())),
+      'ideal': column(self.ideal_mean),
       'meas': {
-        'mean': self.meas_mean,
-        'stdev': self.meas_stdev
+        'mean': column(self.meas_mean),
+        'stdev': column(self.meas_stdev)
       }
     }
 
@@ -178,45 +210,127 @@ class ExpProfileDataset:
 
     return st
 
+def _append(values,value):
+  # columns loaded from the database are numpy arrays. Convert a column to a
+  # list once, on the first new point, instead of copying the array on every
+  # point, so adding k points to a loaded dataset costs O(n+k).
+  if isinstance(values,np.ndarray):
+    values = values.tolist()
+  values.append(value)
+  return values
+
+def _json_points(data):
+  '''
+  the points stored inline in a (legacy) json dataset.
+  '''
+  points = []
+  for idx in range(len(data['meas']['mean'])):
+    points.append({
+      'inputs': dict(map(lambda tup: (tup[0],tup[1][idx]), \
+                         data['inputs'].items())),
+      'data': dict(map(lambda tup: (tup[0],tup[1][idx]), \
+                       data['data'].items())),
+      'ideal': data['ideal'][idx],
+      'mean': data['meas']['mean'][idx],
+      'stdev': data['meas']['stdev'][idx]
+    })
+  return points
+
+'''
+The profile_data table holds one header row per dataset, and the measured
+points are stored as one row each in the append-only profile_points table.
+Datasets written by earlier versions keep their points inline in the
+header; those points are read first, and are moved to the points table
+the next time the dataset is written.
+'''
+def _dataset_key(block,loc,output,cfg,method):
+  return {
+    'block': block.name,
+    'loc': str(loc),
+    'output':output.name,
+    'method':method.name,
+    'static_config': runtime_util.get_static_cfg(block,cfg),
+    'hidden_config': runtime_util.get_hidden_cfg(block,cfg)
+  }
+
+def _stored_points(dev,match):
+  where_clause = dict(match)
+  del where_clause['dataset']
+  rows = dev.physdb.select(dblib.PhysicalDatabase.DB.PROFILE_POINTS, \
+                           where_clause, order_by='rowid')
+  return list(map(lambda row: runtime_util.decode_dict(row['point']), rows))
+
 def __to_datasets(dev,matches):
   for match in matches:
     try:
-      yield ExpProfileDataset.from_json(dev, \
-                                        runtime_util.decode_dict(match['dataset']))
+      header = runtime_util.decode_dict(match['dataset'])
+      ds = ExpProfileDataset.from_json(dev,header)
+      ds.set_points(_json_points(header) + _stored_points(dev,match))
+      yield ds
     except Exception as e:
       pass
 
-def update(dev,dataset):
-    assert(isinstance(dataset,ExpProfileDataset))
-    #fields['phys_dataset'] = phys_util.encode_dict(fields['phys_dataset'])
-    where_clause = {
-      'block': dataset.block.name,
-      'loc': str(dataset.loc),
-      'output': dataset.output.name,
-      'method':dataset.method.name,
-      'static_config': dataset.static_cfg,
-      'hidden_config': dataset.hidden_cfg
-    }
+def _insert_points(dev,where_clause,points):
+  rows = []
+  for point in points:
     insert_clause = dict(where_clause)
-    insert_clause['dataset'] = runtime_util.encode_dict(dataset.to_json())
+    insert_clause['point'] = runtime_util.encode_dict(point)
+    rows.append(insert_clause)
+  dev.physdb.bulk_upsert(dblib.PhysicalDatabase.DB.PROFILE_POINTS,rows)
+
+def _write_header(dev,dataset,where_clause):
+  '''
+  make sure the dataset has a header row without inline points. Any legacy
+  inline points are moved to the points table.
+  '''
+  insert_clause = dict(where_clause)
+  insert_clause['dataset'] = runtime_util.encode_dict(dataset.to_json(points=False))
+  matches = list(dev.physdb.select(dblib.PhysicalDatabase.DB.PROFILE_DATASET, \
+                                   where_clause))
+  if len(matches) == 0:
+    dev.physdb.insert(dblib.PhysicalDatabase.DB.PROFILE_DATASET,insert_clause)
+    return
+
+  assert(len(matches) == 1)
+  header = runtime_util.decode_dict(matches[0]['dataset'])
+  legacy_points = _json_points(header)
+  if len(legacy_points) > 0:
+    stored_points = _stored_points(dev,matches[0])
+    dev.physdb.delete(dblib.PhysicalDatabase.DB.PROFILE_POINTS,where_clause)
+    _insert_points(dev,where_clause,legacy_points + stored_points)
+    dev.physdb.update(dblib.PhysicalDatabase.DB.PROFILE_DATASET, \
+                      where_clause,insert_clause)
+
+def append(dev,dataset):
+    '''
+    append the points in the dataset to the stored dataset. The cost is
+    proportional to the number of new points, not the stored points.
+    '''
+    assert(isinstance(dataset,ExpProfileDataset))
+    where_clause = _dataset_key(dataset.block,dataset.loc,dataset.output, \
+                                dataset.config,dataset.method)
+    with dev.physdb.transaction():
+      _write_header(dev,dataset,where_clause)
+      _insert_points(dev,where_clause, \
+                     map(lambda idx: dataset.point_to_json(idx), \
+                         range(len(dataset))))
 
-    matches = list(dev.physdb.select(dblib.PhysicalDatabase.DB.PROFILE_DATASET, \
-                                     where_clause))
-    if len(matches) == 0:
-      dev.physdb.insert(dblib.PhysicalDatabase.DB.PROFILE_DATASET,insert_clause)
-    elif len(matches) == 1:
-      dev.physdb.update(dblib.PhysicalDatabase.DB.PROFILE_DATASET, \
-                        where_clause,insert_clause)
+def update(dev,dataset):
+    '''
+    replace the stored dataset with this dataset
+    '''
+    assert(isinstance(dataset,ExpProfileDataset))
+    where_clause = _dataset_key(dataset.block,dataset.loc,dataset.output, \
+                                dataset.config,dataset.method)
+    with dev.physdb.transaction():
+      _write_header(dev,dataset,where_clause)
+      dev.physdb.delete(dblib.PhysicalDatabase.DB.PROFILE_POINTS,where_clause)
+      _insert_points(dev,where_clause, \
+                     map(lambda idx: dataset.point_to_json(idx), \
+                         range(len(dataset))))
 
 def load(dev,block,loc,output,cfg,method):
-    where_clause = {
-      'block': block.name,
-      'loc': str(loc),
-      'output':output.name,
-      'method':method.name,
-      'static_config': runtime_util.get_static_cfg(block,cfg),
-      'hidden_config': runtime_util.get_hidden_cfg(block,cfg)
-    }
+    where_clause = _dataset_key(block,loc,output,cfg,method)
     matches = list(dev.physdb.select(dblib.PhysicalDatabase.DB.PROFILE_DATASET,
                                      where_clause))
     if len(matches) == 1:
@@ -226,6 +340,17 @@ def load(dev,block,loc,output,cfg,method):
     else:
       raise Exception("can only have one match")
 
+def fingerprint(datasets):
+  '''
+  digest of the contents of a collection of datasets, used to detect
+  datasets that changed since a model was fit to them.
+  '''
+  digest = hashlib.sha1()
+  for obj in sorted(map(lambda ds: json.dumps(ds.to_json(),sort_keys=True), \
+                        datasets)):
+    digest.update(obj.encode('utf-8'))
+  return digest.hexdigest()
+
 def get_configured_block_instances(dev):
   instances = {}
   for ds in get_datasets(dev):
@@ -4,7 +4,7 @@ import hwlib.adp as adplib
 import hwlib.hcdc.llstructs as llstructs
 import hwlib.hcdc.llenums as llenums
 from hwlib.hcdc.llcmd_calibrate import calibrate
-from hwlib.hcdc.llcmd_profile import profile
+from hwlib.hcdc.llcmd_profile import profile, profile_sweep
 import hwlib.hcdc.hcdcv2 as hcdclib
 import itertools
 import ops.op as oplib
@@ -30,7 +30,11 @@ def calibrate(dev,runtime,block,inst,cfg):
 
 
 
-def profile_hidden_state(runtime,dev,planner,hidden,adp=None):
+def profile_hidden_state(runtime,dev,planner,hidden,adp=None,sweep=None):
+  # by default, sweep if the firmware said it supports PROFILE_SWEEP
+  if sweep is None:
+    sweep = runtime.sweep
+
   # make new config for profiling operation
   if adp is None:
      new_adp= adplib.ADP()
@@ -52,6 +56,10 @@ def profile_hidden_state(runtime,dev,planner,hidden,adp=None):
   planner.new_dynamic()
   output = planner.output
   method = planner.method
+  if sweep:
+    profile_dynamic_sweep(runtime,dev,planner,new_adp,config)
+    return
+
   dynamic = planner.next_dynamic()
   while not dynamic is None:
     input_vals = {}
@@ -76,10 +84,48 @@ def profile_hidden_state(runtime,dev,planner,hidden,adp=None):
 
     dynamic = planner.next_dynamic()
 
-def profile_all_hidden_states(runtime,dev,planner,adp=None):
+# profile the planner's dynamic points with sweep commands. Consecutive
+# points that assign the same data field values share the block state, and
+# are measured by one sweep.
+def profile_dynamic_sweep(runtime,dev,planner,new_adp,config):
+  groups = []
+  dynamic = planner.next_dynamic()
+  while not dynamic is None:
+    data_vals = {}
+    input_vals = {}
+    for name,value in dynamic.items():
+      if planner.block.data.has(name):
+        data_vals[name] = value
+      else:
+        st = planner.block.inputs[name]
+        input_vals[st.ll_identifier] = value
+
+    if len(groups) == 0 or groups[-1][0] != data_vals:
+      groups.append((data_vals,[]))
+    groups[-1][1].append(input_vals)
+    dynamic = planner.next_dynamic()
+
+  for data_vals,points in groups:
+    for name,value in data_vals.items():
+      assert(isinstance(config[name],  \
+                        adplib.ConstDataConfig))
+      config[name].value = value
+
+    print("-> sweep %d inputs data=%s" % (len(points),data_vals))
+    profile_sweep(runtime, \
+                  dev, \
+                  planner.block, \
+                  planner.loc, \
+                  new_adp, \
+                  planner.output.ll_identifier, \
+                  method=planner.method, \
+                  points=points)
+
+def profile_all_hidden_states(runtime,dev,planner,adp=None,sweep=None):
   planner.new_hidden()
   hidden_state = planner.next_hidden()
   while not hidden_state is None:
     print(hidden_state)
-    profile_hidden_state(runtime,dev,planner,hidden_state,adp=adp)
+    profile_hidden_state(runtime,dev,planner,hidden_state,adp=adp, \
+                         sweep=sweep)
     hidden_state = planner.next_hidden()
@@ -3,8 +3,6 @@ from hwlib.adp import ADP,ADPMetadata
 import runtime.runtime_util as runtime_util
 import runtime.models.exp_delta_model as delta_model_lib
 
-from lab_bench.grendel_runner import GrendelRunner
-
 import hwlib.hcdc.llenums as llenums
 import hwlib.hcdc.llcmd as llcmd
 
@@ -13,7 +11,7 @@ def calibrate_adp(args):
     adp = runtime_util.get_adp(board,args.adp)
 
     debug = False
-    runtime = GrendelRunner()
+    runtime = runtime_util.get_runner(args,board)
     if not debug:
         runtime.initialize()
     calib_obj = llenums.CalibrateObjective(args.method)
@@ -4,7 +4,6 @@ import runtime.runtime_util as runtime_util
 import runtime.models.exp_delta_model as exp_delta_model_lib
 import runtime.models.exp_profile_dataset as exp_profile_dataset_lib
 
-from lab_bench.grendel_runner import GrendelRunner
 import hwlib.hcdc.llcmd_util as llutil
 import hwlib.hcdc.llenums as llenums
 import hwlib.hcdc.llcmd as llcmd
@@ -66,7 +65,7 @@ def new_characterization(runtime,board,block,config, \
 def characterize_adp(args):
     board = runtime_util.get_device(args.model_number,layout=True)
     adp = runtime_util.get_adp(board,args.adp,widen=args.widen)
-    runtime = GrendelRunner()
+    runtime = runtime_util.get_runner(args,board)
     runtime.initialize()
     for cfg in adp.configs:
         blk = board.get_block(cfg.inst.block)
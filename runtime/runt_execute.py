@@ -9,7 +9,6 @@ import runtime.runtime_util as runtime_util
 
 import lab_bench.devices.sigilent_osc as osclib
 import lab_bench.devices.sigilent_osc_lib as oscliblib
-import lab_bench.grendel_runner as grendel_runner_lib
 import util.config as configlib
 
 import json
@@ -56,6 +55,8 @@ def exec_adp(args):
     sim = dsproglib.DSProgDB.get_sim(prog_name)
     if not args.osc:
         osc = None
+    elif args.emulate:
+        osc = osclib.DummySigilent1020XEOscilloscope()
     else:
         osc = osclib.Sigilent1020XEOscilloscope(configlib.OSC_IP, \
                                                 configlib.OSC_PORT)
@@ -66,8 +67,61 @@ def exec_adp(args):
         assert(args.runtime <= program.max_time)
         sim_time= args.runtime
 
-    runtime = grendel_runner_lib.GrendelRunner()
+    runtime = runtime_util.get_runner(args,board)
     runtime.initialize()
+    if args.emulate:
+        runtime.attach_simulation(board,program,adp,osc=osc)
+    calib_obj = llenums.CalibrateObjective(adp \
+                                           .metadata[ADPMetadata.Keys.RUNTIME_CALIB_OBJ])
+    if args.no_batch:
+        configure_adp(runtime,board,adp,calib_obj)
+    else:
+        configure_adp_batched(runtime,board,adp,calib_obj)
+
+    llcmd.execute_simulation(runtime,board, \
+                             program, adp,\
+                             sim_time=sim_time, \
+                             osc=osc, \
+                             manual=False)
+    runtime.close()
+
+def configure_adp_batched(runtime,board,adp,calib_obj):
+    cmds = []
+    for conn in adp.conns:
+        sblk = board.get_block(conn.source_inst.block)
+        dblk = board.get_block(conn.dest_inst.block)
+        cmds.append(llcmd.set_conn_cmd(sblk,conn.source_inst.loc, \
+                                       conn.source_port, \
+                                       dblk,conn.dest_inst.loc, \
+                                       conn.dest_port))
+
+    for cfg in adp.configs:
+        blk = board.get_block(cfg.inst.block)
+        cmds.append(llcmd.set_state_cmd(board, \
+                                        blk, \
+                                        cfg.inst.loc, \
+                                        adp, \
+                                        calib_obj=calib_obj))
+
+    statuses = llcmd.execute_batch(runtime,cmds)
+    n_failed = len(list(filter(lambda st: st != 0, statuses)))
+    print("configured %d connections and blocks (%d failed)" \
+          % (len(statuses),n_failed))
+    if n_failed > 0:
+        raise Exception("could not configure %d connections and blocks" \
+                        % n_failed)
+
+    for cfg in adp.configs:
+        blk = board.get_block(cfg.inst.block)
+        if blk.name == 'lut':
+            llcmd.write_lut(runtime, \
+                            board, \
+                            blk, \
+                            cfg.inst.loc, \
+                            adp, \
+                            calib_obj=calib_obj)
+
+def configure_adp(runtime,board,adp,calib_obj):
     for conn in adp.conns:
         sblk = board.get_block(conn.source_inst.block)
         dblk = board.get_block(conn.dest_inst.block)
@@ -76,8 +130,6 @@ def exec_adp(args):
                        dblk,conn.dest_inst.loc, \
                        conn.dest_port)
 
-    calib_obj = llenums.CalibrateObjective(adp \
-                                           .metadata[ADPMetadata.Keys.RUNTIME_CALIB_OBJ])
     for cfg in adp.configs:
         blk = board.get_block(cfg.inst.block)
         resp = llcmd.set_state(runtime, \
@@ -94,10 +146,3 @@ def exec_adp(args):
                             cfg.inst.loc, \
                             adp, \
                             calib_obj=calib_obj)
-
-    llcmd.execute_simulation(runtime,board, \
-                             program, adp,\
-                             sim_time=sim_time, \
-                             osc=osc, \
-                             manual=False)
-    runtime.close()
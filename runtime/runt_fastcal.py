@@ -1,4 +1,3 @@
-from lab_bench.grendel_runner import GrendelRunner
 import json
 import numpy as np
 
@@ -185,7 +184,7 @@ def fast_calibrate_adp(args):
     char_board = runt_util.get_device(args.char_data)
     adp = runtime_util.get_adp(board,args.adp)
 
-    runtime = GrendelRunner()
+    runtime = runtime_util.get_runner(args,board)
     runtime.initialize()
     calib_obj = llenums.CalibrateObjective.FAST
     for cfg in adp.configs:
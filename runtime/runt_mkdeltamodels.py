@@ -3,6 +3,7 @@ from hwlib.adp import ADP,ADPMetadata
 import runtime.runtime_util as runtime_util
 import runtime.models.exp_delta_model as exp_delta_model_lib
 import runtime.models.exp_profile_dataset as exp_profile_dataset_lib
+import runtime.models.database as dblib
 
 from lab_bench.grendel_runner import GrendelRunner
 
@@ -11,7 +12,13 @@ import hwlib.hcdc.llcmd as llcmd
 import ops.generic_op as genoplib
 
 import runtime.fit.model_fit as fitlib
+import hwlib.device as devlib
+import hwlib.adp as adplib
+import multiprocessing
 import numpy as np
+import os
+import shutil
+import tempfile
 
 def update_delta_model(dev,delta_model,dataset):
     if dataset.method == llenums.ProfileOpType.INPUT_OUTPUT:
@@ -54,7 +61,7 @@ def _get_delta_models(dev,blk,loc,output,config):
 
     return delta_models
 
-def _update_delta_models_for_configured_block(dev,delta_models,blk,loc,output,config,force=False):
+def _fit_delta_models_for_configured_block(dev,delta_models,blk,loc,output,config,force=False):
     model_errors = []
     for dataset in \
         exp_profile_dataset_lib.get_datasets_by_configured_block_instance(dev, \
@@ -82,31 +89,129 @@ def _update_delta_models_for_configured_block(dev,delta_models,blk,loc,output,co
         if delta_model.complete:
             print("%s %s %s" % (blk.name,loc,config.mode))
             print(delta_model)
-        exp_delta_model_lib.update(dev,delta_model)
 
     return True
 
-def update_delta_models_for_configured_block(dev,blk,loc,cfg,hidden=True,force=False):
-    num_deltas = 0
-
+def fit_delta_models_for_configured_block(dev,blk,loc,cfg,hidden=True, \
+                                          force=False,only_stale=False):
+    '''
+    fit the delta models of every output of the configured block instance and
+    return the fitted models. Nothing is written to the database.
+    '''
+    fitted = []
     for output in blk.outputs:
         delta_models = _get_delta_models(dev,blk,loc,output,cfg)
-        if all(map(lambda model: model.complete, delta_models)) and not force:
+        datasets = exp_profile_dataset_lib \
+            .get_datasets_by_configured_block_instance(dev,blk,loc,output,cfg, \
+                                                       hidden=hidden)
+        fingerprint = exp_profile_dataset_lib.fingerprint(datasets)
+        if only_stale and not force:
+            if all(map(lambda model: model.complete and \
+                       model.dataset_fingerprint == fingerprint, delta_models)):
+                continue
+        elif all(map(lambda model: model.complete, delta_models)) and not force:
             continue
+
         for model in delta_models:
             model.clear()
 
-        for dataset in exp_profile_dataset_lib \
-            .get_datasets_by_configured_block_instance(dev,blk,loc,output,cfg, \
-                                                       hidden=hidden):
-            if _update_delta_models_for_configured_block(dev,delta_models,blk, \
-                                                         loc,output, \
-                                                         dataset.config, force=force):
-                num_deltas += 1
+        # datasets with the same configuration are fit together
+        fitted_configs = set()
+        any_fit = False
+        for dataset in datasets:
+            key = (dataset.static_cfg,dataset.hidden_cfg)
+            if key in fitted_configs:
+                continue
+            fitted_configs.add(key)
+            if _fit_delta_models_for_configured_block(dev,delta_models,blk, \
+                                                      loc,output, \
+                                                      dataset.config, force=force):
+                any_fit = True
+
+        # the models of an output are returned once, however many
+        # configurations they were fit to
+        if any_fit:
+            for model in delta_models:
+                model.dataset_fingerprint = fingerprint
+            fitted += delta_models
+
+    return fitted
+
+def update_delta_models_for_configured_block(dev,blk,loc,cfg,hidden=True,force=False):
+    delta_models = fit_delta_models_for_configured_block(dev,blk,loc,cfg, \
+                                                         hidden=hidden, \
+                                                         force=force)
+    with dev.physdb.transaction():
+        exp_delta_model_lib.update_all(dev,delta_models)
+
+    return len(delta_models)
+
+# per-process fitting state. Each worker reads the profile data from a
+# read-only snapshot of the database taken before fitting starts, and sends
+# the fitted delta models back to the parent process, which is the only
+# writer.
+MKDELTAS_WORKER = {}
+
+def _init_mkdeltas_worker(model_number,snapshot,force,only_stale):
+    board = runtime_util.get_device(model_number)
+    board.set_physdb(dblib.PhysicalDatabase(snapshot,readonly=True))
+    MKDELTAS_WORKER['board'] = board
+    MKDELTAS_WORKER['force'] = force
+    MKDELTAS_WORKER['only_stale'] = only_stale
+
+def _mkdeltas_worker(args):
+    blk_name,loc,cfg = args
+    board = MKDELTAS_WORKER['board']
+    blk = board.get_block(blk_name)
+    models = fit_delta_models_for_configured_block(board,blk, \
+                                                   devlib.Location.from_json(loc), \
+                                                   adplib.BlockConfig.from_json(board,cfg), \
+                                                   hidden=True, \
+                                                   force=MKDELTAS_WORKER['force'], \
+                                                   only_stale=MKDELTAS_WORKER['only_stale'])
+    return list(map(lambda model: model.to_json(), models))
+
+def _fit_all(board,instances,args):
+    if args.jobs <= 1:
+        for blk,loc,cfg in instances:
+            yield fit_delta_models_for_configured_block(board,blk,loc,cfg, \
+                                                        hidden=True, \
+                                                        force=args.force, \
+                                                        only_stale=args.only_stale)
+        return
+
+    work = list(map(lambda inst: (inst[0].name,inst[1].to_json(), \
+                                  inst[2].to_json()), instances))
+    snapshot_dir = tempfile.mkdtemp(prefix="mkdeltas-")
+    snapshot = os.path.join(snapshot_dir,"snapshot.db")
+    board.physdb.snapshot(snapshot)
+    initargs = (args.model_number,snapshot,args.force,args.only_stale)
+    try:
+        with multiprocessing.Pool(args.jobs,initializer=_init_mkdeltas_worker, \
+                                  initargs=initargs) as pool:
+            for models in pool.imap_unordered(_mkdeltas_worker,work):
+                yield list(map(lambda obj: exp_delta_model_lib.ExpDeltaModel \
+                               .from_json(board,obj), models))
+    finally:
+        shutil.rmtree(snapshot_dir)
 
 def derive_delta_models_adp(args):
     board = runtime_util.get_device(args.model_number)
 
-    for blk,loc,cfg in exp_profile_dataset_lib \
-        .get_configured_block_instances(board):
-        update_delta_models_for_configured_block(board,blk,loc,cfg,hidden=True,force=args.force)
+    instances = list(exp_profile_dataset_lib \
+                     .get_configured_block_instances(board))
+    print("=== fitting %d configured block instances ===" % len(instances))
+    batch = []
+    n_models = 0
+    for models in _fit_all(board,instances,args):
+        batch += models
+        if len(batch) >= args.batch_size:
+            with board.physdb.transaction():
+                exp_delta_model_lib.update_all(board,batch)
+            n_models += len(batch)
+            batch = []
+
+    with board.physdb.transaction():
+        exp_delta_model_lib.update_all(board,batch)
+    n_models += len(batch)
+    print("=== wrote %d delta models ===" % n_models)
@@ -15,11 +15,16 @@ import ops.interval as ivallib
 
 
 import runtime.fit.model_fit as expr_fit_lib
+import runtime.dectree.dectree as dectreelib
 import runtime.dectree.dectree_fit as dectree_fit_lib
 import runtime.dectree.dectree_shrink as dectree_shrink_lib
 import runtime.dectree.dectree_generalize as dectree_generalize_lib
+import multiprocessing
 import numpy as np
+import random
+import time
 import json
+import zlib
 
 def update_dectree_data(blk,loc,exp_mdl, \
                         metadata, \
@@ -59,57 +64,90 @@ def update_dectree_data(blk,loc,exp_mdl, \
     model_errors[key].append(exp_mdl.model_error)
 
 
-def build_dectree(key,metadata, \
-                  hidden_code_fields, \
-                  hidden_code_bounds, \
-                  hidden_codes,\
-                  params, model_errors, \
-                  num_leaves,max_depth):
-    blk,loc,cfg = metadata[key]
+def dectree_work_items(key,metadata, \
+                       hidden_code_fields, \
+                       hidden_code_bounds, \
+                       hidden_codes,\
+                       params, model_errors, \
+                       num_leaves,max_depth,split_bins=None,seed=0):
+    '''
+    one work item per decision tree of the physical model: one for the
+    model error and one for each delta model parameter. The work items only
+    hold plain data, so they can be sent to worker processes.
+    '''
     n_samples = len(model_errors[key])
-    min_size = round(n_samples/num_leaves)
-    print("--- fitting decision tree (%d samples) ---" % n_samples)
-    hidden_code_fields_ = hidden_code_fields[key]
-    hidden_code_bounds_ = hidden_code_bounds[key]
-    hidden_codes_ = hidden_codes[key]
-    model_errors_ = model_errors[key]
-
-    model = exp_phys_model_lib.ExpPhysModel(blk,cfg)
-    model.num_samples = n_samples
-
-    print(cfg)
-    dectree,predictions = dectree_fit_lib.fit_decision_tree(hidden_code_fields_, \
-                                                    hidden_codes_, \
-                                                    model_errors_, \
-                                                    bounds=hidden_code_bounds_, \
-                                                    max_depth=max_depth, \
-                                                    min_size=min_size)
-    err = dectree_fit_lib.model_error(predictions,model_errors_)
-    pct_err = err/max(np.abs(model_errors_))*100.0
-    print("<<dectree>>: [[Model-Err]] err=%f pct-err=%f param-range=[%f,%f]" \
-            % (err, pct_err, \
-                min(model_errors_), \
-                max(model_errors_)))
-
-    model.set_model_error(dectree)
-
+    targets = [(exp_phys_model_lib.ExpPhysModel.MODEL_ERROR,model_errors[key])]
     for param,param_values in params[key].items():
         assert(len(param_values) == n_samples)
-        dectree,predictions = dectree_fit_lib.fit_decision_tree(hidden_code_fields_, \
-                                                        hidden_codes_, \
-                                                        param_values, \
-                                                        bounds=hidden_code_bounds_, \
-                                                        max_depth=max_depth, \
-                                                        min_size=min_size)
-        model.set_param(param, dectree)
-
-        err = dectree_fit_lib.model_error(predictions,param_values)
-        pct_err = err/max(np.abs(param_values))*100.0
-        print("<<dectree>>: [[Param:%s]] err=%f pct-err=%f param-range=[%f,%f]" \
-                % (param, err, pct_err, \
-                    min(param_values), \
-                    max(param_values)))
+        targets.append((param,param_values))
 
+    blk,loc,cfg = metadata[key]
+    for varname,values in targets:
+        ident = "%s-%s-%s-%s" % (blk.name,loc,cfg.mode,varname)
+        yield {
+            'variable':varname,
+            'seed':(seed + zlib.crc32(ident.encode('utf-8'))) % (2**32),
+            'fields':hidden_code_fields[key],
+            'bounds':hidden_code_bounds[key],
+            'inputs':hidden_codes[key],
+            'outputs':values,
+            'max_depth':max_depth,
+            'min_size':round(n_samples/num_leaves),
+            'split_bins':split_bins
+        }
+
+def fit_dectree(item):
+    random.seed(item['seed'])
+    np.random.seed(item['seed'])
+    start = time.time()
+    dectree,predictions = dectree_fit_lib.fit_decision_tree(item['fields'], \
+                                                    item['inputs'], \
+                                                    item['outputs'], \
+                                                    bounds=item['bounds'], \
+                                                    max_depth=item['max_depth'], \
+                                                    min_size=item['min_size'], \
+                                                    bins=item['split_bins'])
+    err = dectree_fit_lib.model_error(predictions,item['outputs'])
+    return {
+        'tree':dectree.to_json(),
+        'error':err,
+        'leaves':len(dectree.leaves()),
+        'time':time.time() - start
+    }
+
+def _fit_dectree_worker(args):
+    idx,item = args
+    return idx,fit_dectree(item)
+
+def fit_dectrees(items,jobs=1):
+    if jobs <= 1:
+        return list(map(fit_dectree, items))
+
+    results = [None]*len(items)
+    with multiprocessing.Pool(jobs) as pool:
+        for idx,result in pool.imap_unordered(_fit_dectree_worker, \
+                                              enumerate(items)):
+            results[idx] = result
+
+    return results
+
+def assemble_phys_model(key,metadata,items,results):
+    blk,loc,cfg = metadata[key]
+    model = exp_phys_model_lib.ExpPhysModel(blk,cfg)
+    print("--- decision trees %s %s (%d samples) ---" \
+          % (blk.name,loc,len(items[0]['outputs'])))
+    print(cfg)
+    for item,result in zip(items,results):
+        values = item['outputs']
+        dectree = dectreelib.Node.from_json(result['tree'])
+        model.set_variable(item['variable'],dectree)
+        pct_err = result['error']/max(np.abs(values))*100.0
+        print("<<dectree>>: [[%s]] err=%f pct-err=%f param-range=[%f,%f] leaves=%d time=%.3fs" \
+              % (item['variable'], result['error'], pct_err, \
+                 min(values), max(values), \
+                 result['leaves'], result['time']))
+
+    model.num_samples = len(items[0]['outputs'])
     return model
 
 def get_hidden_code_intervals(phys_model):
@@ -154,18 +192,38 @@ def mktree(args):
                             hidden_code_bounds, \
                             hidden_codes)
 
+    items = {}
+    for key in model_errors.keys():
+        items[key] = list(dectree_work_items(key, \
+                                             metadata, \
+                                             hidden_code_fields, \
+                                             hidden_code_bounds, \
+                                             hidden_codes, \
+                                             params, model_errors, \
+                                             num_leaves=args.num_leaves,\
+                                             max_depth=args.max_depth, \
+                                             split_bins=args.split_bins, \
+                                             seed=args.seed))
+
+    all_items = [item for key in model_errors.keys() for item in items[key]]
+    print("=== fitting %d decision trees with %d jobs ===" \
+          % (len(all_items),args.jobs))
+    start = time.time()
+    all_results = fit_dectrees(all_items,jobs=args.jobs)
+    print("=== fit %d decision trees in %.3fs ===" \
+          % (len(all_items),time.time()-start))
+
     models = {}
     tmpfile = "models.tmp"
+    offset = 0
     for key in model_errors.keys():
         (blk,loc,cfg) = key
-        new_model = build_dectree(key, \
-                                  metadata, \
-                                  hidden_code_fields, \
-                                  hidden_code_bounds, \
-                                  hidden_codes, \
-                                  params, model_errors, \
-                                  num_leaves=args.num_leaves,\
-                                  max_depth=args.max_depth)
+        n_items = len(items[key])
+        new_model = assemble_phys_model(key, \
+                                        metadata, \
+                                        items[key], \
+                                        all_results[offset:offset+n_items])
+        offset += n_items
         if new_model is None:
             continue
 
@@ -177,6 +235,7 @@ def mktree(args):
             fh.write("%s\n" % json.dumps(new_model.to_json()))
 
     print("==== Generalizing + Minimizing Models ===")
+    phys_models = []
     for key,mdls in models.items():
         if len(mdls) == 0:
             continue
@@ -200,5 +259,9 @@ def mktree(args):
         else:
             general_phys_model = mdls[0]
 
-        exp_phys_model_lib.update(dev,general_phys_model)
+        phys_models.append(general_phys_model)
+
+    with dev.physdb.transaction():
+        for phys_model in phys_models:
+            exp_phys_model_lib.update(dev,phys_model)
 
@@ -6,8 +6,6 @@ import runtime.profile.planner as planlib
 import runtime.profile.profiler as proflib
 import runtime.runtime_util as runtime_util
 
-from lab_bench.grendel_runner import GrendelRunner
-
 import hwlib.hcdc.llenums as llenums
 import hwlib.hcdc.llcmd as llcmd
 
@@ -56,7 +54,7 @@ def profile_kernel(runtime,board,blk,cfg,calib_obj,min_points,grid_size,force=Fa
 def profile_adp(args):
     board = runtime_util.get_device(args.model_number)
     calib_obj = llenums.CalibrateObjective(args.method)
-    runtime = GrendelRunner()
+    runtime = runtime_util.get_runner(args,board)
 
     runtime.initialize()
     if args.missing:
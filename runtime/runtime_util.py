@@ -107,6 +107,21 @@ def get_device(model_no,layout=False):
     import hwlib.hcdc.hcdcv2 as hcdclib
     return hcdclib.get_device(model_no,layout=layout)
 
+def get_runner(args,board):
+    '''
+    connect to the grendel firmware, or to an emulator answering with the
+    models of the board (or of the --emulate-db database) if --emulate is set.
+    '''
+    if args.emulate:
+        import hwlib.hcdc.llemulator as llemulator
+        model_board = board if args.emulate_db is None \
+                      else get_device(args.emulate_db)
+        return llemulator.EmulatedGrendelRunner(model_board, \
+                                                latency=args.serial_latency)
+
+    from lab_bench.grendel_runner import GrendelRunner
+    return GrendelRunner()
+
 
 def select_from_array(arr,n):
   space = math.ceil(len(arr)/n)
@@ -63,12 +63,11 @@ def compute_ref(progname,dssimname,variable):
       return CACHE[(progname,dssimname,variable)]
 
 def read_meas_data(filename):
-  with open(filename,'r') as fh:
-    print(filename)
-    obj = util.decompress_json(fh.read())
-    T,V = obj['times'], obj['values']
-    T_REFLOW = np.array(T) - min(T)
-    return T_REFLOW,V
+  print(filename)
+  obj = util.load_waveform(filename)
+  T,V = obj['times'], obj['values']
+  T_REFLOW = np.array(T) - np.min(T)
+  return T_REFLOW,V
 
 def make_prediction(t_meas,x_meas,model):
     a,b,c,d = model
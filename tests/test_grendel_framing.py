@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+import lab_bench.grendel_util as grendel_util
+from lab_bench.devices.loopback_due import LoopbackDue
+from lab_bench.grendel_runner import GrendelRunner
+
+
+def _read_frame(due, payload_type, array, width):
+  due.framing = grendel_util.Framing.BINARY
+  due.send_payload(payload_type, array, width=width)
+  # skip the element count and the frame line that precede the frame
+  while not "[frame]" in due.readline():
+    pass
+  return grendel_util.PayloadArduinoResponse.read_frame(due)
+
+
+@pytest.mark.parametrize("width", [1, 2, 4])
+def test_frame_round_trips_ndarray(width):
+  dtype = grendel_util.FRAME_DTYPES[width]
+  array = np.arange(300, dtype=np.uint64) % (np.iinfo(dtype).max + 1)
+  resp = _read_frame(LoopbackDue(), 7, array.astype(dtype), width)
+  assert resp.payload_type == 7
+  assert resp.array.dtype == dtype
+  np.testing.assert_array_equal(resp.array, array)
+
+
+def test_frame_round_trips_text():
+  # the frame length, not a terminator, delimits the body, so line
+  # terminators inside the payload survive.
+  text = b"set codes\r\nAC:>[msg]not a message\n"
+  due = LoopbackDue()
+  resp = _read_frame(due, 3, text, 1)
+  assert resp.array.tobytes() == text
+  assert not due.reads_available()
+
+
+def test_parse_frame_rejects_short_body():
+  frame = grendel_util.encode_frame(1, np.arange(4), width=2)
+  with pytest.raises(Exception):
+    grendel_util.PayloadArduinoResponse.parse_frame( \
+      frame[:grendel_util.FRAME_HEADER_SIZE], \
+      frame[grendel_util.FRAME_HEADER_SIZE:-1])
+
+
+@pytest.mark.parametrize("framing", list(grendel_util.Framing))
+def test_response_payload_matches_across_framings(framing):
+  due = LoopbackDue()
+  due.framing = framing
+  array = [0, 1, 127, 128, 255]
+  due.send_process()
+  due.send_response("returning codes", 1)
+  due.send_payload(5, array)
+  resp = grendel_util.get_response(due, quiet=True)
+  payload = resp.data(0).value
+  assert payload.payload_type == 5
+  assert list(map(int, payload.array)) == array
+
+
+def test_negotiate_framing_binary():
+  runner = GrendelRunner(device=LoopbackDue(binary=True), quiet=True)
+  runner.initialize()
+  assert runner.sweep
+  assert runner.framing == grendel_util.Framing.BINARY
+
+
+def test_negotiate_framing_falls_back_to_text():
+  # older firmware answers the framing request with a plain flush
+  due = LoopbackDue(binary=False, sweep=False)
+  runner = GrendelRunner(device=due, quiet=True)
+  runner.initialize()
+  assert not runner.sweep
+  assert runner.framing == grendel_util.Framing.TEXT
+  assert due.framing == grendel_util.Framing.TEXT
+  assert due.written == [grendel_util.SWEEP_REQUEST, \
+                         grendel_util.FRAMING_REQUEST]
@@ -0,0 +1,108 @@
+import pytest
+
+import hwlib.hcdc.hcdcv2 as hcdclib
+import hwlib.hcdc.llcmd as llcmd
+import hwlib.hcdc.llcmd_config as llcmd_config
+import hwlib.hcdc.llcmd_util as llutil
+import hwlib.hcdc.llenums as llenums
+import hwlib.hcdc.llemulator as llemulator
+import hwlib.adp as adplib
+import hwlib.device as devlib
+import runtime.models.exp_delta_model as exp_delta_lib
+import runtime.runt_execute as runt_execute
+from lab_bench.grendel_runner import GrendelRunner
+
+CALIB_OBJ = llenums.CalibrateObjective.MINIMIZE_ERROR
+
+@pytest.fixture
+def board(tmp_path, monkeypatch):
+  # the physical database is created under the working directory
+  monkeypatch.chdir(tmp_path)
+  return hcdclib.get_device("test-batch", layout=True)
+
+def _calibrate(board, adp):
+  # record a calibrated delta model with ideal parameters for every block
+  for cfg in adp.configs:
+    blk = board.get_block(cfg.inst.block)
+    for output in blk.outputs:
+      model = exp_delta_lib.ExpDeltaModel(blk, cfg.inst.loc, output, \
+                                          cfg.copy(), calib_obj=CALIB_OBJ)
+      spec = output.deltas[cfg.mode]
+      for par in spec.params:
+        model.bind(par, spec[par].val)
+      exp_delta_lib.update(board, model)
+
+def _make_adp(board, n):
+  # fan each mult output out to the next mult
+  adp = adplib.ADP()
+  mults = list(map(devlib.Location, board.layout.instances('mult')))[:n]
+  fanouts = list(map(devlib.Location, board.layout.instances('fanout')))[:n]
+  for name, locs in [('mult', mults), ('fanout', fanouts)]:
+    blk = board.get_block(name)
+    for loc in locs:
+      cfg = adp.add_instance(blk, loc)
+      cfg.modes = [blk.modes[0]]
+
+  mult = board.get_block('mult')
+  fanout = board.get_block('fanout')
+  for idx in range(n):
+    adp.add_conn(mult, mults[idx], mult.outputs['z'], \
+                 fanout, fanouts[idx], fanout.inputs['x'])
+    adp.add_conn(fanout, fanouts[idx], fanout.outputs['z0'], \
+                 mult, mults[(idx+1) % n], mult.inputs['x'])
+    adp.add_conn(fanout, fanouts[idx], fanout.outputs['z1'], \
+                 mult, mults[(idx+2) % n], mult.inputs['y'])
+
+  _calibrate(board, adp)
+  return adp
+
+def _configure(board, adp, batched):
+  emulator = llemulator.GrendelEmulator()
+  runner = GrendelRunner(device=emulator, quiet=True)
+  runner.initialize()
+  if batched:
+    runt_execute.configure_adp_batched(runner, board, adp, CALIB_OBJ)
+  else:
+    runt_execute.configure_adp(runner, board, adp, CALIB_OBJ)
+  return emulator
+
+def test_batched_configure_matches_unbatched(board):
+  adp = _make_adp(board, 32)
+  batched = _configure(board, adp, True)
+  unbatched = _configure(board, adp, False)
+  n_commands = len(list(adp.conns)) + len(list(adp.configs))
+  assert batched.n_commands == n_commands
+  assert unbatched.n_commands == n_commands
+  assert batched.conns == unbatched.conns
+  assert len(batched.conns) == len(list(adp.conns))
+  assert batched.states == unbatched.states
+  assert batched.n_round_trips < unbatched.n_round_trips
+
+def test_batch_status_vector(board):
+  adp = _make_adp(board, 4)
+  emulator = llemulator.GrendelEmulator()
+  runner = GrendelRunner(device=emulator, quiet=True)
+  runner.initialize()
+  loc = list(adp.configs)[0].inst.loc
+  blk = board.get_block('mult')
+  cmds = list(map(lambda conn: llcmd.set_conn_cmd( \
+                    board.get_block(conn.source_inst.block), \
+                    conn.source_inst.loc, conn.source_port, \
+                    board.get_block(conn.dest_inst.block), \
+                    conn.dest_inst.loc, conn.dest_port), adp.conns))
+  # the emulator does not apply calibration commands in a batch
+  calib = llutil.make_circ_cmd(llenums.CircCmdType.CALIBRATE, \
+                              {'calib_obj':CALIB_OBJ.name, \
+                               'inst':llutil.make_block_loc_t(blk,loc)[1]})
+  statuses = llcmd.execute_batch(runner, cmds[:2] + [None, calib] + cmds[2:])
+  assert list(statuses) == [0,0,1] + [0]*(len(cmds)-2)
+  assert len(emulator.conns) == len(cmds)
+  assert emulator.n_round_trips == 1
+
+def test_batch_rejects_line_terminator():
+  class Runner:
+    def execute_with_payload(self, cmd, payload):
+      raise AssertionError("sent a truncated batch")
+
+  with pytest.raises(Exception, match="line terminator"):
+    llcmd_config._execute_batch(Runner(), [bytes([3,1,13,10])])
@@ -0,0 +1,54 @@
+import pytest
+
+import hwlib.hcdc.hcdcv2 as hcdclib
+import hwlib.hcdc.llcmd_profile as llprofile
+import hwlib.hcdc.llenums as llenums
+import hwlib.hcdc.llemulator as llemulator
+import hwlib.adp as adplib
+import hwlib.device as devlib
+import runtime.models.exp_profile_dataset as exp_profile_lib
+import runtime.profile.planner as planlib
+import runtime.profile.profiler as proflib
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+  # the physical database is created under the working directory
+  monkeypatch.chdir(tmp_path)
+
+def _profile(model_number, block_name, method, sweep):
+  board = hcdclib.get_device(model_number, layout=True)
+  blk = board.get_block(block_name)
+  loc = devlib.Location(list(board.layout.instances(block_name))[0])
+  adp = adplib.ADP()
+  cfg = adp.add_instance(blk, loc)
+  output = blk.outputs.singleton()
+  # profile the mode whose measured expression has the most input ports.
+  # A sweep holds the data fields fixed.
+  def n_inputs(mode):
+    variables = method.get_expr(blk,output.relation[mode]).vars()
+    return len(list(filter(lambda inp: inp.name in variables, blk.inputs)))
+  cfg.modes = [max(blk.modes, key=n_inputs)]
+  runtime = llemulator.EmulatedGrendelRunner(board, spread=0.1, quiet=True)
+  runtime.initialize()
+  planner = planlib.SingleDefaultPointPlanner(blk, loc, output, method, cfg, \
+                                              n=8, m=10, reps=1)
+  proflib.profile_all_hidden_states(runtime, board, planner, sweep=sweep)
+  dataset = exp_profile_lib.load(board, blk, loc, output, cfg, method)
+  return runtime.due, dataset
+
+# the integrator's sweep header fills the whole command header, and its
+# initial condition is a data field, so each of its sweeps has one point.
+@pytest.mark.parametrize("block_name,method,n_sweeps", [
+  ('mult', llenums.ProfileOpType.INPUT_OUTPUT, 2),
+  ('integ', llenums.ProfileOpType.INTEG_INITIAL_COND, 8),
+])
+def test_sweep_matches_per_point_profiling(workdir, block_name, method, \
+                                           n_sweeps):
+  swept_emu, swept = _profile("sweep", block_name, method, True)
+  point_emu, pointwise = _profile("point", block_name, method, False)
+  assert swept_emu.n_profiled == point_emu.n_profiled == len(pointwise)
+  assert point_emu.n_round_trips == len(pointwise)
+  assert swept_emu.n_round_trips == n_sweeps
+  assert list(map(swept.point_to_json, range(len(swept)))) == \
+    list(map(pointwise.point_to_json, range(len(pointwise))))
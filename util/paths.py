@@ -83,6 +83,7 @@ class PathHandler:
                 self.LGRAPH_ADP_DIAG_DIR,
                 self.LSCALE_ADP_DIR,
                 self.LSCALE_ADP_DIAG_DIR,
+                self.LGRAPH_CACHE_DIR,
                 self.MEAS_WAVEFORM_FILE_DIR,
                 self.PLOT_DIR,
                 self.TIME_DIR
@@ -118,6 +119,7 @@ class PathHandler:
         self.LGRAPH_ADP_DIAG_DIR = self.PROG_DIR + "/lgraph-diag"
         self.LSCALE_ADP_DIR = self.PROG_DIR + "/lscale-adp"
         self.LSCALE_ADP_DIAG_DIR = self.PROG_DIR + "/lscale-diag"
+        self.LGRAPH_CACHE_DIR = self.ROOT_DIR + "/lgraph-cache"
         self.GRENDEL_FILE_DIR = self.PROG_DIR + "/grendel"
         self.PLOT_DIR = self.PROG_DIR + "/plots"
         self.MEAS_WAVEFORM_FILE_DIR = self.PROG_DIR + "/out-waveform"
@@ -259,6 +261,9 @@ class PathHandler:
     def lgraph_adp_dir(self):
         return self.LGRAPH_ADP_DIR
 
+    def lgraph_cache_dir(self):
+        return self.LGRAPH_CACHE_DIR
+
     def has_file(self,filepath):
         if not os.path.exists(filepath):
           return False
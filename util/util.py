@@ -245,6 +245,69 @@ def compress_json(obj):
   strdata = str(binascii.hexlify(comp_obj), 'utf-8')
   return strdata
 
+'''
+Measured waveforms are stored as a json sidecar at the PathHandler file name,
+holding every field except the samples, and a raw float64 file next to it
+holding the times followed by the values. The sample file is memory mapped
+on load, so reading part of a waveform only touches those samples. Older
+waveform files hold the whole object as compress_json output and are still
+read by load_waveform.
+'''
+WAVEFORM_FORMAT = "float64"
+
+def waveform_data_file(filename):
+  return os.path.splitext(filename)[0] + ".f64"
+
+def _write_atomic(filename,data,mode):
+  tmpfile = filename + ".tmp"
+  with open(tmpfile,mode) as fh:
+    fh.write(data)
+  os.replace(tmpfile,filename)
+
+def save_waveform(filename,obj):
+  times = np.asarray(obj['times'],dtype=np.float64)
+  values = np.asarray(obj['values'],dtype=np.float64)
+  if len(times) != len(values):
+    raise Exception("waveform has %d times and %d values" \
+                    % (len(times),len(values)))
+
+  datafile = waveform_data_file(filename)
+  _write_atomic(datafile,np.stack([times,values]).tobytes(),'wb')
+
+  meta = dict(filter(lambda tup: not tup[0] in ['times','values'], \
+                     obj.items()))
+  meta['format'] = WAVEFORM_FORMAT
+  meta['data'] = os.path.basename(datafile)
+  meta['samples'] = len(times)
+  _write_atomic(filename,json.dumps(meta),'w')
+
+def load_waveform(filename,start=0,stop=None):
+  '''
+  returns the waveform object stored at filename. The times and values of
+  binary waveforms are read-only memory-mapped arrays, restricted to the
+  samples in [start,stop).
+  '''
+  with open(filename,'r') as fh:
+    text = fh.read()
+
+  if not text.startswith('{'):
+    obj = decompress_json(text)
+    obj['times'] = obj['times'][start:stop]
+    obj['values'] = obj['values'][start:stop]
+    return obj
+
+  obj = json.loads(text)
+  if obj['format'] != WAVEFORM_FORMAT:
+    raise Exception("unknown waveform format <%s>" % obj['format'])
+
+  datafile = os.path.join(os.path.dirname(filename),obj['data'])
+  n = obj['samples']
+  data = np.memmap(datafile,dtype=np.float64,mode='r',shape=(2,n)) \
+         if n > 0 else np.zeros((2,0))
+  obj['times'] = data[0,start:stop]
+  obj['values'] = data[1,start:stop]
+  return obj
+
 def truncate(f, n):
   '''Truncates/pads a float f to n decimal places without rounding'''
   s = '{}'.format(f)